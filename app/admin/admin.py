@@ -1,13 +1,11 @@
 #!/usr/bin/env python3
 
-import csv
 import os
 import os.path as op
 import logging
-from logging.handlers import RotatingFileHandler
 
-from datetime import datetime
-from sqlalchemy import func, or_, and_
+from datetime import date, datetime, time, timedelta
+
 from sqlalchemy.event import listens_for
 from jinja2 import Markup
 
@@ -16,28 +14,50 @@ from flask_sqlalchemy import SQLAlchemy
 
 import flask_admin as admin
 
-from flask_admin import form
+from flask_admin import form, expose, AdminIndexView
 from flask_admin import helpers as admin_helpers
 from flask_admin.contrib import sqla
 
 from flask_migrate import Migrate, MigrateCommand
-from flask_script import Manager
+from flask_script import Manager, Command
 from flask_security import Security, SQLAlchemyUserDatastore, \
     UserMixin, RoleMixin, current_user
 from flask_security.utils import encrypt_password
 
+try:
+    from . import data, logs
+    from .data import Role, User, Order, OrderItem, Product, product_list, \
+        add_products
+except ImportError:
+    # run from this directory by manage.py, wsgi.py and the scripts
+    import data
+    import logs
+    from data import Role, User, Order, OrderItem, Product, product_list, \
+        add_products
+
 # Create application
 app = Flask(__name__, static_folder='uploads')
 app.config.from_pyfile('config.py')
+# optional overrides, e.g. a scratch database for stress runs
+app.config.from_envvar('TUTAKA_ADMIN_SETTINGS', silent=True)
+
+# see data.SQLITE_PRAGMAS, set to {} in config.py to keep sqlite defaults
+app.config.setdefault('SQLITE_PRAGMAS', data.SQLITE_PRAGMAS)
+
+# the models are declared in data.py, Flask-SQLAlchemy uses the same
+# declarative base and the DB helpers share its engine
+db = SQLAlchemy(app, model_class=data.Base)
+data.configure(db.engine, app.config['SQLITE_PRAGMAS'])
 
-db = SQLAlchemy(app)
 
-#  logging
+#  logging, through the same queue and rotation as the bot, see logs.py
+logs.setup(
+    app.config.get('LOG_FILE', 'flask_admin.log'),
+    logger='flask_admin',
+    max_bytes=app.config.get('LOG_MAX_BYTES', logs.MAX_BYTES),
+    backup_count=app.config.get('LOG_BACKUP_COUNT', logs.BACKUP_COUNT),
+    interval=app.config.get('LOG_ROTATE_INTERVAL', logs.INTERVAL))
 logger = logging.getLogger('flask_admin')
-logger.setLevel(logging.INFO)
-flask_admin_logs_handler = RotatingFileHandler(
-    'flask_admin.log', maxBytes=2000, backupCount=10)
-logger.addHandler(flask_admin_logs_handler)
 
 #  gunicorn logging
 #  gunicorn --workers=0 --bind=0.0.0.0:8000 --log-level=warning app:app
@@ -47,10 +67,22 @@ if __name__ != '__main__':
     app.logger.setLevel(gunicorn_logger.level)
 
 #  Migration
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, render_as_batch=True)
 manager = Manager(app)
 manager.add_command('db', MigrateCommand)
 
+
+class RebuildSales(Command):
+    '''Recompute the sales rollups from the orders'''
+
+    def run(self):
+        count = data.rebuild_sales()
+        data.session.remove()
+        print(f'sales rollups rebuilt from {count} orders')
+
+
+manager.add_command('rebuild_sales', RebuildSales())
+
 #  Create directory for file fields to use
 file_path = op.join(op.dirname(__file__), 'uploads')
 try:
@@ -58,87 +90,15 @@ try:
 except OSError:
     pass
 
-#  Define models
-roles_users = db.Table(
-    'roles_users',
-    db.Column('user_id', db.Integer(), db.ForeignKey('users.id')),
-    db.Column('role_id', db.Integer(), db.ForeignKey('role.id'))
-)
-
-
-class Role(db.Model, RoleMixin):
-    id = db.Column(db.Integer(), primary_key=True)
-    name = db.Column(db.String(80), unique=True)
-    description = db.Column(db.String(255))
-
-    def __str__(self):
-        return self.name
-
-
-class User(db.Model, UserMixin):
-    __tablename__ = 'users'
-
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, unique=True)
-    email = db.Column(db.String, unique=True)
-    password = db.Column(db.String(255))
-    username = db.Column(db.String, nullable=True)
-    first_name = db.Column(db.String, nullable=True)
-    last_name = db.Column(db.String, nullable=True)
-    phone = db.Column(db.String, nullable=True)
-    date_of_birth = db.Column(db.Date, nullable=True)
-    date = db.Column(db.DateTime(timezone=True), server_default=func.now())
-    orders = db.relationship('Order', backref='owner')
-    active = db.Column(db.Boolean())
-    roles = db.relationship('Role', secondary=roles_users,
-                            backref=db.backref('users', lazy='dynamic'))
-
-    def __str__(self):
-        return "{}, {}".format(self.user_id, self.username)
+# Setup Flask-Security, data.py stays free of Flask so its mixins are
+# added to the mapped classes here
+User.__bases__ += (UserMixin,)
+Role.__bases__ += (RoleMixin,)
 
-    def __repr__(self):
-        return "{}: {}".format(self.id, self.__str__())
-
-
-# Setup Flask-Security
 user_datastore = SQLAlchemyUserDatastore(db, User, Role)
 security = Security(app, user_datastore)
 
 
-class Order(db.Model):
-    __tablename__ = 'orders'
-
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey(User.user_id))
-    phone = db.Column(db.String)
-    cart = db.Column(db.String)
-    date = db.Column(db.DateTime(timezone=True), server_default=func.now())
-    address = db.Column(db.String)
-    payment_type = db.Column(db.String)
-    status = db.Column(db.String)
-    price = db.Column(db.Float)
-
-    def __str__(self):
-        return str(self.id)
-
-
-class Product(db.Model):
-    __tablename__ = 'products'
-
-    id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String)
-    category = db.Column(db.String)
-    subcategory = db.Column(db.String)
-    price = db.Column(db.Float)
-    weight = db.Column(db.String)
-    composition = db.Column(db.String)
-    img_name = db.Column(db.Unicode(64))
-    img_path = db.Column(db.Unicode(128))
-
-    def __unicode__(self):
-        return self.name
-
-
 # Delete hooks for models, delete files if models are getting deleted
 @listens_for(Product, 'after_delete')
 def del_image(mapper, connection, target):
@@ -219,6 +179,7 @@ class OrderAdmin(sqla.ModelView):
         'cart',
         'price',
         'payment_type',
+        'delivery_type',
         'status'
     ]
     column_display_pk = True
@@ -235,6 +196,32 @@ class OrderAdmin(sqla.ModelView):
                 )
 
 
+class OrderItemAdmin(sqla.ModelView):
+    '''Order lines, written by the bot with the order'''
+    can_create = False
+    can_edit = False
+    can_delete = False
+    column_list = [
+        'order_id',
+        'product_id',
+        'title',
+        'subcategory',
+        'quantity',
+        'price'
+    ]
+    column_filters = ['order_id', 'product_id', 'title']
+    column_default_sort = ('order_id', True)
+    can_export = True
+    export_max_rows = 1000
+    export_types = ['csv', 'xls']
+
+    def is_accessible(self):
+        return (current_user.is_active and
+                current_user.is_authenticated and
+                current_user.has_role('superuser')
+                )
+
+
 class ProductAdmin(sqla.ModelView):
     action_disallowed_list = ['delete', ]
     column_list = [
@@ -280,6 +267,27 @@ class ProductAdmin(sqla.ModelView):
     }
 
 
+class SalesIndexView(AdminIndexView):
+    '''Admin home page with the sales of the last days, read from the
+    rollup tables'''
+    periods = (('Сегодня', 1), ('7 дней', 7), ('30 дней', 30))
+
+    @expose('/')
+    def index(self):
+        sales = None
+        if current_user.is_authenticated and \
+                current_user.has_role('superuser'):
+            tomorrow = datetime.combine(date.today(), time()) + \
+                timedelta(days=1)
+            try:
+                sales = [(title, data.get_sales_summary(
+                    tomorrow - timedelta(days=days), tomorrow))
+                    for title, days in self.periods]
+            finally:
+                data.session.remove()
+        return self.render('admin/index.html', sales=sales)
+
+
 class RoleView(sqla.ModelView):
     def is_accessible(self):
         return (current_user.is_active and
@@ -306,12 +314,14 @@ admin = admin.Admin(
     app,
     name='Tutaka',
     base_template='my_master.html',
-    template_mode='bootstrap3'
+    template_mode='bootstrap3',
+    index_view=SalesIndexView()
     )
 
 # Add views
 admin.add_view(UserAdmin(User, db.session))
 admin.add_view(OrderAdmin(Order, db.session))
+admin.add_view(OrderItemAdmin(OrderItem, db.session))
 admin.add_view(ProductAdmin(Product, db.session))
 admin.add_view(RoleView(Role, db.session))
 
@@ -327,69 +337,8 @@ def security_context_processor():
         get_url=url_for
     )
 
-# ===========================  DB wrapper ===========================
 # ============================  Usage =============================
 
-# Source https://github.com/pybites/pytip/tree/master/tips
-
-
-def export_orders_to_file():
-    outfile = open('orders.csv', 'w')
-    outcsv = csv.writer(outfile)
-    records = db.session.query(Order).all()
-    [outcsv.writerow([getattr(curr, column.name) for column in Order.__mapper__.columns]) for curr in records]
-    outfile.close()
-
-
-def get_categories():
-    categories = db.session.query(Product.category).group_by(Product.category).all()
-    categories = [r for r, in categories]
-    return categories
-
-
-def get_subcategories(category):
-    subcats = db.session.query(Product.subcategory).filter(Product.category == category).group_by(Product.subcategory).all()
-    subcats = [r for r, in subcats]
-    return subcats
-
-
-def get_products_by_category(category):
-    # TODO make this function work with categories and subcategories
-    products = db.session.query(Product.title).filter(or_(
-        Product.category == category,
-        Product.subcategory == category
-    )).all()
-    products = [r for r, in products]
-    return products
-
-
-def get_user(user_id):
-    user = db.session.query(User).filter(User.user_id == user_id).first()
-    return user
-
-
-def get_all_users():
-    users = db.session.query(User).all()
-    return users
-
-
-def add_user(user):
-    db.session.add(User(
-        user_id=user['id'],
-        username=user['username'],
-        first_name=user['first_name'],
-        last_name=user['last_name'],
-        date=datetime.now()
-    ))
-    db.session.commit()
-    db.session.close()
-
-
-def update_user(user_id, column_name, value):
-    db.session.query(User).filter(User.user_id == user_id).update({column_name: value})
-    db.session.commit()
-    db.session.close()
-
 
 def build_sample_db():
     db.drop_all()
@@ -412,193 +361,6 @@ def build_sample_db():
         db.session.commit()
 
 
-def add_products(product_list):
-    for p in product_list:
-        db.session.add(Product(
-            title=p[0],
-            category=p[1],
-            subcategory=p[2],
-            price=p[3],
-            weight=p[4],
-            composition=p[5],
-            img_name=p[6],
-            img_path=p[6]
-            ))
-    db.session.commit()
-
-
-def add_order(order):
-    order = Order(
-        user_id=order['user_id'],
-        phone=order['user_phone'],
-        cart=order['cart'],
-        date=datetime.now(),
-        address=order['address'],
-        payment_type=order['payment_type'],
-        status=order['status'],
-        price=order['price']
-    )
-    db.session.add(order)
-    db.session.flush()
-    db.session.refresh(order)
-    order_id = order.id
-    db.session.commit()
-    db.session.close()
-    return order_id
-
-
-def update_order(order_id, column_name, value):
-    db.session.query(Order).filter(Order.id == order_id).update({column_name: value})
-    db.session.commit()
-    db.session.close()
-
-
-def is_existing_category(text):
-    cat = db.session.query(Product).filter(
-        or_(
-            Product.category == text,
-            Product.subcategory == text
-            )
-    ).first()
-    return True if cat else False
-
-
-def get_product(product, category):
-    return db.session.query(Product).filter(and_(
-        Product.title == product,
-        or_(
-            Product.category == category,
-            Product.subcategory == category
-            )
-    )).first()
-
-
-def get_product_by_id(id):
-    p = db.session.query(Product).filter(Product.id == id).first()
-    p = dict(p.__dict__)
-    p.pop('_sa_instance_state', None)
-    return p
-
-
-product_list = (
-    ('Пицца Маргарита', 'Пиццы', '30см', 7.50, '430', 'св. помидоры, сыр моцарелла', 'pizza_margarita.jpg'),
-    ('Пицца Маргарита', 'Пиццы', '45см', 13.00, 530, 'св. помидоры, сыр моцарелла', 'pizza_margarita.jpg'),
-    ('Пицца Барбекина', 'Пиццы', '30см', 11.00, 530, 'куриная грудка в/к, бекон в/к, св. помидоры, кон. огурцы, сыр моцарелла', 'pizza_barbekina.jpg'),
-    ('Пицца Барбекина', 'Пиццы', '45см', 20.00, 1060, 'куриная грудка в/к, бекон в/к, св. помидоры, кон. огурцы, сыр моцарелла', 'pizza_barbekina.jpg'),
-    ('Пицца Вегетарианская', 'Пиццы', '30см', 9.00, 480, 'св. перец, св. шампиньоны,  св. помидоры, лук-порей, маслины, сыр моцарелла', 'pizza_vagatarianskaya.jpg'),
-    ('Пицца Вегетарианская', 'Пиццы', '45см', 16.00, 960, 'св. перец, св. шампиньоны,  св. помидоры, лук-порей, маслины, сыр моцарелла', 'pizza_vagatarianskaya.jpg'),
-    ('Пицца Гаваи', 'Пиццы', '30см', 10.00, 490, 'Ветчина в/к, куриная грудка в/к, кон. ананасы, маслины, сыр моцарелла', 'pizza_gavai.jpg'),
-    ('Пицца Гаваи', 'Пиццы', '45см', 18.00, 980, 'Ветчина в/к, куриная грудка в/к, кон. ананасы, маслины, сыр моцарелла', 'pizza_gavai.jpg'),
-    ('Пицца Деревенская', 'Пиццы', '30см', 10.00, 480, 'колбаса салями, бекон в/к, кон. огурцы, лук порей, сыр моцарелла', 'pizza_derevenskaya.jpg'),
-    ('Пицца Деревенская', 'Пиццы', '45см', 18.00, 960, 'колбаса салями, бекон в/к, кон. огурцы, лук порей, сыр моцарелла', 'pizza_derevenskaya.jpg'),
-    ('Пицца Морская', 'Пиццы', '30см', 16.50, 470, 'семга с/с, мясо креветок, св. перец, маслины, сыр моцарелла', 'pizza_morskaya.jpg'),
-    ('Пицца Морская', 'Пиццы', '45см', 30.00, 940, 'семга с/с, мясо креветок, св. перец, маслины, сыр моцарелла', 'pizza_morskaya.jpg'),
-    ('Пицца Капричиоза', 'Пиццы', '30см', 11.00, 520, 'Ветчина в/к, колбаса "Кабаносы", св. шампиньоны, кон. огурец', 'pizza_kaprichoza.jpg'),
-    ('Пицца Капричиоза', 'Пиццы', '45см', 20.00, 940, 'Ветчина в/к, колбаса "Кабаносы", св. шампиньоны, кон. огурец', 'pizza_kaprichoza.jpg'),
-    ('Пицца Мясное ассорти', 'Пиццы', '30см', 13.00, 530, 'Ветчина в/к, куриная грудка в/к, колбаса салями, бекон в/к, лук порей, сыр моцарелла', 'pizza_myasnoe_assorti.jpg'),
-    ('Пицца Мясное ассорти', 'Пиццы', '45см', 24.00, 1060, 'Ветчина в/к, куриная грудка в/к, колбаса салями, бекон в/к, лук порей, сыр моцарелла', 'pizza_myasnoe_assorti.jpg'),
-    ('Пицца С ветчиной', 'Пиццы', '30см', 8.00, 430, 'ветчина в/к, сыр моцарелла', 'pizza_s_vetchinoy.jpg'),
-    ('Пицца С ветчиной', 'Пиццы', '45см', 14.50, 860, 'ветчина в/к, сыр моцарелла', 'pizza_s_vetchinoy.jpg'),
-    ('Пицца С колбасой', 'Пиццы', '30см', 9.00, 430, 'колбаса салями, сыр моцарелла', 'pizza_s_kilbasoy.jpg'),
-    ('Пицца С колбасой', 'Пиццы', '45см', 16.00, 860, 'колбаса салями, сыр моцарелла', 'pizza_s_kilbasoy.jpg'),
-    ('Пицца Диабло', 'Пиццы', '30см', 11.00, 500, 'колбаса салями, св. шампиньоны, перец халапеньо, соус сальса, сыр моцарелла', 'pizza_diablo.jpg'),
-    ('Пицца Диабло', 'Пиццы', '45см', 20.00, 1000, 'колбаса салями, св. шампиньоны, перец халапеньо, соус сальса, сыр моцарелла', 'pizza_diablo.jpg'),
-    ('Пицца Закрытая', 'Пиццы', '30см', 13.00, 650, 'Ветчина в/к, колбаса салями, кон. огурцы, сыр моцарелла', 'pizza_zakrytaya.jpg'),
-    ('Пицца Закрытая', 'Пиццы', '45см', 24.00, 1300, 'Ветчина в/к, колбаса салями, кон. огурцы, сыр моцарелла', 'pizza_zakrytaya.jpg'),
-    ('Пицца Тутака', 'Пиццы', '30см', 11.00, 560, 'куриная грудка в/к, св. помидоры, св. шампиньоны, св. укроп, сыр моцарелла', 'pizza_tutaka.jpg'),
-    ('Пицца Тутака', 'Пиццы', '45см', 20.00, 1120, 'куриная грудка в/к, св. помидоры, св. шампиньоны, св. укроп, сыр моцарелла', 'pizza_tutaka.jpg'),
-    ('Пицца Кватро', 'Пиццы', '30см', 11.00, 510, 'ветчина в/к, св. перец, св. шампиньоны, маслины, сыр моцарелла', 'pizza_kvatro.jpg'),
-    ('Пицца Кватро', 'Пиццы', '45см', 20.00, 1020, 'ветчина в/к, св. перец, св. шампиньоны, маслины, сыр моцарелла', 'pizza_kvatro.jpg'),
-    ('Пицца Бургер', 'Пиццы', '30см', 11.00, 530, 'фарш гов., бекон в/к, св. помидоры, кон. огурец, соус гриль, соус "Гриль" сыр моцарелла', 'pizza_burger.jpg'),
-    ('Пицца Бургер', 'Пиццы', '45см', 20.00, 1060, 'фарш гов., бекон в/к, св. помидоры, кон. огурец, соус гриль, соус "Гриль" сыр моцарелла', 'pizza_burger.jpg'),
-    ('Пицца Яркая', 'Пиццы', '30см', 11.00, 490, 'ветчина в/к, колбаса салями, св. перец, маслины, св. огурец, сыр моцарелла', 'pizza_yarkaya.jpg'),
-    ('Пицца Яркая', 'Пиццы', '45см', 20.00, 980, 'ветчина в/к, колбаса салями, св. перец, маслины, св. огурец, сыр моцарелла', 'pizza_yarkaya.jpg'),
-    ('Пицца Баварская', 'Пиццы', '30см', 11.00, 490, 'колбаса "Кабаносы", св. перец, св. шампиньоны, сыр моцарелла', 'pizza_bavarskaya.jpg'),
-    ('Пицца Баварская', 'Пиццы', '45см', 20.00, 980, 'колбаса "Кабаносы", св. перец, св. шампиньоны, сыр моцарелла', 'pizza_bavarskaya.jpg'),
-    ('Пицца Суприм', 'Пиццы', '30см', 11.00, 470, 'Ветчина в/к, колбаса "Кабаносы", св. перец, кон. огурец, лук порей, соус "1000 островов", сыр моцарелла', 'pizza_suprim.jpg'),
-    ('Пицца Суприм', 'Пиццы', '45см', 20.00, 940, 'Ветчина в/к, колбаса "Кабаносы", св. перец, кон. огурец, лук порей, соус "1000 островов", сыр моцарелла', 'pizza_suprim.jpg'),
-
-    ('Ролл Канада', 'Роллы', '4шт', 8.00, 125, 'сыр сл., угорь жареный в соусе, огурец, авакадо, кунжут', 'sushi_kanada.jpg'),
-    ('Ролл Канада', 'Роллы', '8шт', 15.00, 250, 'сыр сл., угорь жареный в соусе, огурец, авакадо, кунжут', 'sushi_kanada.jpg'),
-    ('Ролл Филладельфия', 'Роллы', '4шт', 8.00, 125, 'сыр сл., семга с/с, авокадо', 'sushi_filadelfia.jpg'),
-    ('Ролл Филладельфия', 'Роллы', '8шт', 15.00, 250, 'сыр сл., семга с/с, авокадо', 'sushi_filadelfia.jpg'),
-    ('Ролл Аризона', 'Роллы', '4шт', 4.00, 100, 'сыр сл., мясо креветки, авокадо, кунжут', 'sushi_arizona.jpg'),
-    ('Ролл Аризона', 'Роллы', '8шт', 7.50, 200, 'сыр сл., мясо креветки, авокадо, кунжут', 'sushi_arizona.jpg'),
-    ('Ролл Ямато', 'Роллы', '4шт', 2.90, 100, 'сыр сл., семга с/с п/к, имбирь мар., редька мар.', 'sushi_yamato.jpg'),
-    ('Ролл Ямато', 'Роллы', '8шт', 5.40, 200, 'сыр сл., семга с/с п/к, имбирь мар., редька мар.', 'sushi_yamato.jpg'),
-    ('Ролл Такуан кунсей', 'Роллы', '4шт', 3.50, 100, 'сыр сл., семга с/с п/к, салат чука, огурец, редька мар.', 'sushi_takuan_kunsey.jpg'),
-    ('Ролл Такуан кунсей', 'Роллы', '8шт', 6.50, 200, 'сыр сл., семга с/с п/к, салат чука, огурец, редька мар.', 'sushi_takuan_kunsey.jpg'),
-    ('Ролл Гаваи', 'Роллы', '4шт', 2.70, 100, 'куриная грудка в/к, ананас мар., редька мар., сыр чеддер', 'sushi_gavai.jpg'),
-    ('Ролл Гаваи', 'Роллы', '8шт', 5.00, 200, 'куриная грудка в/к, ананас мар., редька мар., сыр чеддер', 'sushi_gavai.jpg'),
-    ('Ролл Риоку', 'Роллы', '4шт', 3.60, 100, 'сыр сл., огурец, семга с/с, икра чер., помидор ', 'sushi_rioku.jpg'),
-    ('Ролл Риоку', 'Роллы', '8шт', 6.70, 200, 'сыр сл., огурец, семга с/с, икра чер., помидор ', 'sushi_rioku.jpg'),
-    ('Ролл Банзай маки', 'Роллы', '4шт', 2.70, 100, 'сыр сл., огурец, семга с/с, икра кр.', 'sushi_banzai_maki.jpg'),
-    ('Ролл Банзай маки', 'Роллы', '8шт', 5.00, 200, 'сыр сл., огурец, семга с/с, икра кр.', 'sushi_banzai_maki.jpg'),
-    ('Ролл Окинава', 'Роллы', '4шт', 2.70, 100, 'сыр сл., огурец, семга с/с', 'sushi_okinava.jpg'),
-    ('Ролл Окинава', 'Роллы', '8шт', 5.00, 200, 'сыр сл., огурец, семга с/с', 'sushi_okinava.jpg'),
-    ('Ролл Бонито маки', 'Роллы', '4шт', 3.40, 100, 'сыр сл., салат чука, семга с/с, хлопья тунца коп.', 'sushi_bonito_maki.jpg'),
-    ('Ролл Бонито маки', 'Роллы', '8шт', 6.30, 200, 'сыр сл., салат чука, семга с/с, хлопья тунца коп.', 'sushi_bonito_maki.jpg'),
-    ('Ролл Эби каппа маки', 'Роллы', '4шт', 2.90, 100, 'сыр сл., огурец, мясо креветки', 'sushi_ebi_kappa_maki.jpg'),
-    ('Ролл Эби каппа маки', 'Роллы', '8шт', 5.30, 200, 'сыр сл., огурец, мясо креветки', 'sushi_ebi_kappa_maki.jpg'),
-    ('Ролл Сяке маки', 'Роллы', '4шт', 3.30, 100, 'сыр сл., семга с/с', 'sushi_syake_maki.jpg'),
-    ('Ролл Сяке маки', 'Роллы', '8шт', 6.10, 200, 'сыр сл., семга с/с', 'sushi_syake_maki.jpg'),
-    ('Ролл Вакоме маки', 'Роллы', '4шт', 4.50, 100, 'сыр сл., семга с/с, помидор, салат чука', 'sushi_vakome_maki.jpg'),
-    ('Ролл Вакоме маки', 'Роллы', '8шт', 8.50, 200, 'сыр сл., семга с/с, помидор, салат чука', 'sushi_vakome_maki.jpg'),
-    ('Ролл Вегетеринский', 'Роллы', '4шт', 3.00, 100, 'сыр сл., помидор, авокадо, перец', 'sushi_vagatarianskiy.jpg'),
-    ('Ролл Вегетеринский', 'Роллы', '8шт', 5.50, 200, 'сыр сл., помидор, авокадо, перец', 'sushi_vagatarianskiy.jpg'),
-    ('Ролл Сяке Хеяши маки', 'Роллы', '4шт', 3.60, 100, 'сыр сл., семга с/с, салат чука', 'sushi_syake_heyashi_maki.jpg'),
-    ('Ролл Сяке Хеяши маки', 'Роллы', '8шт', 6.70, 200, 'сыр сл., семга с/с, салат чука', 'sushi_syake_heyashi_maki.jpg'),
-    ('Ролл Косе маки', 'Роллы', '4шт', 2.70, 100, 'сыр сл., перец, семга с/с', 'sushi_kose_maki.jpg'),
-    ('Ролл Косе маки', 'Роллы', '8шт', 5.00, 200, 'сыр сл., перец, семга с/с', 'sushi_kose_maki.jpg'),
-    ('Ролл Грин маки', 'Роллы', '4шт', 3.20, 100, 'сыр сл., семга с/с п/к, перец, укроп', 'sushi_grin_maki.jpg'),
-    ('Ролл Грин маки', 'Роллы', '8шт', 6.00, 200, 'сыр сл., семга с/с п/к, перец, укроп', 'sushi_grin_maki.jpg'),
-    ('Ролл Киото', 'Роллы', '4шт', 3.00, 100, 'сыр сл., семга с/с, перец, огурец', 'sushi_kioto.jpg'),
-    ('Ролл Киото', 'Роллы', '8шт', 5.50, 200, 'сыр сл., семга с/с, перец, огурец', 'sushi_kioto.jpg'),
-    ('Ролл Унаги маки', 'Роллы', '4шт', 4.50, 100, 'угорь жар. в соусе, огурец', 'sushi_unagii_maki.jpg'),
-    ('Ролл Унаги маки', 'Роллы', '8шт', 8.50, 200, 'угорь жар. в соусе, огурец', 'sushi_unagii_maki.jpg'),
-    ('Ролл Калифорния', 'Роллы', '4шт', 2.70, 100, 'сыр сл., крабовые палочки, огурец, икра кр.', 'sushi_kaliforniya.jpg'),
-    ('Ролл Калифорния', 'Роллы', '8шт', 5.00, 200, 'сыр сл., крабовые палочки, огурец, икра кр.', 'sushi_kaliforniya.jpg'),
-    ('Ролл Аляска', 'Роллы', '4шт', 4.50, 100, 'сыр сл., угорь жар. в соусе, огурец, икра кр., кунжут', 'sushi_alaska.jpg'),
-    ('Ролл Аляска', 'Роллы', '8шт', 8.50, 200, 'сыр сл., угорь жар. в соусе, огурец, икра кр., кунжут', 'sushi_alaska.jpg'),
-
-    ('Бургер Гамбургер', 'Бургеры', None, 2.00, 130, 'Булочка, говяжья котлета, огурец кон., кетчуп', 'burger_hamburger.jpg'),
-    ('Бургер Чизбургер', 'Бургеры', None, 2.80, 180, 'Булочка, говяжья котлета, огурец кон., помидор св., салат, сыр чедер, соус 1000 островов.', 'burger_chizburger.png'),
-    ('Бургер Чикенбургер', 'Бургеры', None, 2.80, 190, 'Булочка, куриная котлета, огурец св., помидор св., салат, сыр чедер, горчичный соус', 'burger_chikenburger.png'),
-    ('Бургер Мехико', 'Бургеры', None, 3.00, 180, 'Булочка, говяжья котлета, огурец кон., св. помидор, перец халапеньо, соус сальса', 'burger_mehiko.jpg'),
-    ('Бургер Барбекю', 'Бургеры', None, 3.00, 180, 'Булочка, куриная котлета, огурец кон., лук мар., салат, бекон, сыр чедер, соус 1000 островов', 'burger_barbq.jpg'),
-    ('Бургер Фишбургер', 'Бургеры', None, 3.00, 180, 'Булочка, филе хека в понировке, салат, помидор св., сосус тар-тар', 'burger_fishburger.jpg'),
-    ('Бургер Дабл биф', 'Бургеры', None, 6.50, None, 'Булочка, говяжья котлета, помидо св., салат, сыр чедер, соус гриль', 'burger_dubl_beef.jpg'),
-    ('Бургер Дабл чикен', 'Бургеры', None, 6.50, None, 'Булочка, куриная котлета, помидор св., салат, сыр чедер, соус гриль', 'burger_dabl_chiken.jpg'),
-
-    ('Драник С курицей', 'Драник', None, 3.20, 220, 'картофельные оладьи, куриная котлета, помидор св., соус тар-тар', 'dranik_s_kuritsey.jpg'),
-    ('Драник С говядиной', 'Драник', None, 3.20, 210, 'картофельные оладьи, говяжья котлета, помидор св., соус тар-тар', 'dranik_s_govuadinoy.jpg'),
-    ('Драник С семгой', 'Драник', None, 4.00, 200, 'картофельные оладьи, семга с/с, помидор св., соус тар-тар', 'dranik_s_semgoy.jpg'),
-
-    ('Картофель фри большой', 'Закуски', None, 2.40, 150, 'картофель фри', 'snacks_kartofel_free.jpg'),
-    ('Картофель фри малый', 'Закуски', None, 2.00, 100, 'картофель фри', 'snacks_kartofel_free.jpg'),
-    ('Картофельные шарики большие', 'Закуски', None, 2.40, 150, 'картофельные шарики', 'snacks_shariki.jpg'),
-    ('Картофельные шарики малые', 'Закуски', None, 2.00, 100, 'картофельные шарики', 'snacks_shariki.jpg'),
-    ('Наггетсы большие', 'Закуски', None, 5.00, 150, 'наггетсы', 'snacks_naggetsy.jpg'),
-    ('Наггетсы малые', 'Закуски', None, 4.00, 100, 'наггетсы', 'snacks_naggetsy.jpg'),
-
-    ('Квас ж/б 0,5', 'Напитки', None, 1.50, 500, None, 'pepsicola.jpg'),
-    ('Квас 0,5', 'Напитки', None, 1.50, 500, None, 'pepsicola.jpg'),
-    ('Pepsi 0,5', 'Напитки', None, 1.50, 500, None, 'pepsicola.jpg'),
-    ('Mirinda 0,5', 'Напитки', None, 1.50, 500, None, 'pepsicola.jpg'),
-    ('7up 0,5', 'Напитки', None, 1.50, 500, None, 'pepsicola.jpg'),
-    ('Pepsi 0,33', 'Напитки', None, 1.30, 330, None, 'pepsicola.jpg'),
-    ('Mirinda 0,33', 'Напитки', None, 1.30, 330, None, 'pepsicola.jpg'),
-    ('7up 0,33', 'Напитки', None, 1.30, 330, None, 'pepsicola.jpg'),
-    ('Pepsi 0,25', 'Напитки', None, 1.30, 250, None, 'pepsicola.jpg'),
-    ('Mirinda 0,25', 'Напитки', None, 1.30, 250, None, 'pepsicola.jpg'),
-    ('7up 0,25', 'Напитки', None, 1.30, 250, None, 'pepsicola.jpg'),
-    ('Сок 1л', 'Напитки', None, 3.50, 1000, None, 'pepsicola.jpg'),
-    ('Сок 0,2л', 'Напитки', None, 1.50, 200, None, 'pepsicola.jpg'),
-    ('Молочные коктейли', 'Напитки', None, 2.80, 200, None, 'coctail.jpg'),
-    ('Чай и кофе', 'Напитки', None, 2.00, 200, None, 'tea_coffee.jpg')
-)
-
-
 # ============================  Usage =============================
 
 if __name__ == '__main__':
@@ -0,0 +1,878 @@
+#!/usr/bin/env python3
+'''Models and DB helpers shared by the bot and the admin panel.
+
+Only SQLAlchemy is needed here, the bot imports this module directly
+instead of building the Flask admin app. admin.py maps the same models
+through Flask-SQLAlchemy, the bot binds them with configure().
+'''
+
+import os.path as op
+import functools
+import threading
+from types import SimpleNamespace
+from itertools import groupby
+from contextlib import contextmanager
+
+from datetime import datetime
+from sqlalchemy import create_engine, func, or_, and_, bindparam, text, \
+    Table, Column, Integer, String, Float, Boolean, Date, DateTime, \
+    Unicode, Text, ForeignKey, Index, UniqueConstraint, PrimaryKeyConstraint
+from sqlalchemy.event import listens_for, listen
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import scoped_session, sessionmaker, relationship, backref
+
+# same file the admin panel uses with its default config
+DATABASE_URI = 'sqlite:///' + op.join(
+    op.dirname(op.abspath(__file__)), 'db.sqlite')
+
+# SQLite profile applied to every connection, the bot and the admin panel
+# share one database file. WAL lets readers run next to the single writer,
+# busy_timeout makes a writer wait for the lock instead of failing with
+# "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 10000,  # ms
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,  # KiB
+    'mmap_size': 64 * 1024 * 1024,
+}
+
+Base = declarative_base()
+session = scoped_session(sessionmaker())
+engine = None
+
+
+def configure(bind=None, pragmas=None):
+    '''Bind the helpers to an engine or a database URI'''
+    global engine
+    if bind is None:
+        bind = DATABASE_URI
+    if isinstance(bind, str):
+        bind = create_engine(bind)
+    if pragmas is None:
+        pragmas = SQLITE_PRAGMAS
+    if bind.url.get_backend_name() == 'sqlite' and pragmas:
+        listen(bind, 'connect', functools.partial(set_sqlite_pragmas, pragmas))
+    session.remove()
+    session.configure(bind=bind)
+    engine = bind
+    return engine
+
+
+def set_sqlite_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+
+# Writes from this process go one at a time, threads queue up here instead
+# of fighting over the sqlite write lock. Readers are not affected.
+# Inside a session_scope the lock is held from the first write until the
+# scope commits, as the sqlite write lock is.
+_write_lock = threading.RLock()
+_scope = threading.local()
+
+
+def serialized_write(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if getattr(_scope, 'depth', 0):
+            if not _scope.writing:
+                _write_lock.acquire()
+                _scope.writing = True
+            return func(*args, **kwargs)
+        with _write_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def session_scope():
+    '''Unit of work, the DB helpers called inside join one transaction
+    that is committed when the outermost scope exits and rolled back if it
+    raises or fail_scope() was called'''
+    depth = getattr(_scope, 'depth', 0)
+    if depth == 0:
+        _scope.writing = False
+        _scope.failed = False
+    _scope.depth = depth + 1
+    try:
+        yield session
+        if depth == 0:
+            if _scope.failed:
+                session.rollback()
+            else:
+                session.commit()
+    except Exception:
+        if depth == 0:
+            session.rollback()
+        raise
+    finally:
+        _scope.depth = depth
+        if depth == 0:
+            session.remove()
+            if _scope.writing:
+                _scope.writing = False
+                _write_lock.release()
+
+
+def fail_scope():
+    '''Roll back the current session_scope instead of committing it'''
+    if getattr(_scope, 'depth', 0):
+        _scope.failed = True
+
+
+def commit():
+    '''Commit now, or flush and leave the commit to the enclosing
+    session_scope'''
+    if getattr(_scope, 'depth', 0):
+        session.flush()
+    else:
+        session.commit()
+        session.close()
+
+
+def after_commit(func, *args):
+    '''Call func(*args) once the enclosing session_scope has committed,
+    right away outside of one'''
+    if getattr(_scope, 'depth', 0):
+        listen(session(), 'after_commit',
+               lambda s: func(*args), once=True)
+    else:
+        func(*args)
+
+
+#  Define models
+roles_users = Table(
+    'roles_users',
+    Base.metadata,
+    Column('user_id', Integer(), ForeignKey('users.id')),
+    Column('role_id', Integer(), ForeignKey('role.id'))
+)
+
+
+class Role(Base):
+    __tablename__ = 'role'
+
+    id = Column(Integer(), primary_key=True)
+    name = Column(String(80), unique=True)
+    description = Column(String(255))
+
+    def __str__(self):
+        return self.name
+
+
+class User(Base):
+    __tablename__ = 'users'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, unique=True)
+    email = Column(String, unique=True)
+    password = Column(String(255))
+    username = Column(String, nullable=True)
+    first_name = Column(String, nullable=True)
+    last_name = Column(String, nullable=True)
+    phone = Column(String, nullable=True)
+    date_of_birth = Column(Date, nullable=True)
+    date = Column(DateTime(timezone=True), server_default=func.now())
+    # set when a broadcast found the bot blocked, cleared on /start
+    blocked = Column(DateTime, nullable=True)
+    orders = relationship('Order', backref='owner')
+    active = Column(Boolean())
+    roles = relationship('Role', secondary=roles_users,
+                         backref=backref('users', lazy='dynamic'))
+
+    def __str__(self):
+        return "{}, {}".format(self.user_id, self.username)
+
+    def __repr__(self):
+        return "{}: {}".format(self.id, self.__str__())
+
+
+class Order(Base):
+    __tablename__ = 'orders'
+    __table_args__ = (
+        # order history of a user, OrderAdmin default sort
+        Index('ix_orders_user_id_date', 'user_id', 'date'),
+        Index('ix_orders_status_date', 'status', 'date'),
+        Index('ix_orders_date', 'date'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey(User.user_id))
+    phone = Column(String)
+    cart = Column(String)
+    date = Column(DateTime(timezone=True), server_default=func.now())
+    address = Column(String)
+    payment_type = Column(String)
+    delivery_type = Column(String)
+    status = Column(String)
+    price = Column(Float)
+
+    def __str__(self):
+        return str(self.id)
+
+
+class Product(Base):
+    __tablename__ = 'products'
+    __table_args__ = (
+        # get_product, get_products_by_category and is_existing_category
+        # filter on category OR subcategory, sqlite answers them with a
+        # MULTI-INDEX OR over these two
+        Index('ix_products_category_title', 'category', 'title'),
+        Index('ix_products_subcategory_title', 'subcategory', 'title'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
+    category = Column(String)
+    subcategory = Column(String)
+    price = Column(Float)
+    weight = Column(String)
+    composition = Column(String)
+    img_name = Column(Unicode(64))
+    img_path = Column(Unicode(128))
+
+    def __unicode__(self):
+        return self.name
+
+
+class OrderItem(Base):
+    '''A line of an order with the product price at order time, the title
+    and subcategory are kept as ordered'''
+    __tablename__ = 'order_items'
+    __table_args__ = (
+        Index('ix_order_items_order_id', 'order_id'),
+        # sales and reorders of a product
+        Index('ix_order_items_product_id_order_id', 'product_id', 'order_id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey(Order.id), nullable=False)
+    # None once the product is removed or for unknown lines of old carts
+    product_id = Column(Integer, ForeignKey(Product.id), nullable=True)
+    title = Column(String)
+    subcategory = Column(String)
+    quantity = Column(Integer, nullable=False)
+    price = Column(Float)
+
+    order = relationship(Order, backref=backref('items', lazy='dynamic'))
+
+    def __str__(self):
+        return f'{self.title} x {self.quantity}'
+
+
+class ProductPhoto(Base):
+    '''Telegram file_id of an uploaded product image, keyed by image path
+    and content hash so a replaced image is uploaded again'''
+    __tablename__ = 'product_photos'
+    __table_args__ = (UniqueConstraint('img_path', 'img_hash'),)
+
+    id = Column(Integer, primary_key=True)
+    img_path = Column(Unicode(128), nullable=False)
+    img_hash = Column(String(40), nullable=False)
+    file_id = Column(String, nullable=False)
+    date = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __str__(self):
+        return self.img_path
+
+
+class Broadcast(Base):
+    '''/replyall message and its progress, see broadcast.py'''
+    __tablename__ = 'broadcasts'
+
+    id = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+    chat_id = Column(Integer)
+    status = Column(String(16), default='running')
+    # users.id of the last recipient handled, sending resumes after it
+    last_user_id = Column(Integer, default=0)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    blocked = Column(Integer, default=0)
+    date = Column(DateTime(timezone=True), server_default=func.now())
+    finished = Column(DateTime(timezone=True), nullable=True)
+
+    def __str__(self):
+        return str(self.id)
+
+
+class BotState(Base):
+    '''Conversation persistence of the bot, one row per user_data, chat_data
+    or conversation entry (see persistence.py)'''
+    __tablename__ = 'bot_state'
+    __table_args__ = (PrimaryKeyConstraint('kind', 'key'),)
+
+    kind = Column(String(64), nullable=False)
+    key = Column(String(64), nullable=False)
+    data = Column(Text, nullable=False)
+    date = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __str__(self):
+        return f'{self.kind} {self.key}'
+
+
+class SalesRollup(Base):
+    '''Sales per day and per hour, kept up to date by add_order and
+    update_order, rebuilt from the orders by rebuild_sales()'''
+    __tablename__ = 'sales_rollups'
+    __table_args__ = (
+        PrimaryKeyConstraint('period', 'start', 'dimension', 'key'),)
+
+    # day or hour
+    period = Column(String(8), nullable=False)
+    start = Column(DateTime, nullable=False)
+    # total (key ''), payment_type, delivery_type, status or product
+    dimension = Column(String(16), nullable=False)
+    key = Column(String(128), nullable=False)
+    orders = Column(Integer, nullable=False, default=0)
+    # cents, not counted for products
+    revenue = Column(Integer, nullable=False, default=0)
+    # items, for total and product
+    quantity = Column(Integer, nullable=False, default=0)
+
+    def __str__(self):
+        return f'{self.period} {self.start} {self.dimension} {self.key}'
+
+
+# Catalog hooks, bump the catalog version stamp so the bot rebuilds its
+# in-memory snapshot (see catalog.py). The stamp lives in the SQLite header
+# (PRAGMA user_version), is written in the same transaction as the product
+# change and is cheap to read from another process.
+@listens_for(Product, 'after_insert')
+@listens_for(Product, 'after_update')
+@listens_for(Product, 'after_delete')
+def bump_catalog_version(mapper, connection, target):
+    version = connection.execute('PRAGMA user_version').scalar()
+    connection.execute(f'PRAGMA user_version = {version + 1}')
+
+
+
+# ===========================  DB wrapper ===========================
+
+# Source https://github.com/pybites/pytip/tree/master/tips
+
+
+def export_orders(since=None, until=None, after_id=None, batch=1000):
+    '''Rows of the orders table in id order, fetched batch rows at a time
+    from a streaming cursor. Iterate before the session is removed.'''
+    query = session.query(*Order.__table__.columns).order_by(Order.id)
+    if after_id is not None:
+        query = query.filter(Order.id > after_id)
+    if since is not None:
+        query = query.filter(Order.date >= since)
+    if until is not None:
+        query = query.filter(Order.date < until)
+    return query.yield_per(batch).execution_options(stream_results=True)
+
+
+def get_catalog_version():
+    return session.execute('PRAGMA user_version').scalar()
+
+
+def get_all_products():
+    return session.query(Product).order_by(Product.id).all()
+
+
+def get_categories():
+    categories = session.query(Product.category).group_by(Product.category).all()
+    categories = [r for r, in categories]
+    return categories
+
+
+def get_subcategories(category):
+    subcats = session.query(Product.subcategory).filter(Product.category == category).group_by(Product.subcategory).all()
+    subcats = [r for r, in subcats]
+    return subcats
+
+
+def get_products_by_category(category):
+    # TODO make this function work with categories and subcategories
+    products = session.query(Product.title).filter(or_(
+        Product.category == category,
+        Product.subcategory == category
+    )).all()
+    products = [r for r, in products]
+    return products
+
+
+def get_user(user_id):
+    user = session.query(User).filter(User.user_id == user_id).first()
+    return user
+
+
+def get_all_users():
+    users = session.query(User).all()
+    return users
+
+
+def get_recipients(after_id, limit):
+    '''Page of (id, user_id) of the users not blocking the bot'''
+    return session.query(User.id, User.user_id).filter(and_(
+        User.id > after_id,
+        User.blocked.is_(None)
+    )).order_by(User.id).limit(limit).all()
+
+
+@serialized_write
+def add_user(user):
+    session.add(User(
+        user_id=user['id'],
+        username=user['username'],
+        first_name=user['first_name'],
+        last_name=user['last_name'],
+        date=datetime.now()
+    ))
+    commit()
+
+
+@serialized_write
+def update_user(user_id, column_name, value):
+    session.query(User).filter(User.user_id == user_id).update({column_name: value})
+    commit()
+
+
+def add_products(product_list):
+    for p in product_list:
+        session.add(Product(
+            title=p[0],
+            category=p[1],
+            subcategory=p[2],
+            price=p[3],
+            weight=p[4],
+            composition=p[5],
+            img_name=p[6],
+            img_path=p[6]
+            ))
+    session.commit()
+
+
+@serialized_write
+def add_order(order):
+    '''order['items'] are the cart lines, dicts with product_id, title,
+    subcategory, price and quantity'''
+    items = order.get('items') or []
+    order = Order(
+        user_id=order['user_id'],
+        phone=order['user_phone'],
+        cart=order['cart'],
+        date=datetime.now(),
+        address=order['address'],
+        payment_type=order['payment_type'],
+        delivery_type=order.get('delivery_type'),
+        status=order['status'],
+        price=order['price']
+    )
+    session.add(order)
+    session.flush()
+    order_id = order.id
+    if items:
+        session.execute(OrderItem.__table__.insert(), [
+            {'order_id': order_id, 'product_id': item['product_id'],
+             'title': item['title'], 'subcategory': item['subcategory'],
+             'quantity': item['quantity'], 'price': item['price']}
+            for item in items])
+    update_sales(add_sales({}, order, items))
+    commit()
+    return order_id
+
+
+@serialized_write
+def update_order(order_id, column_name, value):
+    before = session.query(
+        Order.date, Order.price, Order.payment_type, Order.delivery_type,
+        Order.status).filter(Order.id == order_id).first()
+    if before is None:
+        return
+    session.query(Order).filter(Order.id == order_id).update({column_name: value})
+    after = SimpleNamespace(**dict(before._asdict(), **{column_name: value}))
+    # the product rollups only move with the date
+    items = get_order_items(order_id) if column_name == 'date' else None
+    sales = add_sales({}, before, items, sign=-1)
+    add_sales(sales, after, items)
+    update_sales(sales)
+    commit()
+
+
+def get_order_items(order_id):
+    '''Lines of an order as dicts like add_order takes them'''
+    return [{'product_id': item.product_id, 'title': item.title,
+             'subcategory': item.subcategory, 'price': item.price,
+             'quantity': item.quantity}
+            for item in session.query(OrderItem).filter(
+                OrderItem.order_id == order_id).order_by(OrderItem.id)]
+
+
+@serialized_write
+def add_broadcast(text, chat_id):
+    broadcast = Broadcast(text=text, chat_id=chat_id, status='running',
+                          last_user_id=0, sent=0, failed=0, blocked=0,
+                          date=datetime.now())
+    session.add(broadcast)
+    session.flush()
+    broadcast_id = broadcast.id
+    commit()
+    return broadcast_id
+
+
+def get_broadcast(broadcast_id):
+    return session.query(Broadcast).filter(
+        Broadcast.id == broadcast_id).first()
+
+
+def get_unfinished_broadcasts():
+    broadcasts = session.query(Broadcast.id).filter(
+        Broadcast.status == 'running').order_by(Broadcast.id).all()
+    return [r for r, in broadcasts]
+
+
+@serialized_write
+def update_broadcast(broadcast_id, values):
+    session.query(Broadcast).filter(
+        Broadcast.id == broadcast_id).update(values)
+    commit()
+
+
+def get_photo_file_ids():
+    photos = session.query(ProductPhoto).all()
+    return {(p.img_path, p.img_hash): p.file_id for p in photos}
+
+
+@serialized_write
+def save_photo_file_id(img_path, img_hash, file_id):
+    session.query(ProductPhoto).filter(and_(
+        ProductPhoto.img_path == img_path,
+        ProductPhoto.img_hash == img_hash
+    )).delete()
+    session.add(ProductPhoto(
+        img_path=img_path,
+        img_hash=img_hash,
+        file_id=file_id
+    ))
+    commit()
+
+
+@serialized_write
+def delete_photo_file_id(img_path, img_hash):
+    session.query(ProductPhoto).filter(and_(
+        ProductPhoto.img_path == img_path,
+        ProductPhoto.img_hash == img_hash
+    )).delete()
+    commit()
+
+
+def get_bot_state(kind, key):
+    row = session.query(BotState.data).filter(and_(
+        BotState.kind == kind,
+        BotState.key == key
+    )).first()
+    return row.data if row else None
+
+
+@serialized_write
+def save_bot_state(rows):
+    '''Write (kind, key, data) rows in one transaction, data None deletes'''
+    table = BotState.__table__
+    now = datetime.now()
+    changed = [{'kind': kind, 'key': key, 'data': data, 'date': now}
+               for kind, key, data in rows if data is not None]
+    deleted = [{'k': kind, 'n': key}
+               for kind, key, data in rows if data is None]
+    if changed:
+        session.execute(table.insert().prefix_with('OR REPLACE'), changed)
+    if deleted:
+        session.execute(table.delete().where(and_(
+            table.c.kind == bindparam('k'),
+            table.c.key == bindparam('n'))), deleted)
+    commit()
+
+
+def is_existing_category(text):
+    cat = session.query(Product).filter(
+        or_(
+            Product.category == text,
+            Product.subcategory == text
+            )
+    ).first()
+    return True if cat else False
+
+
+def get_product(product, category):
+    return session.query(Product).filter(and_(
+        Product.title == product,
+        or_(
+            Product.category == category,
+            Product.subcategory == category
+            )
+    )).first()
+
+
+def get_product_by_id(id):
+    p = session.query(Product).filter(Product.id == id).first()
+    p = dict(p.__dict__)
+    p.pop('_sa_instance_state', None)
+    return p
+
+
+# ===========================  Sales rollups ===========================
+
+
+def product_key(title, subcategory):
+    '''Name of a product in the product rollups'''
+    return f'{title} {subcategory}' if subcategory else title
+
+
+def _periods(date):
+    return [('day', date.replace(hour=0, minute=0, second=0, microsecond=0)),
+            ('hour', date.replace(minute=0, second=0, microsecond=0))]
+
+
+def add_sales(sales, order, items=None, sign=1):
+    '''Add sign times the rollups of an order to
+    sales {(period, start, dimension, key): [orders, revenue, quantity]},
+    without the product rollups if items is None'''
+    if order.date is None:
+        return sales
+    cents = round((order.price or 0) * 100) * sign
+    rows = [('total', '', sum(item['quantity'] for item in items or ())),
+            ('payment_type', order.payment_type or '', 0),
+            ('delivery_type', order.delivery_type or '', 0),
+            ('status', order.status or '', 0)]
+    for period, start in _periods(order.date):
+        for dimension, key, quantity in rows:
+            row = sales.setdefault((period, start, dimension, key), [0, 0, 0])
+            row[0] += sign
+            row[1] += cents
+            row[2] += quantity * sign
+        for item in items or ():
+            key = product_key(item['title'], item['subcategory'])
+            row = sales.setdefault((period, start, 'product', key), [0, 0, 0])
+            row[0] += sign
+            row[2] += item['quantity'] * sign
+    return sales
+
+
+_sales_upsert = text(
+    'INSERT INTO sales_rollups '
+    '(period, start, dimension, key, orders, revenue, quantity) '
+    'VALUES (:period, :start, :dimension, :key, :orders, :revenue, :quantity) '
+    'ON CONFLICT (period, start, dimension, key) DO UPDATE SET '
+    'orders = orders + excluded.orders, '
+    'revenue = revenue + excluded.revenue, '
+    'quantity = quantity + excluded.quantity'
+).bindparams(bindparam('start', type_=DateTime()))
+
+
+def update_sales(sales):
+    '''Add the rows of add_sales() to the rollup tables, in the
+    transaction of the caller'''
+    rows = [{'period': period, 'start': start, 'dimension': dimension,
+             'key': key, 'orders': orders, 'revenue': revenue,
+             'quantity': quantity}
+            for (period, start, dimension, key), (orders, revenue, quantity)
+            in sales.items() if orders or revenue or quantity]
+    if rows:
+        session.execute(_sales_upsert, rows)
+
+
+@serialized_write
+def rebuild_sales(batch=1000):
+    '''Recompute the rollups from the orders and their items, returns the
+    number of orders'''
+    sales = {}
+    count = 0
+    rows = session.query(
+        Order.id, Order.date, Order.price, Order.payment_type,
+        Order.delivery_type, Order.status, OrderItem.title,
+        OrderItem.subcategory, OrderItem.quantity
+    ).outerjoin(OrderItem, OrderItem.order_id == Order.id
+                ).order_by(Order.id).yield_per(batch)
+    for _, lines in groupby(rows, key=lambda row: row.id):
+        lines = list(lines)
+        add_sales(sales, lines[0], [
+            {'title': line.title, 'subcategory': line.subcategory,
+             'quantity': line.quantity}
+            for line in lines if line.quantity is not None])
+        count += 1
+    session.query(SalesRollup).delete()
+    update_sales(sales)
+    commit()
+    return count
+
+
+def get_sales(since, until, period='day'):
+    '''{dimension: {key: (orders, revenue in cents, quantity)}} of the
+    rollups starting in [since, until)'''
+    rows = session.query(
+        SalesRollup.dimension, SalesRollup.key,
+        func.sum(SalesRollup.orders), func.sum(SalesRollup.revenue),
+        func.sum(SalesRollup.quantity)
+    ).filter(and_(
+        SalesRollup.period == period,
+        SalesRollup.start >= since,
+        SalesRollup.start < until
+    )).group_by(SalesRollup.dimension, SalesRollup.key).all()
+    sales = {}
+    for dimension, key, orders, revenue, quantity in rows:
+        sales.setdefault(dimension, {})[key] = (orders, revenue, quantity)
+    return sales
+
+
+def get_hourly_sales(since, until):
+    '''[(hour start, orders, revenue in cents)] in [since, until)'''
+    return session.query(
+        SalesRollup.start, SalesRollup.orders, SalesRollup.revenue
+    ).filter(and_(
+        SalesRollup.period == 'hour',
+        SalesRollup.dimension == 'total',
+        SalesRollup.start >= since,
+        SalesRollup.start < until
+    )).order_by(SalesRollup.start).all()
+
+
+def get_sales_summary(since, until):
+    '''Totals, average basket and the splits of [since, until) for the
+    reports, money in the currency'''
+    sales = get_sales(since, until)
+    orders, revenue, quantity = sales.get('total', {}).get('', (0, 0, 0))
+
+    def split(dimension):
+        return sorted(((key or '-', n, cents / 100) for key, (n, cents, _)
+                       in sales.get(dimension, {}).items() if n),
+                      key=lambda row: (-row[1], row[0]))
+    return {
+        'orders': orders,
+        'revenue': revenue / 100,
+        'items': quantity,
+        'average': revenue / orders / 100 if orders else 0,
+        'status': split('status'),
+        'payment_type': split('payment_type'),
+        'delivery_type': split('delivery_type'),
+        'products': sorted(((key, q) for key, (n, _, q)
+                            in sales.get('product', {}).items() if q),
+                           key=lambda row: (-row[1], row[0])),
+    }
+
+
+product_list = (
+    ('Пицца Маргарита', 'Пиццы', '30см', 7.50, '430', 'св. помидоры, сыр моцарелла', 'pizza_margarita.jpg'),
+    ('Пицца Маргарита', 'Пиццы', '45см', 13.00, 530, 'св. помидоры, сыр моцарелла', 'pizza_margarita.jpg'),
+    ('Пицца Барбекина', 'Пиццы', '30см', 11.00, 530, 'куриная грудка в/к, бекон в/к, св. помидоры, кон. огурцы, сыр моцарелла', 'pizza_barbekina.jpg'),
+    ('Пицца Барбекина', 'Пиццы', '45см', 20.00, 1060, 'куриная грудка в/к, бекон в/к, св. помидоры, кон. огурцы, сыр моцарелла', 'pizza_barbekina.jpg'),
+    ('Пицца Вегетарианская', 'Пиццы', '30см', 9.00, 480, 'св. перец, св. шампиньоны,  св. помидоры, лук-порей, маслины, сыр моцарелла', 'pizza_vagatarianskaya.jpg'),
+    ('Пицца Вегетарианская', 'Пиццы', '45см', 16.00, 960, 'св. перец, св. шампиньоны,  св. помидоры, лук-порей, маслины, сыр моцарелла', 'pizza_vagatarianskaya.jpg'),
+    ('Пицца Гаваи', 'Пиццы', '30см', 10.00, 490, 'Ветчина в/к, куриная грудка в/к, кон. ананасы, маслины, сыр моцарелла', 'pizza_gavai.jpg'),
+    ('Пицца Гаваи', 'Пиццы', '45см', 18.00, 980, 'Ветчина в/к, куриная грудка в/к, кон. ананасы, маслины, сыр моцарелла', 'pizza_gavai.jpg'),
+    ('Пицца Деревенская', 'Пиццы', '30см', 10.00, 480, 'колбаса салями, бекон в/к, кон. огурцы, лук порей, сыр моцарелла', 'pizza_derevenskaya.jpg'),
+    ('Пицца Деревенская', 'Пиццы', '45см', 18.00, 960, 'колбаса салями, бекон в/к, кон. огурцы, лук порей, сыр моцарелла', 'pizza_derevenskaya.jpg'),
+    ('Пицца Морская', 'Пиццы', '30см', 16.50, 470, 'семга с/с, мясо креветок, св. перец, маслины, сыр моцарелла', 'pizza_morskaya.jpg'),
+    ('Пицца Морская', 'Пиццы', '45см', 30.00, 940, 'семга с/с, мясо креветок, св. перец, маслины, сыр моцарелла', 'pizza_morskaya.jpg'),
+    ('Пицца Капричиоза', 'Пиццы', '30см', 11.00, 520, 'Ветчина в/к, колбаса "Кабаносы", св. шампиньоны, кон. огурец', 'pizza_kaprichoza.jpg'),
+    ('Пицца Капричиоза', 'Пиццы', '45см', 20.00, 940, 'Ветчина в/к, колбаса "Кабаносы", св. шампиньоны, кон. огурец', 'pizza_kaprichoza.jpg'),
+    ('Пицца Мясное ассорти', 'Пиццы', '30см', 13.00, 530, 'Ветчина в/к, куриная грудка в/к, колбаса салями, бекон в/к, лук порей, сыр моцарелла', 'pizza_myasnoe_assorti.jpg'),
+    ('Пицца Мясное ассорти', 'Пиццы', '45см', 24.00, 1060, 'Ветчина в/к, куриная грудка в/к, колбаса салями, бекон в/к, лук порей, сыр моцарелла', 'pizza_myasnoe_assorti.jpg'),
+    ('Пицца С ветчиной', 'Пиццы', '30см', 8.00, 430, 'ветчина в/к, сыр моцарелла', 'pizza_s_vetchinoy.jpg'),
+    ('Пицца С ветчиной', 'Пиццы', '45см', 14.50, 860, 'ветчина в/к, сыр моцарелла', 'pizza_s_vetchinoy.jpg'),
+    ('Пицца С колбасой', 'Пиццы', '30см', 9.00, 430, 'колбаса салями, сыр моцарелла', 'pizza_s_kilbasoy.jpg'),
+    ('Пицца С колбасой', 'Пиццы', '45см', 16.00, 860, 'колбаса салями, сыр моцарелла', 'pizza_s_kilbasoy.jpg'),
+    ('Пицца Диабло', 'Пиццы', '30см', 11.00, 500, 'колбаса салями, св. шампиньоны, перец халапеньо, соус сальса, сыр моцарелла', 'pizza_diablo.jpg'),
+    ('Пицца Диабло', 'Пиццы', '45см', 20.00, 1000, 'колбаса салями, св. шампиньоны, перец халапеньо, соус сальса, сыр моцарелла', 'pizza_diablo.jpg'),
+    ('Пицца Закрытая', 'Пиццы', '30см', 13.00, 650, 'Ветчина в/к, колбаса салями, кон. огурцы, сыр моцарелла', 'pizza_zakrytaya.jpg'),
+    ('Пицца Закрытая', 'Пиццы', '45см', 24.00, 1300, 'Ветчина в/к, колбаса салями, кон. огурцы, сыр моцарелла', 'pizza_zakrytaya.jpg'),
+    ('Пицца Тутака', 'Пиццы', '30см', 11.00, 560, 'куриная грудка в/к, св. помидоры, св. шампиньоны, св. укроп, сыр моцарелла', 'pizza_tutaka.jpg'),
+    ('Пицца Тутака', 'Пиццы', '45см', 20.00, 1120, 'куриная грудка в/к, св. помидоры, св. шампиньоны, св. укроп, сыр моцарелла', 'pizza_tutaka.jpg'),
+    ('Пицца Кватро', 'Пиццы', '30см', 11.00, 510, 'ветчина в/к, св. перец, св. шампиньоны, маслины, сыр моцарелла', 'pizza_kvatro.jpg'),
+    ('Пицца Кватро', 'Пиццы', '45см', 20.00, 1020, 'ветчина в/к, св. перец, св. шампиньоны, маслины, сыр моцарелла', 'pizza_kvatro.jpg'),
+    ('Пицца Бургер', 'Пиццы', '30см', 11.00, 530, 'фарш гов., бекон в/к, св. помидоры, кон. огурец, соус гриль, соус "Гриль" сыр моцарелла', 'pizza_burger.jpg'),
+    ('Пицца Бургер', 'Пиццы', '45см', 20.00, 1060, 'фарш гов., бекон в/к, св. помидоры, кон. огурец, соус гриль, соус "Гриль" сыр моцарелла', 'pizza_burger.jpg'),
+    ('Пицца Яркая', 'Пиццы', '30см', 11.00, 490, 'ветчина в/к, колбаса салями, св. перец, маслины, св. огурец, сыр моцарелла', 'pizza_yarkaya.jpg'),
+    ('Пицца Яркая', 'Пиццы', '45см', 20.00, 980, 'ветчина в/к, колбаса салями, св. перец, маслины, св. огурец, сыр моцарелла', 'pizza_yarkaya.jpg'),
+    ('Пицца Баварская', 'Пиццы', '30см', 11.00, 490, 'колбаса "Кабаносы", св. перец, св. шампиньоны, сыр моцарелла', 'pizza_bavarskaya.jpg'),
+    ('Пицца Баварская', 'Пиццы', '45см', 20.00, 980, 'колбаса "Кабаносы", св. перец, св. шампиньоны, сыр моцарелла', 'pizza_bavarskaya.jpg'),
+    ('Пицца Суприм', 'Пиццы', '30см', 11.00, 470, 'Ветчина в/к, колбаса "Кабаносы", св. перец, кон. огурец, лук порей, соус "1000 островов", сыр моцарелла', 'pizza_suprim.jpg'),
+    ('Пицца Суприм', 'Пиццы', '45см', 20.00, 940, 'Ветчина в/к, колбаса "Кабаносы", св. перец, кон. огурец, лук порей, соус "1000 островов", сыр моцарелла', 'pizza_suprim.jpg'),
+
+    ('Ролл Канада', 'Роллы', '4шт', 8.00, 125, 'сыр сл., угорь жареный в соусе, огурец, авакадо, кунжут', 'sushi_kanada.jpg'),
+    ('Ролл Канада', 'Роллы', '8шт', 15.00, 250, 'сыр сл., угорь жареный в соусе, огурец, авакадо, кунжут', 'sushi_kanada.jpg'),
+    ('Ролл Филладельфия', 'Роллы', '4шт', 8.00, 125, 'сыр сл., семга с/с, авокадо', 'sushi_filadelfia.jpg'),
+    ('Ролл Филладельфия', 'Роллы', '8шт', 15.00, 250, 'сыр сл., семга с/с, авокадо', 'sushi_filadelfia.jpg'),
+    ('Ролл Аризона', 'Роллы', '4шт', 4.00, 100, 'сыр сл., мясо креветки, авокадо, кунжут', 'sushi_arizona.jpg'),
+    ('Ролл Аризона', 'Роллы', '8шт', 7.50, 200, 'сыр сл., мясо креветки, авокадо, кунжут', 'sushi_arizona.jpg'),
+    ('Ролл Ямато', 'Роллы', '4шт', 2.90, 100, 'сыр сл., семга с/с п/к, имбирь мар., редька мар.', 'sushi_yamato.jpg'),
+    ('Ролл Ямато', 'Роллы', '8шт', 5.40, 200, 'сыр сл., семга с/с п/к, имбирь мар., редька мар.', 'sushi_yamato.jpg'),
+    ('Ролл Такуан кунсей', 'Роллы', '4шт', 3.50, 100, 'сыр сл., семга с/с п/к, салат чука, огурец, редька мар.', 'sushi_takuan_kunsey.jpg'),
+    ('Ролл Такуан кунсей', 'Роллы', '8шт', 6.50, 200, 'сыр сл., семга с/с п/к, салат чука, огурец, редька мар.', 'sushi_takuan_kunsey.jpg'),
+    ('Ролл Гаваи', 'Роллы', '4шт', 2.70, 100, 'куриная грудка в/к, ананас мар., редька мар., сыр чеддер', 'sushi_gavai.jpg'),
+    ('Ролл Гаваи', 'Роллы', '8шт', 5.00, 200, 'куриная грудка в/к, ананас мар., редька мар., сыр чеддер', 'sushi_gavai.jpg'),
+    ('Ролл Риоку', 'Роллы', '4шт', 3.60, 100, 'сыр сл., огурец, семга с/с, икра чер., помидор ', 'sushi_rioku.jpg'),
+    ('Ролл Риоку', 'Роллы', '8шт', 6.70, 200, 'сыр сл., огурец, семга с/с, икра чер., помидор ', 'sushi_rioku.jpg'),
+    ('Ролл Банзай маки', 'Роллы', '4шт', 2.70, 100, 'сыр сл., огурец, семга с/с, икра кр.', 'sushi_banzai_maki.jpg'),
+    ('Ролл Банзай маки', 'Роллы', '8шт', 5.00, 200, 'сыр сл., огурец, семга с/с, икра кр.', 'sushi_banzai_maki.jpg'),
+    ('Ролл Окинава', 'Роллы', '4шт', 2.70, 100, 'сыр сл., огурец, семга с/с', 'sushi_okinava.jpg'),
+    ('Ролл Окинава', 'Роллы', '8шт', 5.00, 200, 'сыр сл., огурец, семга с/с', 'sushi_okinava.jpg'),
+    ('Ролл Бонито маки', 'Роллы', '4шт', 3.40, 100, 'сыр сл., салат чука, семга с/с, хлопья тунца коп.', 'sushi_bonito_maki.jpg'),
+    ('Ролл Бонито маки', 'Роллы', '8шт', 6.30, 200, 'сыр сл., салат чука, семга с/с, хлопья тунца коп.', 'sushi_bonito_maki.jpg'),
+    ('Ролл Эби каппа маки', 'Роллы', '4шт', 2.90, 100, 'сыр сл., огурец, мясо креветки', 'sushi_ebi_kappa_maki.jpg'),
+    ('Ролл Эби каппа маки', 'Роллы', '8шт', 5.30, 200, 'сыр сл., огурец, мясо креветки', 'sushi_ebi_kappa_maki.jpg'),
+    ('Ролл Сяке маки', 'Роллы', '4шт', 3.30, 100, 'сыр сл., семга с/с', 'sushi_syake_maki.jpg'),
+    ('Ролл Сяке маки', 'Роллы', '8шт', 6.10, 200, 'сыр сл., семга с/с', 'sushi_syake_maki.jpg'),
+    ('Ролл Вакоме маки', 'Роллы', '4шт', 4.50, 100, 'сыр сл., семга с/с, помидор, салат чука', 'sushi_vakome_maki.jpg'),
+    ('Ролл Вакоме маки', 'Роллы', '8шт', 8.50, 200, 'сыр сл., семга с/с, помидор, салат чука', 'sushi_vakome_maki.jpg'),
+    ('Ролл Вегетеринский', 'Роллы', '4шт', 3.00, 100, 'сыр сл., помидор, авокадо, перец', 'sushi_vagatarianskiy.jpg'),
+    ('Ролл Вегетеринский', 'Роллы', '8шт', 5.50, 200, 'сыр сл., помидор, авокадо, перец', 'sushi_vagatarianskiy.jpg'),
+    ('Ролл Сяке Хеяши маки', 'Роллы', '4шт', 3.60, 100, 'сыр сл., семга с/с, салат чука', 'sushi_syake_heyashi_maki.jpg'),
+    ('Ролл Сяке Хеяши маки', 'Роллы', '8шт', 6.70, 200, 'сыр сл., семга с/с, салат чука', 'sushi_syake_heyashi_maki.jpg'),
+    ('Ролл Косе маки', 'Роллы', '4шт', 2.70, 100, 'сыр сл., перец, семга с/с', 'sushi_kose_maki.jpg'),
+    ('Ролл Косе маки', 'Роллы', '8шт', 5.00, 200, 'сыр сл., перец, семга с/с', 'sushi_kose_maki.jpg'),
+    ('Ролл Грин маки', 'Роллы', '4шт', 3.20, 100, 'сыр сл., семга с/с п/к, перец, укроп', 'sushi_grin_maki.jpg'),
+    ('Ролл Грин маки', 'Роллы', '8шт', 6.00, 200, 'сыр сл., семга с/с п/к, перец, укроп', 'sushi_grin_maki.jpg'),
+    ('Ролл Киото', 'Роллы', '4шт', 3.00, 100, 'сыр сл., семга с/с, перец, огурец', 'sushi_kioto.jpg'),
+    ('Ролл Киото', 'Роллы', '8шт', 5.50, 200, 'сыр сл., семга с/с, перец, огурец', 'sushi_kioto.jpg'),
+    ('Ролл Унаги маки', 'Роллы', '4шт', 4.50, 100, 'угорь жар. в соусе, огурец', 'sushi_unagii_maki.jpg'),
+    ('Ролл Унаги маки', 'Роллы', '8шт', 8.50, 200, 'угорь жар. в соусе, огурец', 'sushi_unagii_maki.jpg'),
+    ('Ролл Калифорния', 'Роллы', '4шт', 2.70, 100, 'сыр сл., крабовые палочки, огурец, икра кр.', 'sushi_kaliforniya.jpg'),
+    ('Ролл Калифорния', 'Роллы', '8шт', 5.00, 200, 'сыр сл., крабовые палочки, огурец, икра кр.', 'sushi_kaliforniya.jpg'),
+    ('Ролл Аляска', 'Роллы', '4шт', 4.50, 100, 'сыр сл., угорь жар. в соусе, огурец, икра кр., кунжут', 'sushi_alaska.jpg'),
+    ('Ролл Аляска', 'Роллы', '8шт', 8.50, 200, 'сыр сл., угорь жар. в соусе, огурец, икра кр., кунжут', 'sushi_alaska.jpg'),
+
+    ('Бургер Гамбургер', 'Бургеры', None, 2.00, 130, 'Булочка, говяжья котлета, огурец кон., кетчуп', 'burger_hamburger.jpg'),
+    ('Бургер Чизбургер', 'Бургеры', None, 2.80, 180, 'Булочка, говяжья котлета, огурец кон., помидор св., салат, сыр чедер, соус 1000 островов.', 'burger_chizburger.png'),
+    ('Бургер Чикенбургер', 'Бургеры', None, 2.80, 190, 'Булочка, куриная котлета, огурец св., помидор св., салат, сыр чедер, горчичный соус', 'burger_chikenburger.png'),
+    ('Бургер Мехико', 'Бургеры', None, 3.00, 180, 'Булочка, говяжья котлета, огурец кон., св. помидор, перец халапеньо, соус сальса', 'burger_mehiko.jpg'),
+    ('Бургер Барбекю', 'Бургеры', None, 3.00, 180, 'Булочка, куриная котлета, огурец кон., лук мар., салат, бекон, сыр чедер, соус 1000 островов', 'burger_barbq.jpg'),
+    ('Бургер Фишбургер', 'Бургеры', None, 3.00, 180, 'Булочка, филе хека в понировке, салат, помидор св., сосус тар-тар', 'burger_fishburger.jpg'),
+    ('Бургер Дабл биф', 'Бургеры', None, 6.50, None, 'Булочка, говяжья котлета, помидо св., салат, сыр чедер, соус гриль', 'burger_dubl_beef.jpg'),
+    ('Бургер Дабл чикен', 'Бургеры', None, 6.50, None, 'Булочка, куриная котлета, помидор св., салат, сыр чедер, соус гриль', 'burger_dabl_chiken.jpg'),
+
+    ('Драник С курицей', 'Драник', None, 3.20, 220, 'картофельные оладьи, куриная котлета, помидор св., соус тар-тар', 'dranik_s_kuritsey.jpg'),
+    ('Драник С говядиной', 'Драник', None, 3.20, 210, 'картофельные оладьи, говяжья котлета, помидор св., соус тар-тар', 'dranik_s_govuadinoy.jpg'),
+    ('Драник С семгой', 'Драник', None, 4.00, 200, 'картофельные оладьи, семга с/с, помидор св., соус тар-тар', 'dranik_s_semgoy.jpg'),
+
+    ('Картофель фри большой', 'Закуски', None, 2.40, 150, 'картофель фри', 'snacks_kartofel_free.jpg'),
+    ('Картофель фри малый', 'Закуски', None, 2.00, 100, 'картофель фри', 'snacks_kartofel_free.jpg'),
+    ('Картофельные шарики большие', 'Закуски', None, 2.40, 150, 'картофельные шарики', 'snacks_shariki.jpg'),
+    ('Картофельные шарики малые', 'Закуски', None, 2.00, 100, 'картофельные шарики', 'snacks_shariki.jpg'),
+    ('Наггетсы большие', 'Закуски', None, 5.00, 150, 'наггетсы', 'snacks_naggetsy.jpg'),
+    ('Наггетсы малые', 'Закуски', None, 4.00, 100, 'наггетсы', 'snacks_naggetsy.jpg'),
+
+    ('Квас ж/б 0,5', 'Напитки', None, 1.50, 500, None, 'pepsicola.jpg'),
+    ('Квас 0,5', 'Напитки', None, 1.50, 500, None, 'pepsicola.jpg'),
+    ('Pepsi 0,5', 'Напитки', None, 1.50, 500, None, 'pepsicola.jpg'),
+    ('Mirinda 0,5', 'Напитки', None, 1.50, 500, None, 'pepsicola.jpg'),
+    ('7up 0,5', 'Напитки', None, 1.50, 500, None, 'pepsicola.jpg'),
+    ('Pepsi 0,33', 'Напитки', None, 1.30, 330, None, 'pepsicola.jpg'),
+    ('Mirinda 0,33', 'Напитки', None, 1.30, 330, None, 'pepsicola.jpg'),
+    ('7up 0,33', 'Напитки', None, 1.30, 330, None, 'pepsicola.jpg'),
+    ('Pepsi 0,25', 'Напитки', None, 1.30, 250, None, 'pepsicola.jpg'),
+    ('Mirinda 0,25', 'Напитки', None, 1.30, 250, None, 'pepsicola.jpg'),
+    ('7up 0,25', 'Напитки', None, 1.30, 250, None, 'pepsicola.jpg'),
+    ('Сок 1л', 'Напитки', None, 3.50, 1000, None, 'pepsicola.jpg'),
+    ('Сок 0,2л', 'Напитки', None, 1.50, 200, None, 'pepsicola.jpg'),
+    ('Молочные коктейли', 'Напитки', None, 2.80, 200, None, 'coctail.jpg'),
+    ('Чай и кофе', 'Напитки', None, 2.00, 200, None, 'tea_coffee.jpg')
+)
+
+
+# ===========================  DB wrapper ===========================
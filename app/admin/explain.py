@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+'''Print the sqlite query plan of every DB helper the bot uses.
+
+Usage (from app/admin, after `python manage.py db upgrade`):
+
+    python explain.py
+
+Exits with status 1 when a helper scans a whole table without an index,
+except for the helpers that read every row by design.
+'''
+
+import sys
+
+from sqlalchemy import event
+
+import admin  # noqa: F401, binds data to the configured database
+import data as db
+
+# helpers that read the whole table on purpose
+FULL_SCAN_OK = ('get_all_products', 'get_all_users', 'get_photo_file_ids',
+                'get_unfinished_broadcasts')
+
+
+def sample_args():
+    product = db.session.query(db.Product).first()
+    user = db.session.query(db.User).first()
+    title = product.title if product else ''
+    category = product.category if product else ''
+    subcategory = product.subcategory if product else ''
+    product_id = product.id if product else 0
+    user_id = user.user_id if user else 0
+    return (
+        ('get_categories', db.get_categories, ()),
+        ('get_subcategories', db.get_subcategories, (category,)),
+        ('get_products_by_category',
+         db.get_products_by_category, (subcategory or category,)),
+        ('is_existing_category', db.is_existing_category, (category,)),
+        ('get_product', db.get_product, (title, subcategory or category)),
+        ('get_product_by_id', db.get_product_by_id, (product_id,)),
+        ('get_user', db.get_user, (user_id,)),
+        ('get_bot_state', db.get_bot_state, ('user_data', str(user_id))),
+        ('get_recipients', db.get_recipients, (0, 200)),
+        ('get_unfinished_broadcasts', db.get_unfinished_broadcasts, ()),
+        ('order_history', lambda: db.session.query(db.Order).filter(
+            db.Order.user_id == user_id).order_by(db.Order.date).all(), ()),
+        ('OrderAdmin list', lambda: db.session.query(db.Order).order_by(
+            db.Order.user_id, db.Order.date).limit(20).all(), ()),
+        ('get_all_products', db.get_all_products, ()),
+        ('get_all_users', db.get_all_users, ()),
+        ('get_photo_file_ids', db.get_photo_file_ids, ()),
+    )
+
+
+def main():
+    statements = []
+
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    failed = []
+    for name, helper, args in sample_args():
+        del statements[:]
+        try:
+            helper(*args)
+        except Exception as ex:
+            # e.g. get_product_by_id on an empty table
+            print(f'{name}: {ex}')
+        captured = list(statements)
+
+        print(f'== {name}')
+        connection = db.engine.raw_connection()
+        try:
+            for statement, parameters in captured:
+                print(' '.join(statement.split()))
+                cursor = connection.cursor()
+                cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+                plan = cursor.fetchall()
+                for row in plan:
+                    detail = row[-1]
+                    print(f'    {detail}')
+                    if detail.startswith('SCAN') and 'INDEX' not in detail \
+                            and name not in FULL_SCAN_OK:
+                        failed.append(name)
+        finally:
+            connection.close()
+        print()
+
+    if failed:
+        print('full table scans in: ' + ', '.join(sorted(set(failed))))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
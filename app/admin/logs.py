@@ -0,0 +1,177 @@
+'''Logging setup shared by the bot and the admin panel.
+
+Loggers only put records in a bounded queue, a listener thread formats
+them as JSON lines and writes the file, so a slow disk or a log rotation
+never holds up a handler. When the queue is full records are dropped and
+counted instead of blocking, the count is logged once there is room.
+
+The file is rotated when it reaches max_bytes or every interval seconds,
+whichever comes first, and the rotated files are gzipped:
+bot.log.1.gz is the newest, backup_count files are kept. Each process
+writes its own file, rotation of one file by two processes is not safe.
+'''
+
+import os
+import io
+import json
+import gzip
+import time
+import queue
+import atexit
+import shutil
+import logging
+import logging.handlers
+
+# records waiting for the listener thread
+QUEUE_SIZE = 10000
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 10
+# seconds, rotate at least once a day
+INTERVAL = 24 * 60 * 60
+
+
+class JsonFormatter(logging.Formatter):
+    '''One JSON object per line'''
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _gzip_name(name):
+    return name + '.gz'
+
+
+def _gzip_rotate(source, dest):
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    '''Size and time based rotation, rotated files are gzipped'''
+
+    def __init__(self, filename, max_bytes=MAX_BYTES,
+                 backup_count=BACKUP_COUNT, interval=INTERVAL):
+        super(RotatingFileHandler, self).__init__(
+            filename, maxBytes=max_bytes, backupCount=backup_count,
+            encoding='utf-8', delay=True)
+        self.namer = _gzip_name
+        self.rotator = _gzip_rotate
+        self.interval = interval
+        self.rollover_at = self._next_rollover()
+
+    def _next_rollover(self):
+        try:
+            started = os.stat(self.baseFilename).st_mtime
+        except OSError:
+            started = time.time()
+        return min(started, time.time()) + self.interval
+
+    def shouldRollover(self, record):
+        if self.interval and time.time() >= self.rollover_at \
+                and os.path.exists(self.baseFilename):
+            return True
+        return super(RotatingFileHandler, self).shouldRollover(record)
+
+    def doRollover(self):
+        super(RotatingFileHandler, self).doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    '''Never blocks, drops and counts records when the queue is full'''
+
+    def __init__(self, queue):
+        super(QueueHandler, self).__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # the listener formats, only make the record safe to hand over
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            try:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING,
+                    'levelname': 'WARNING',
+                    'msg': f'logs: {dropped} records dropped'}))
+            except queue.Full:
+                self.dropped += dropped
+
+
+_listener = None
+
+
+def setup(filename, logger=None, level=logging.INFO,
+          max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT,
+          interval=INTERVAL, queue_size=QUEUE_SIZE):
+    '''Send the records of logger (the root logger by default) through
+    the queue to filename, returns the file handler'''
+    global _listener
+    handler = RotatingFileHandler(
+        filename, max_bytes=max_bytes, backup_count=backup_count,
+        interval=interval)
+    handler.setFormatter(JsonFormatter())
+
+    records = queue.Queue(maxsize=queue_size)
+    target = logging.getLogger(logger)
+    target.addHandler(QueueHandler(records))
+    target.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    atexit.register(stop)
+    return handler
+
+
+def stop():
+    '''Write the queued records and stop the listener thread'''
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def compressed_tail(filename, max_bytes=512 * 1024):
+    '''Gzipped last max_bytes of a log file, starting at a whole line'''
+    with open(filename, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(size - max_bytes, 0))
+        data = f.read()
+    if size > max_bytes:
+        data = data[data.find(b'\n') + 1:]
+    buffer = io.BytesIO()
+    with gzip.GzipFile(
+            filename=os.path.basename(filename), mode='wb',
+            fileobj=buffer) as f:
+        f.write(data)
+    buffer.seek(0)
+    buffer.name = os.path.basename(filename) + '.gz'
+    return buffer
@@ -0,0 +1,114 @@
+"""initial schema
+
+Databases created before migrations were introduced already have these
+tables (build_sample_db / db.create_all), only the missing ones are created.
+
+Revision ID: 3f1c2a9b7d10
+Revises:
+Create Date: 2026-10-18 19:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9b7d10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'role' not in tables:
+        op.create_table(
+            'role',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=80), nullable=True),
+            sa.Column('description', sa.String(length=255), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('name')
+        )
+    if 'users' not in tables:
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('email', sa.String(), nullable=True),
+            sa.Column('password', sa.String(length=255), nullable=True),
+            sa.Column('username', sa.String(), nullable=True),
+            sa.Column('first_name', sa.String(), nullable=True),
+            sa.Column('last_name', sa.String(), nullable=True),
+            sa.Column('phone', sa.String(), nullable=True),
+            sa.Column('date_of_birth', sa.Date(), nullable=True),
+            sa.Column('date', sa.DateTime(timezone=True),
+                      server_default=sa.text('(CURRENT_TIMESTAMP)'),
+                      nullable=True),
+            sa.Column('active', sa.Boolean(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email'),
+            sa.UniqueConstraint('user_id')
+        )
+    if 'roles_users' not in tables:
+        op.create_table(
+            'roles_users',
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('role_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['role_id'], ['role.id'], ),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], )
+        )
+    if 'orders' not in tables:
+        op.create_table(
+            'orders',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('phone', sa.String(), nullable=True),
+            sa.Column('cart', sa.String(), nullable=True),
+            sa.Column('date', sa.DateTime(timezone=True),
+                      server_default=sa.text('(CURRENT_TIMESTAMP)'),
+                      nullable=True),
+            sa.Column('address', sa.String(), nullable=True),
+            sa.Column('payment_type', sa.String(), nullable=True),
+            sa.Column('status', sa.String(), nullable=True),
+            sa.Column('price', sa.Float(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'products' not in tables:
+        op.create_table(
+            'products',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(), nullable=True),
+            sa.Column('category', sa.String(), nullable=True),
+            sa.Column('subcategory', sa.String(), nullable=True),
+            sa.Column('price', sa.Float(), nullable=True),
+            sa.Column('weight', sa.String(), nullable=True),
+            sa.Column('composition', sa.String(), nullable=True),
+            sa.Column('img_name', sa.Unicode(length=64), nullable=True),
+            sa.Column('img_path', sa.Unicode(length=128), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'product_photos' not in tables:
+        op.create_table(
+            'product_photos',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('img_path', sa.Unicode(length=128), nullable=False),
+            sa.Column('img_hash', sa.String(length=40), nullable=False),
+            sa.Column('file_id', sa.String(), nullable=False),
+            sa.Column('date', sa.DateTime(timezone=True),
+                      server_default=sa.text('(CURRENT_TIMESTAMP)'),
+                      nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('img_path', 'img_hash')
+        )
+
+
+def downgrade():
+    op.drop_table('product_photos')
+    op.drop_table('products')
+    op.drop_table('orders')
+    op.drop_table('roles_users')
+    op.drop_table('users')
+    op.drop_table('role')
@@ -0,0 +1,48 @@
+"""sales_rollups table and orders.delivery_type
+
+Run `python manage.py rebuild_sales` afterwards to fill the rollups from
+the existing orders.
+
+Revision ID: 6e3b9a7f2c48
+Revises: d81f3b6a9c24
+Create Date: 2026-10-18 23:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e3b9a7f2c48'
+down_revision = 'd81f3b6a9c24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    columns = [c['name'] for c in inspector.get_columns('orders')]
+    if 'delivery_type' not in columns:
+        with op.batch_alter_table('orders') as batch_op:
+            batch_op.add_column(sa.Column('delivery_type', sa.String(),
+                                          nullable=True))
+
+    if 'sales_rollups' not in inspector.get_table_names():
+        op.create_table(
+            'sales_rollups',
+            sa.Column('period', sa.String(length=8), nullable=False),
+            sa.Column('start', sa.DateTime(), nullable=False),
+            sa.Column('dimension', sa.String(length=16), nullable=False),
+            sa.Column('key', sa.String(length=128), nullable=False),
+            sa.Column('orders', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Integer(), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('period', 'start', 'dimension', 'key')
+        )
+
+
+def downgrade():
+    op.drop_table('sales_rollups')
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_column('delivery_type')
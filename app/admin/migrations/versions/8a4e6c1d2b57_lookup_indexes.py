@@ -0,0 +1,38 @@
+"""indexes for the hot lookup columns
+
+Revision ID: 8a4e6c1d2b57
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-18 19:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6c1d2b57'
+down_revision = '3f1c2a9b7d10'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_products_category_title', 'products', ['category', 'title']),
+    ('ix_products_subcategory_title', 'products', ['subcategory', 'title']),
+    ('ix_orders_user_id_date', 'orders', ['user_id', 'date']),
+    ('ix_orders_status_date', 'orders', ['status', 'date']),
+    ('ix_orders_date', 'orders', ['date']),
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        # db.create_all() already creates them on new databases
+        existing = [i['name'] for i in inspector.get_indexes(table)]
+        if name not in existing:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
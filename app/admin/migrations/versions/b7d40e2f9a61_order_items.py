@@ -0,0 +1,95 @@
+"""order_items table, filled from the cart strings of the existing orders
+
+Cart lines are "title category subcategory x quantity", joined with "||".
+They are matched to the products by that text, the unit price is the
+current product price. Lines of products that no longer exist keep their
+text as the title, without a product_id and a price.
+
+Revision ID: b7d40e2f9a61
+Revises: 6e3b9a7f2c48
+Create Date: 2026-10-19 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d40e2f9a61'
+down_revision = '6e3b9a7f2c48'
+branch_labels = None
+depends_on = None
+
+BATCH = 1000
+
+orders = sa.table('orders', sa.column('id', sa.Integer),
+                  sa.column('cart', sa.String))
+products = sa.table('products', sa.column('id', sa.Integer),
+                    sa.column('title', sa.String),
+                    sa.column('category', sa.String),
+                    sa.column('subcategory', sa.String),
+                    sa.column('price', sa.Float))
+
+
+def parse_cart(order_id, cart, known):
+    for line in (cart or '').split('||'):
+        name, sep, quantity = line.strip().rpartition(' x ')
+        if not sep or not quantity.isdigit():
+            continue
+        name = name.strip()
+        product = known.get(name)
+        if product is None and name.endswith(' None'):
+            # no subcategory
+            name = name[:-len(' None')]
+        yield {
+            'order_id': order_id,
+            'product_id': product.id if product else None,
+            'title': product.title if product else name,
+            'subcategory': product.subcategory if product else None,
+            'quantity': int(quantity),
+            'price': product.price if product else None,
+        }
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'order_items' in sa.inspect(bind).get_table_names():
+        # db.create_all() already created it, the orders came after
+        return
+
+    order_items = op.create_table(
+        'order_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=True),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('subcategory', sa.String(), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('price', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_order_items_order_id', 'order_items', ['order_id'],
+                    unique=False)
+    op.create_index('ix_order_items_product_id_order_id', 'order_items',
+                    ['product_id', 'order_id'], unique=False)
+
+    known = {f'{p.title} {p.category} {p.subcategory}': p
+             for p in bind.execute(sa.select([products]))}
+    rows = []
+    for order in bind.execute(
+            sa.select([orders]).order_by(orders.c.id)).fetchall():
+        rows.extend(parse_cart(order.id, order.cart, known))
+        if len(rows) >= BATCH:
+            bind.execute(order_items.insert(), rows)
+            rows = []
+    if rows:
+        bind.execute(order_items.insert(), rows)
+
+
+def downgrade():
+    op.drop_index('ix_order_items_product_id_order_id',
+                  table_name='order_items')
+    op.drop_index('ix_order_items_order_id', table_name='order_items')
+    op.drop_table('order_items')
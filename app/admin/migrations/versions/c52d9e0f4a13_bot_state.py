@@ -0,0 +1,36 @@
+"""bot_state table for the conversation persistence
+
+Revision ID: c52d9e0f4a13
+Revises: 8a4e6c1d2b57
+Create Date: 2026-10-18 20:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52d9e0f4a13'
+down_revision = '8a4e6c1d2b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'bot_state' not in tables:
+        op.create_table(
+            'bot_state',
+            sa.Column('kind', sa.String(length=64), nullable=False),
+            sa.Column('key', sa.String(length=64), nullable=False),
+            sa.Column('data', sa.Text(), nullable=False),
+            sa.Column('date', sa.DateTime(timezone=True),
+                      server_default=sa.text('(CURRENT_TIMESTAMP)'),
+                      nullable=True),
+            sa.PrimaryKeyConstraint('kind', 'key')
+        )
+
+
+def downgrade():
+    op.drop_table('bot_state')
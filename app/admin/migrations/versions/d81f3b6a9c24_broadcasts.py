@@ -0,0 +1,50 @@
+"""broadcasts table and users.blocked
+
+Revision ID: d81f3b6a9c24
+Revises: c52d9e0f4a13
+Create Date: 2026-10-18 21:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f3b6a9c24'
+down_revision = 'c52d9e0f4a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    columns = [c['name'] for c in inspector.get_columns('users')]
+    if 'blocked' not in columns:
+        with op.batch_alter_table('users') as batch_op:
+            batch_op.add_column(sa.Column('blocked', sa.DateTime(),
+                                          nullable=True))
+
+    if 'broadcasts' not in inspector.get_table_names():
+        op.create_table(
+            'broadcasts',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('text', sa.Text(), nullable=False),
+            sa.Column('chat_id', sa.Integer(), nullable=True),
+            sa.Column('status', sa.String(length=16), nullable=True),
+            sa.Column('last_user_id', sa.Integer(), nullable=True),
+            sa.Column('sent', sa.Integer(), nullable=True),
+            sa.Column('failed', sa.Integer(), nullable=True),
+            sa.Column('blocked', sa.Integer(), nullable=True),
+            sa.Column('date', sa.DateTime(timezone=True),
+                      server_default=sa.text('(CURRENT_TIMESTAMP)'),
+                      nullable=True),
+            sa.Column('finished', sa.DateTime(timezone=True), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('broadcasts')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('blocked')
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+'''Concurrent write stress run for the shared sqlite database.
+
+Runs the bot's write pattern (several dispatcher threads registering users,
+updating them and placing orders) and the admin panel's pattern (product
+edits and full order exports) in two processes against a scratch copy of
+the schema, then reports throughput and "database is locked" failures.
+
+Usage (from app/admin):
+
+    python stress.py [seconds] [bot threads]
+
+Exits with status 1 if any operation failed.
+'''
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import multiprocessing
+
+from sqlalchemy.exc import OperationalError
+
+
+def _admin(settings):
+    os.environ['TUTAKA_ADMIN_SETTINGS'] = settings
+    import admin
+    return admin
+
+
+def setup(settings):
+    admin = _admin(settings)
+    admin.db.create_all()
+    admin.add_products(admin.product_list)
+
+
+def bot_process(database, seconds, threads, results):
+    # the bot uses data.py without the Flask app
+    import data as db
+    db.configure('sqlite:///' + database)
+    stats = {'ops': 0, 'errors': 0, 'locked': 0, 'latency': []}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker(n):
+        user_id = n * 1000000
+        while time.monotonic() < deadline:
+            user_id += 1
+            user = {'id': user_id, 'username': f'u{user_id}',
+                    'first_name': 'Stress', 'last_name': None}
+            started = time.monotonic()
+            try:
+                db.add_user(user)
+                db.update_user(user_id, 'phone', '375290000000')
+                db.get_user(user_id)
+                order_id = db.add_order({
+                    'user_id': user_id,
+                    'user_phone': '375290000000',
+                    'cart': 'Пицца Маргарита Пиццы 30см x 1  || ',
+                    'address': 'stress',
+                    'payment_type': 'cash',
+                    'status': 'initial',
+                    'price': 7.5})
+                db.update_order(order_id, 'status', 'confirmed')
+                error = None
+            except OperationalError as ex:
+                error = ex
+                db.session.rollback()
+            elapsed = time.monotonic() - started
+            with lock:
+                stats['ops'] += 1
+                stats['latency'].append(elapsed)
+                if error is not None:
+                    stats['errors'] += 1
+                    if 'locked' in str(error):
+                        stats['locked'] += 1
+            db.session.remove()
+
+    pool = [threading.Thread(target=worker, args=(n + 1,))
+            for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results['bot'] = stats
+
+
+def admin_process(settings, seconds, results):
+    db = _admin(settings)
+    stats = {'ops': 0, 'errors': 0, 'locked': 0, 'latency': []}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            # ProductAdmin edit, bumps the catalog version as well
+            product = db.db.session.query(db.Product).first()
+            product.price = round(product.price + 0.01, 2)
+            db.db.session.commit()
+            # export of every order, as OrderAdmin / export_orders
+            for order in db.db.session.query(db.Order).yield_per(500):
+                pass
+            error = None
+        except OperationalError as ex:
+            error = ex
+            db.db.session.rollback()
+        stats['ops'] += 1
+        stats['latency'].append(time.monotonic() - started)
+        if error is not None:
+            stats['errors'] += 1
+            if 'locked' in str(error):
+                stats['locked'] += 1
+        db.db.session.remove()
+    results['admin'] = stats
+
+
+def report(name, stats, seconds):
+    latency = sorted(stats['latency']) or [0]
+    p50 = latency[len(latency) // 2] * 1000
+    p99 = latency[min(len(latency) - 1, int(len(latency) * 0.99))] * 1000
+    print(f'{name}: {stats["ops"]} ops, {stats["ops"] / seconds:.1f} ops/s, '
+          f'p50 {p50:.1f} ms, p99 {p99:.1f} ms, '
+          f'{stats["errors"]} errors ({stats["locked"]} locked)')
+
+
+def main(seconds=10, threads=4):
+    workdir = tempfile.mkdtemp(prefix='tutaka-stress-')
+    settings = os.path.join(workdir, 'settings.py')
+    with open(settings, 'w') as f:
+        database = os.path.join(workdir, 'db.sqlite')
+        f.write(f'SQLALCHEMY_DATABASE_URI = {"sqlite:///" + database!r}\n')
+
+    ctx = multiprocessing.get_context('spawn')
+    setup_process = ctx.Process(target=setup, args=(settings,))
+    setup_process.start()
+    setup_process.join()
+
+    manager = ctx.Manager()
+    results = manager.dict()
+    processes = [
+        ctx.Process(target=bot_process,
+                    args=(database, seconds, threads, results)),
+        ctx.Process(target=admin_process, args=(settings, seconds, results)),
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    print(f'database: {database}')
+    failed = 0
+    for name in ('bot', 'admin'):
+        stats = results.get(name)
+        if stats is None:
+            print(f'{name}: process crashed')
+            failed += 1
+            continue
+        report(name, stats, seconds)
+        failed += stats['errors']
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(a) for a in sys.argv[1:3]]))
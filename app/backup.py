@@ -0,0 +1,181 @@
+'''Database snapshots for /getdb.
+
+    /getdb          the whole database
+    /getdb new      rows added since the last snapshot
+
+The copy is made with the SQLite online backup API, PAGES pages per step
+with a short sleep in between. The source connection holds a read
+transaction for the whole copy: in WAL mode it sees one point in time and
+blocks neither the bot nor the admin panel, without it every write of
+another connection would restart the backup. The copy is gzipped and sent
+to the admin from its own thread, one at a time, and removed.
+
+"new" sends an SQL file instead, INSERT OR REPLACE statements of the rows
+of the snapshot with an id above the last id of the previous snapshot,
+for every table with an integer id. The ids are kept in the bot_state
+table and only moved once the file was sent. Rows changed in place, e.g.
+the status of an older order, are not in it, there is no modification
+time to find them by; take a full snapshot for those.
+'''
+
+import os
+import time
+import gzip
+import shutil
+import logging
+import sqlite3
+import tempfile
+import threading
+
+from datetime import datetime
+
+import mqbot
+from admin import data as db
+
+logger = logging.getLogger(__name__)
+
+# pages copied per backup step and seconds between the steps
+PAGES = 256
+SLEEP = 0.005
+# bot_state kind of the last ids, one row per table
+WATERMARK = 'backup'
+
+_lock = threading.Lock()
+
+
+def parse_args(args):
+    '''True for an incremental dump'''
+    if not args:
+        return False
+    if args == ['new']:
+        return True
+    raise ValueError(args)
+
+
+def snapshot(source, target, pages=PAGES, sleep=SLEEP):
+    '''Consistent copy of the database file source to target'''
+    src = sqlite3.connect(source, isolation_level=None)
+    dst = sqlite3.connect(target, isolation_level=None)
+    try:
+        src.execute('BEGIN')
+        src.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+        src.backup(dst, pages=pages, sleep=sleep)
+        src.execute('COMMIT')
+        # a single file that opens without the -wal next to it
+        dst.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        dst.close()
+        src.close()
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def id_tables(conn):
+    '''Tables with an integer id'''
+    tables = [name for name, in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' "
+        "AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    return [table for table in tables if 'id' in _columns(conn, table)]
+
+
+def last_ids(conn, tables):
+    return {table: conn.execute(f'SELECT max(id) FROM "{table}"').fetchone()[0]
+            for table in tables}
+
+
+def write_dump(conn, path, after):
+    '''Write the rows with an id above after[table] as gzipped SQL,
+    returns the number of rows'''
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write('BEGIN TRANSACTION;\n')
+        for table in sorted(after):
+            columns = _columns(conn, table)
+            names = ', '.join(f'"{column}"' for column in columns)
+            values = " || ',' || ".join(f'quote("{column}")'
+                                        for column in columns)
+            # sqlite quotes the values the way .dump does
+            for statement, in conn.execute(
+                    f'SELECT \'INSERT OR REPLACE INTO "{table}" ({names}) '
+                    f'VALUES(\' || {values} || \');\' FROM "{table}" '
+                    f'WHERE id > ? ORDER BY id', (after[table],)):
+                f.write(statement + '\n')
+                count += 1
+        f.write('COMMIT;\n')
+    return count
+
+
+def compress(source, target):
+    with open(source, 'rb') as src, gzip.open(target, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+def export(bot, chat_id, incremental=False):
+    '''Snapshot the database and send it to chat_id'''
+    directory = tempfile.mkdtemp(prefix='backup-')
+    copy = os.path.join(directory, 'db.sqlite')
+    stamp = f'{datetime.now():%Y%m%d-%H%M%S}'
+    try:
+        started = time.monotonic()
+        snapshot(db.engine.url.database, copy)
+        conn = sqlite3.connect(copy)
+        try:
+            tables = id_tables(conn)
+            last = last_ids(conn, tables)
+            if incremental:
+                filename = f'db-{stamp}-new.sql.gz'
+                after = {table: int(db.get_bot_state(WATERMARK, table) or 0)
+                         for table in tables}
+                db.session.remove()
+                count = write_dump(conn, os.path.join(directory, filename),
+                                   after)
+                caption = f'Новых записей: {count}'
+            else:
+                filename = f'db-{stamp}.sqlite.gz'
+                count = None
+                caption = None
+        finally:
+            conn.close()
+        if not incremental:
+            compress(copy, os.path.join(directory, filename))
+        os.remove(copy)
+        logger.info(f'backup: {filename} in '
+                    f'{time.monotonic() - started:.1f} s')
+        if count == 0:
+            bot.send_message(chat_id=chat_id, text='Новых записей нет')
+            return
+        with open(os.path.join(directory, filename), 'rb') as f:
+            # wait for the queued upload before the file is removed
+            mqbot.result(bot.send_document(
+                chat_id=chat_id,
+                document=f,
+                filename=filename,
+                caption=caption,
+                priority=mqbot.LOW))
+        db.save_bot_state([(WATERMARK, table, str(id))
+                           for table, id in last.items() if id is not None])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run(bot, chat_id, incremental):
+    try:
+        export(bot, chat_id, incremental)
+    except Exception:
+        logger.exception('backup')
+        bot.send_message(chat_id=chat_id, text='Копия базы не удалась')
+    finally:
+        db.session.remove()
+        _lock.release()
+
+
+def start(bot, chat_id, incremental=False):
+    '''Start a snapshot thread, False if one is running already'''
+    if not _lock.acquire(blocking=False):
+        return False
+    threading.Thread(
+        target=run, args=(bot, chat_id, incremental),
+        name='backup', daemon=True).start()
+    return True
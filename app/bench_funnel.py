@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+'''End-to-end benchmark of the ordering funnel.
+
+Builds the bot's real handlers (tutakabot.add_handlers) on a
+UnitOfWorkDispatcher with SQL persistence, against a fake Bot API and a
+temporary SQLite database seeded with data.product_list. Every synthetic
+user goes through the whole funnel:
+
+    /start, name, phone, skip birthday, category [, size], product,
+    quantity, cart, order, delivery, address, payment, confirm,
+    admin delivery time callback, OK callback
+
+The users are interleaved round-robin, with a fixed seed, so a run
+replays the same updates. Working hours are assumed to be open.
+
+Reports updates per second, p50/p99 per handler and per update and SQL
+statements per update, and compares them with the stored baseline
+(bench_funnel.json). Fails if throughput dropped or a handler got slower
+by more than --tolerance, or if any update issues more statements.
+Timings depend on the machine, save a baseline on the machine that runs
+the comparison.
+
+Usage (from app/, config.py must exist):
+
+    python bench_funnel.py [--users 50] [--save] [--tolerance 0.3]
+'''
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+from queue import Queue
+from collections import Counter, defaultdict
+from sqlalchemy.event import listen
+from telegram import Update
+from telegram.utils.request import Request
+
+import config
+
+# the bot configures the database and the log file when it is imported
+WORKDIR = tempfile.mkdtemp(prefix='bench_funnel_')
+config.DATABASE_URI = 'sqlite:///' + os.path.join(WORKDIR, 'db.sqlite')
+config.LOG_FILE = os.path.join(WORKDIR, 'bot.log')
+
+import catalog  # noqa: E402
+import metrics  # noqa: E402
+import persistence  # noqa: E402
+import tutakabot  # noqa: E402
+import utils  # noqa: E402
+import webhook  # noqa: E402
+from admin import data as db  # noqa: E402
+from mqbot import MQBot, PriorityMessageQueue  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'bench_funnel.json')
+# ms a handler may get slower regardless of the tolerance, timer noise
+SLACK_MS = 0.2
+FLUSH_EVERY = 50
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Bench',
+            'username': 'bench_bot'}
+
+
+class FakeRequest(Request):
+    '''Answers Bot API calls locally like Telegram would'''
+
+    def __init__(self):
+        super(FakeRequest, self).__init__()
+        self.calls = Counter()
+        self.message_id = 0
+
+    def _message(self, method, data):
+        self.message_id += 1
+        chat_id = int(data['chat_id'])
+        message = {
+            'message_id': self.message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id,
+                     'type': 'private' if chat_id > 0 else 'group'},
+            'from': BOT_USER,
+        }
+        if 'text' in data:
+            message['text'] = data['text']
+        if method == 'sendPhoto':
+            file_id = data['photo'] if isinstance(data['photo'], str) \
+                else f'photo{self.message_id}'
+            message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id,
+                                 'width': 1, 'height': 1}]
+        return message
+
+    def post(self, url, data, timeout=None):
+        method = url.rsplit('/', 1)[-1]
+        self.calls[method] += 1
+        if method in ('deleteMessage', 'answerCallbackQuery'):
+            return True
+        return self._message(method, data)
+
+    def get(self, url, timeout=None):
+        return BOT_USER
+
+
+def setup_database():
+    db.Base.metadata.create_all(db.engine)
+    db.add_products(db.product_list)
+    db.session.remove()
+    catalog.invalidate()
+    # images the product messages upload, the fake API ignores the bytes
+    os.makedirs(os.path.join(WORKDIR, 'uploads'), exist_ok=True)
+    for product in db.product_list:
+        with open(os.path.join(WORKDIR, 'uploads', product[6]), 'wb') as f:
+            f.write(product[6].encode())
+
+
+def make_dispatcher():
+    request = FakeRequest()
+    bot = MQBot(config.BOT_TOKEN, request=request, is_queued_def=False,
+                mqueue=PriorityMessageQueue(autostart=False))
+    bot_state = persistence.SQLPersistence(
+        store_chat_data=False, store_bot_data=False)
+    dispatcher = tutakabot.UnitOfWorkDispatcher(
+        bot, Queue(), persistence=bot_state, workers=0, use_context=True)
+    tutakabot.add_handlers(dispatcher)
+    metrics.instrument_dispatcher(dispatcher)
+    return dispatcher, bot_state, request
+
+
+def funnel(user_id, product):
+    '''(user id, chat id, text or callback data, is callback) steps'''
+    text = config.text
+    admin = config.admins[0]
+    steps = ['/start', f'User {user_id}', f'8{user_id:010d}', text['skip'],
+             product.category]
+    if product.subcategory:
+        steps.append(product.subcategory)
+    steps += [product.title, '2', text['cart'], text['order'],
+              text['delivery'], 'ул. Ленина 5, кв 12', text['cash'],
+              text['confirm']]
+    yield from ((user_id, user_id, step, False) for step in steps)
+    yield (admin, config.admin_chat_id,
+           f'delivery_time_45_{user_id}', True)
+    yield (user_id, user_id, 'order_confirm', True)
+
+
+def admin_start(update_id):
+    '''/start of the admin in the admin chat, the conversation handles the
+    delivery time buttons there only once it has a state'''
+    raw = webhook.make_update(update_id, config.admins[0], '/start')
+    raw['message']['chat'] = {'id': config.admin_chat_id, 'type': 'group',
+                              'title': 'admins'}
+    return raw
+
+
+def make_updates(users, bot, seed=1):
+    rnd = random.Random(seed)
+    products = catalog.get().products
+    funnels = [funnel(100000 + n, rnd.choice(products))
+               for n in range(users)]
+    updates = [Update.de_json(admin_start(1), bot)]
+    while funnels:
+        for steps in list(funnels):
+            step = next(steps, None)
+            if step is None:
+                funnels.remove(steps)
+                continue
+            user_id, chat_id, data, is_callback = step
+            update_id = len(updates) + 1
+            if is_callback:
+                raw = webhook.make_callback_update(
+                    update_id, user_id, chat_id, data)
+            else:
+                raw = webhook.make_update(update_id, user_id, data)
+            updates.append(Update.de_json(raw, bot))
+    return updates
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(users):
+    setup_database()
+    dispatcher, bot_state, request = make_dispatcher()
+    updates = make_updates(users, dispatcher.bot)
+
+    samples = defaultdict(list)
+    observe = metrics.observe
+
+    def record(family, label, seconds, error=False):
+        samples[(family, label)].append(seconds)
+        observe(family, label, seconds, error)
+    metrics.observe = record
+
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+    listen(db.engine, 'before_cursor_execute', count)
+
+    started = time.perf_counter()
+    for n, update in enumerate(updates, 1):
+        dispatcher.process_update(update)
+        if n % FLUSH_EVERY == 0:
+            bot_state.flush()
+    bot_state.flush()
+    elapsed = time.perf_counter() - started
+    metrics.observe = observe
+
+    orders = db.session.query(db.Order.status).all()
+    db.session.remove()
+    confirmed = sum(1 for status, in orders if status == 'confirmed')
+    if confirmed != users:
+        sys.exit(f'funnel broken: {confirmed} of {users} orders confirmed, '
+                 f'see {config.LOG_FILE}')
+
+    def ms(values, q):
+        return round(percentile(values, q) * 1000, 3)
+
+    return {
+        'users': users,
+        'updates': len(updates),
+        'updates_per_sec': round(len(updates) / elapsed, 1),
+        'queries_per_update': round(statements[0] / len(updates), 2),
+        'api_calls': dict(sorted(request.calls.items())),
+        'update': {'p50': ms(samples[('update', '')], 0.5),
+                   'p99': ms(samples[('update', '')], 0.99)},
+        'handlers': {
+            label: {'calls': len(values), 'p50': ms(values, 0.5),
+                    'p99': ms(values, 0.99)}
+            for (family, label), values in sorted(samples.items())
+            if family == 'handler'},
+    }
+
+
+def compare(result, baseline, tolerance):
+    '''Regressions against the baseline, as text lines'''
+    problems = []
+    if result['users'] != baseline['users']:
+        return [f'baseline is for {baseline["users"]} users, '
+                f'run with --users {baseline["users"]}']
+    if result['updates_per_sec'] < \
+            baseline['updates_per_sec'] * (1 - tolerance):
+        problems.append(f'updates/s {result["updates_per_sec"]} < '
+                        f'{baseline["updates_per_sec"]}')
+    if result['queries_per_update'] > baseline['queries_per_update']:
+        problems.append(f'queries/update {result["queries_per_update"]} > '
+                        f'{baseline["queries_per_update"]}')
+    for name, stats in result['handlers'].items():
+        base = baseline['handlers'].get(name)
+        if base and stats['p50'] > base['p50'] * (1 + tolerance) + SLACK_MS:
+            problems.append(f'{name} p50 {stats["p50"]} ms > {base["p50"]}')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true',
+                        help='store this run as the baseline')
+    args = parser.parse_args()
+
+    os.chdir(WORKDIR)
+    # orders are accepted at any time of the day
+    utils.is_working_hours = lambda: True
+    result = run(args.users)
+    # kept when the funnel broke, for the log
+    os.chdir(os.path.dirname(BASELINE))
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+    print(f'{result["updates"]} updates, {result["users"]} users: '
+          f'{result["updates_per_sec"]} updates/s, '
+          f'{result["queries_per_update"]} SQL statements per update')
+    print(f'update p50 {result["update"]["p50"]} ms '
+          f'p99 {result["update"]["p99"]} ms')
+    for name, stats in sorted(result['handlers'].items(),
+                              key=lambda item: -item[1]['p50']):
+        print(f'  {name:28} {stats["calls"]:5} calls  '
+              f'p50 {stats["p50"]:7.3f} ms  p99 {stats["p99"]:7.3f} ms')
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f'baseline saved to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print('no baseline, run with --save')
+        return 0
+    with open(args.baseline) as f:
+        problems = compare(result, json.load(f), args.tolerance)
+    for problem in problems:
+        print(f'REGRESSION {problem}')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
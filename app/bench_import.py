@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+'''Bot cold start benchmark.
+
+Imports the bot in fresh interpreters and reports wall time and peak RSS
+of the import, next to the Flask admin app for comparison. Fails if the
+bot pulls in Flask again or its import gets slower than --budget ms.
+
+Usage (from app/, config.py must exist):
+
+    python bench_import.py [--runs 5] [--budget 1500]
+'''
+
+import sys
+import argparse
+import subprocess
+import statistics
+
+PROBE = '''
+import sys, time, resource
+started = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - started) * 1000
+flask = sorted(m for m in sys.modules if m.split('.')[0].startswith('flask'))
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+print(elapsed, rss, ','.join(flask) or '-')
+'''
+
+
+def measure(module, cwd, runs):
+    times, rss = [], []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-W', 'ignore', '-c', PROBE.format(module=module)],
+            cwd=cwd, check=True, stdout=subprocess.PIPE,
+            universal_newlines=True).stdout.split()
+        times.append(float(out[0]))
+        rss.append(int(out[1]))
+        flask = out[2]
+    return statistics.median(times), max(rss), flask
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=1500,
+                        help='max median import time of the bot, ms')
+    args = parser.parse_args()
+
+    failed = False
+    for name, module, cwd in (('bot', 'tutakabot', '.'),
+                              ('data', 'data', 'admin'),
+                              ('admin', 'admin', 'admin')):
+        elapsed, rss, flask = measure(module, cwd, args.runs)
+        print(f'{name:6} {elapsed:8.1f} ms {rss:6} MB  flask: {flask}')
+        if name == 'bot':
+            if flask != '-':
+                print('bot imports Flask modules')
+                failed = True
+            if elapsed > args.budget:
+                print(f'bot import is over the {args.budget:.0f} ms budget')
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+'''Routing cost per update.
+
+Finds the handler of text messages the way ConversationHandler does, first
+the handlers of the current state, then the fallbacks, and compares the
+button routers of build_conversation() with the regex MessageHandlers the
+conversation used before. The messages are button presses, catalog titles
+and free text for every state.
+
+Usage (from app/, config.py must exist):
+
+    python bench_routing.py [--updates 20000]
+'''
+
+import time
+import random
+import argparse
+import datetime
+
+from telegram import Bot, Chat, Message, Update, User
+from telegram.ext import (CallbackQueryHandler, Filters, MessageHandler)
+
+import catalog
+import config
+import tutakabot as bot
+
+
+def legacy_conversation():
+    '''States and fallbacks as they were declared with Filters.regex'''
+    text = config.text
+    states = {
+        bot.CHOOSING_CATEGORY: [
+            MessageHandler(Filters.regex(text['back']), bot.start),
+            MessageHandler(Filters.regex(text['cart']), bot.cart_handler),
+            MessageHandler(Filters.regex(text['btn_settings']),
+                           bot.settings_handler),
+            MessageHandler(Filters.text, bot.select_category)],
+        bot.CHOOSING_PRODUCT: [
+            MessageHandler(Filters.regex(text['back']), bot.start),
+            MessageHandler(
+                Filters.text & (~ Filters.regex(text['back']) |
+                                ~ Filters.regex(text['cart'])),
+                bot.show_product)],
+        bot.TYPING_QUONTITY: [
+            MessageHandler(Filters.regex(text['back']), bot.start),
+            MessageHandler(Filters.text & (~ Filters.regex(text['cart'])),
+                           bot.add_to_cart_handler)],
+        bot.EDITING_CART: [
+            MessageHandler(Filters.text & Filters.regex('^❌\\s.*'),
+                           bot.delete_item_handler),
+            MessageHandler(Filters.text & Filters.regex(text['clear']),
+                           bot.clear_cart_handler),
+            MessageHandler(Filters.text & Filters.regex(text['order']),
+                           bot.order_handler)],
+        bot.ORDERING: [
+            MessageHandler(Filters.regex(text[key]), callback)
+            for key, callback in [
+                ('delivery', bot.delivery_handler),
+                ('self_pick', bot.self_pick_handler),
+                ('terminal', bot.order_confirmation_handler),
+                ('cash', bot.order_confirmation_handler),
+                ('confirm', bot.submit_order_handler),
+                ('cancel', bot.cancel_order_handler),
+                ('back', bot.cart_handler)]
+        ] + [MessageHandler(Filters.text | Filters.location,
+                            bot.location_handler)],
+    }
+    fallbacks = [
+        MessageHandler(Filters.text & Filters.regex(text['order']),
+                       bot.order_handler),
+        MessageHandler(Filters.regex(text['back']), bot.start),
+        MessageHandler(Filters.regex(text['cart']), bot.cart_handler),
+        MessageHandler(Filters.regex('^❌\\s.*'), bot.delete_item_handler),
+        CallbackQueryHandler(bot.delivery_time_handler,
+                             pattern='^.*delivery_time.*$'),
+        CallbackQueryHandler(bot.order_confirm_handler,
+                             pattern='^.*order_confirm.*$'),
+        CallbackQueryHandler(bot.order_cancel_handler,
+                             pattern='^.*order_cancel.*$'),
+    ]
+    return states, fallbacks
+
+
+def find_handler(states, fallbacks, state, update):
+    for handler in states.get(state, []) + fallbacks:
+        check = handler.check_update(update)
+        if check is not None and check is not False:
+            return handler
+    return None
+
+
+def make_updates(n, seed=1):
+    '''(state, update) pairs, about half of them button presses'''
+    text = config.text
+    snapshot = catalog.get()
+    titles = [p.title for p in snapshot.products] or ['?']
+    buttons = [text[k] for k in ('back', 'cart', 'btn_settings', 'clear',
+                                 'order', 'delivery', 'cash', 'confirm')]
+    free = ['2', '5', 'ул. Ленина 5, кв 12', 'привет', '❌ ' + titles[0]]
+    states = [bot.CHOOSING_CATEGORY, bot.CHOOSING_PRODUCT,
+              bot.TYPING_QUONTITY, bot.EDITING_CART, bot.ORDERING]
+    rnd = random.Random(seed)
+    fake_bot = Bot('123:bench')
+    user = User(1, 'Bench', False)
+    chat = Chat(1, 'private')
+    date = datetime.datetime.now()
+    updates = []
+    for n in range(n):
+        choice = rnd.random()
+        if choice < 0.5:
+            message_text = rnd.choice(buttons)
+        elif choice < 0.8:
+            message_text = rnd.choice(titles)
+        else:
+            message_text = rnd.choice(free)
+        message = Message(n, user, date, chat, text=message_text,
+                          bot=fake_bot)
+        updates.append((rnd.choice(states), Update(n, message=message)))
+    return updates
+
+
+def measure(states, fallbacks, updates):
+    started = time.perf_counter()
+    for state, update in updates:
+        find_handler(states, fallbacks, state, update)
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--updates', type=int, default=20000)
+    args = parser.parse_args()
+
+    updates = make_updates(args.updates)
+    conversation = bot.build_conversation()
+    layouts = [
+        ('regex filters', legacy_conversation()),
+        ('router', (conversation.states, conversation.fallbacks)),
+    ]
+    results = {}
+    for name, (states, fallbacks) in layouts:
+        # warm up the catalog snapshot and the regex cache
+        measure(states, fallbacks, updates[:1000])
+        results[name] = min(measure(states, fallbacks, updates)
+                            for _ in range(3))
+        print(f'{name:14} {results[name]:8.2f} us per update')
+    print(f'speedup {results["regex filters"] / results["router"]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+'''Broadcast of an admin message to every user (/replyall).
+
+A broadcast runs in its own thread, not in the dispatcher. Recipients are
+read from the users table in pages ordered by id and the id of the last
+handled user is saved in the broadcasts row every CHECKPOINT_EVERY
+messages, so a broadcast cut short by a restart is resumed by resume()
+after that user. At most CHECKPOINT_EVERY users get the message twice.
+
+Sending is paced by a scheduler shared by all broadcasts: a token bucket
+for the broadcast rate, kept below Telegram's ~30 messages per second to
+leave room for the replies of the dispatcher, and a minimum interval
+between two messages to the same chat. The messages then go through the
+bot's queue with LOW priority, behind every reply to a user. A RetryAfter
+from Telegram pauses the scheduler for the time it asks for and the
+message is sent again.
+
+Users that blocked the bot or deleted their account are marked in
+users.blocked and skipped by later broadcasts. The admin who started the
+broadcast gets a report with the counts and the throughput at the end.
+'''
+
+import time
+import logging
+import threading
+
+from datetime import datetime
+from telegram import ParseMode
+from telegram.error import (TelegramError, Unauthorized, BadRequest,
+                            NetworkError, RetryAfter)
+
+import mqbot
+from admin import data as db
+
+logger = logging.getLogger(__name__)
+
+# messages per second for all broadcasts together, and the burst size
+GLOBAL_RATE = 20
+GLOBAL_BURST = 20
+# seconds between two messages to one chat
+CHAT_INTERVAL = 1.0
+PAGE_SIZE = 200
+CHECKPOINT_EVERY = 10
+# attempts of one message on network errors
+MAX_ATTEMPTS = 3
+
+
+class Scheduler:
+    '''Token bucket for the bot-wide rate plus a per-chat interval'''
+
+    def __init__(self, rate, burst, chat_interval):
+        self.rate = rate
+        self.burst = burst
+        self.chat_interval = chat_interval
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # chat id -> monotonic time of the last message
+        self._chats = {}
+
+    def _refill(self, now):
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait(self, chat_id):
+        '''Block until a message to chat_id may be sent'''
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                delay = max(
+                    self._paused_until - now,
+                    self._chats.get(chat_id, -self.chat_interval) +
+                    self.chat_interval - now,
+                    (1 - self._tokens) / self.rate)
+                if delay <= 0:
+                    self._tokens -= 1
+                    self._chats[chat_id] = now
+                    if len(self._chats) > 10000:
+                        self._forget(now)
+                    return
+            time.sleep(delay)
+
+    def _forget(self, now):
+        for chat_id, sent in list(self._chats.items()):
+            if now - sent >= self.chat_interval:
+                del self._chats[chat_id]
+
+    def pause(self, seconds):
+        '''Hold every sender, after a RetryAfter from Telegram'''
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0
+            self._updated = now
+
+
+_scheduler = Scheduler(GLOBAL_RATE, GLOBAL_BURST, CHAT_INTERVAL)
+
+
+def send(bot, chat_id, text):
+    '''Send one broadcast message, returns "sent", "failed" or "blocked"'''
+    attempts = 0
+    while True:
+        _scheduler.wait(chat_id)
+        try:
+            mqbot.result(bot.send_message(
+                chat_id=chat_id,
+                text=text,
+                parse_mode=ParseMode.MARKDOWN,
+                disable_web_page_preview=True,
+                priority=mqbot.LOW))
+            return 'sent'
+        except RetryAfter as ex:
+            logger.warning(f'broadcast: retry after {ex.retry_after} s')
+            _scheduler.pause(ex.retry_after)
+        except Unauthorized as ex:
+            logger.info(f'broadcast: {chat_id} {ex}')
+            db.update_user(chat_id, 'blocked', datetime.now())
+            return 'blocked'
+        except BadRequest as ex:
+            logger.warning(f'broadcast: {chat_id} {ex}')
+            if 'chat not found' in str(ex).lower():
+                db.update_user(chat_id, 'blocked', datetime.now())
+                return 'blocked'
+            return 'failed'
+        except NetworkError as ex:
+            attempts += 1
+            logger.warning(f'broadcast: {chat_id} {ex}, attempt {attempts}')
+            if attempts >= MAX_ATTEMPTS:
+                return 'failed'
+            time.sleep(attempts)
+        except TelegramError as ex:
+            logger.warning(f'broadcast: {chat_id} {ex}')
+            return 'failed'
+
+
+def run(bot, broadcast_id):
+    '''Send a broadcast from its last checkpoint to the end'''
+    try:
+        broadcast = db.get_broadcast(broadcast_id)
+        text, chat_id = broadcast.text, broadcast.chat_id
+        progress = {
+            'last_user_id': broadcast.last_user_id,
+            'sent': broadcast.sent,
+            'failed': broadcast.failed,
+            'blocked': broadcast.blocked,
+        }
+        db.session.remove()
+        logger.info(f'broadcast {broadcast_id}: from {progress}')
+
+        started = time.monotonic()
+        handled = 0
+        while True:
+            page = db.get_recipients(progress['last_user_id'], PAGE_SIZE)
+            # do not keep the read transaction open while sending
+            db.session.remove()
+            if not page:
+                break
+            for id, user_id in page:
+                progress[send(bot, user_id, text)] += 1
+                progress['last_user_id'] = id
+                handled += 1
+                if handled % CHECKPOINT_EVERY == 0:
+                    db.update_broadcast(broadcast_id, progress)
+            db.update_broadcast(broadcast_id, progress)
+
+        elapsed = time.monotonic() - started
+        db.update_broadcast(broadcast_id, dict(
+            progress, status='done', finished=datetime.now()))
+        logger.info(f'broadcast {broadcast_id}: done {progress}')
+        bot.send_message(
+            chat_id=chat_id,
+            text=f'Рассылка {broadcast_id} завершена\n'
+                 f'Отправлено: {progress["sent"]}\n'
+                 f'Ошибок: {progress["failed"]}\n'
+                 f'Заблокировали бота: {progress["blocked"]}\n'
+                 f'{handled} сообщений за {elapsed:.0f} с, '
+                 f'{handled / elapsed if elapsed else 0:.1f} в секунду')
+    except Exception:
+        logger.exception(f'broadcast {broadcast_id}')
+    finally:
+        db.session.remove()
+
+
+def _spawn(bot, broadcast_id):
+    thread = threading.Thread(
+        target=run, args=(bot, broadcast_id),
+        name=f'broadcast-{broadcast_id}', daemon=True)
+    thread.start()
+    return thread
+
+
+def start(bot, text, chat_id):
+    '''Start a new broadcast, chat_id gets the report'''
+    broadcast_id = db.add_broadcast(text, chat_id)
+    # the thread reads the row, wait for the dispatcher's commit
+    db.after_commit(_spawn, bot, broadcast_id)
+    return broadcast_id
+
+
+def resume(bot):
+    '''Continue the broadcasts an earlier run did not finish'''
+    broadcast_ids = db.get_unfinished_broadcasts()
+    db.session.remove()
+    for broadcast_id in broadcast_ids:
+        _spawn(bot, broadcast_id)
+    return broadcast_ids
@@ -0,0 +1,140 @@
+'''Shopping cart kept in user_data.
+
+One line per product, in the order products were first added. Adding a
+product again adds to its line. Each line has a key, the text of its ❌
+button in the cart keyboard, so a pressed button removes exactly that line.
+The item count and the total are updated on every change instead of being
+summed on each render. Prices are the ones of the catalog snapshot the
+cart was last priced against, see reprice(). revision counts the changes,
+a checkout quote of the cart is valid while it stays the same.
+'''
+
+import catalog
+
+
+class Cart:
+    __slots__ = ('_quantities', '_cents', '_keys', '_line_keys', '_total',
+                 'count', 'version', 'revision')
+
+    def __init__(self):
+        # product id -> quantity, product id -> unit price in cents
+        self._quantities = {}
+        self._cents = {}
+        # ❌ button text -> product id and back
+        self._keys = {}
+        self._line_keys = {}
+        self._total = 0
+        self.count = 0
+        # catalog version the prices come from, None if unknown
+        self.version = None
+        self.revision = 0
+
+    @staticmethod
+    def line_key(product):
+        return f'❌ {product.title} {product.subcategory or ""}'.strip()
+
+    def _set_line(self, product):
+        self._cents[product.id] = round(product.price * 100)
+        key = self.line_key(product)
+        if self._keys.get(key, product.id) != product.id:
+            # same title and size in another category
+            key = f'{key} #{product.id}'
+        self._keys[key] = product.id
+        self._line_keys[product.id] = key
+
+    def add(self, product, quantity):
+        if quantity < 1:
+            raise ValueError(f'quantity {quantity}')
+        if product.id not in self._quantities:
+            self._set_line(product)
+        self._quantities[product.id] = \
+            self._quantities.get(product.id, 0) + quantity
+        self.count += quantity
+        self._total += self._cents[product.id] * quantity
+        self.revision += 1
+
+    def remove(self, product_id):
+        quantity = self._quantities.pop(product_id, None)
+        if quantity is None:
+            return
+        self.count -= quantity
+        self._total -= self._cents.pop(product_id) * quantity
+        del self._keys[self._line_keys.pop(product_id)]
+        self.revision += 1
+
+    def remove_line(self, key):
+        '''Remove the line of a pressed ❌ button, False if there is none'''
+        product_id = self._keys.get(key.strip())
+        if product_id is None:
+            return False
+        self.remove(product_id)
+        return True
+
+    def clear(self):
+        self._quantities.clear()
+        self._cents.clear()
+        self._keys.clear()
+        self._line_keys.clear()
+        self._total = 0
+        self.count = 0
+        self.revision += 1
+
+    def reprice(self, snapshot):
+        '''Take prices and titles from a catalog snapshot, lines of
+        products that are gone from the catalog are dropped'''
+        quantities = list(self._quantities.items())
+        self.clear()
+        for product_id, quantity in quantities:
+            product = snapshot.get_product_by_id(product_id)
+            if product is not None and quantity > 0:
+                self.add(product, quantity)
+        self.version = snapshot.version
+
+    @property
+    def total(self):
+        return self._total / 100
+
+    def cents(self, product_id):
+        '''Unit price of a line in cents'''
+        return self._cents[product_id]
+
+    def items(self):
+        return self._quantities.items()
+
+    def keys(self):
+        return list(self._keys)
+
+    def __len__(self):
+        return len(self._quantities)
+
+    def __iter__(self):
+        return iter(self._quantities)
+
+    def __contains__(self, product_id):
+        return product_id in self._quantities
+
+    def __repr__(self):
+        return f'Cart({self._quantities!r})'
+
+    def to_state(self):
+        '''[[product id, quantity], ...] for the persistence'''
+        return [[id, quantity] for id, quantity in self._quantities.items()]
+
+    @classmethod
+    def from_state(cls, state):
+        cart = cls()
+        for product_id, quantity in state:
+            cart._quantities[product_id] = quantity
+        # prices and keys are filled in from the current catalog
+        cart.reprice(catalog.get())
+        return cart
+
+    @classmethod
+    def from_items(cls, items):
+        '''Cart from the old list of {'product_id', 'quontity'} dicts'''
+        cart = cls()
+        for item in items:
+            cart._quantities[item['product_id']] = \
+                cart._quantities.get(item['product_id'], 0) + item['quontity']
+        cart.reprice(catalog.get())
+        return cart
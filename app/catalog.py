@@ -0,0 +1,130 @@
+'''Read-only in-memory snapshot of the product catalog.
+
+The snapshot is loaded once and shared by all dispatcher threads. It is
+rebuilt when the catalog version stamp written by the `Product` listeners
+in admin/data.py changes, so edits made in the admin panel (another process)
+show up after at most CHECK_INTERVAL seconds.
+'''
+
+import time
+import threading
+
+from collections import namedtuple
+from sqlalchemy.event import listens_for
+
+from admin import data as db
+
+# seconds between version stamp checks
+CHECK_INTERVAL = 5
+
+CatalogProduct = namedtuple('CatalogProduct', [
+    'id',
+    'title',
+    'category',
+    'subcategory',
+    'price',
+    'weight',
+    'composition',
+    'img_name',
+    'img_path'
+])
+
+
+def _groups(values):
+    '''Distinct values ordered like sqlite GROUP BY (NULL first)'''
+    return sorted(set(values), key=lambda v: (v is not None, v or ''))
+
+
+class Catalog:
+    '''Immutable catalog snapshot, never mutate after construction'''
+
+    def __init__(self, version, products):
+        self.version = version
+        self.products = tuple(products)
+        self.by_id = {}
+        self.by_title = {}
+        self.titles = {}
+        self.subcategories = {}
+        self.product_titles = frozenset(p.title for p in self.products)
+
+        for p in self.products:
+            self.by_id[p.id] = p
+            for key in {p.category, p.subcategory}:
+                if key is None:
+                    continue
+                self.titles.setdefault(key, []).append(p.title)
+                self.by_title.setdefault((p.title, key), p)
+
+        self.categories = _groups(p.category for p in self.products)
+        for category in self.categories:
+            self.subcategories[category] = _groups(
+                p.subcategory for p in self.products
+                if p.category == category)
+
+    def get_subcategories(self, category):
+        return self.subcategories.get(category, [])
+
+    def get_products_by_category(self, category):
+        return self.titles.get(category, [])
+
+    def is_category(self, text):
+        return text in self.titles
+
+    def is_product(self, text):
+        return text in self.product_titles
+
+    def has_subcategory(self, category):
+        return any(s is not None for s in self.get_subcategories(category))
+
+    def get_product(self, title, category):
+        return self.by_title.get((title, category))
+
+    def get_product_by_id(self, id):
+        return self.by_id.get(id)
+
+
+def load():
+    # read the stamp first, a concurrent edit then only causes a rebuild
+    version = db.get_catalog_version()
+    products = [
+        CatalogProduct(*(getattr(p, f) for f in CatalogProduct._fields))
+        for p in db.get_all_products()
+    ]
+    return Catalog(version, products)
+
+
+_lock = threading.Lock()
+_catalog = None
+_checked_at = 0.0
+_stale = True
+
+
+def get():
+    '''Current catalog snapshot, rebuilt if the version stamp changed'''
+    global _catalog, _checked_at, _stale
+
+    catalog = _catalog
+    if (catalog is not None and not _stale and
+            time.monotonic() - _checked_at < CHECK_INTERVAL):
+        return catalog
+
+    with _lock:
+        if _stale or _catalog is None or \
+                db.get_catalog_version() != _catalog.version:
+            _stale = False
+            _catalog = load()
+        _checked_at = time.monotonic()
+        return _catalog
+
+
+def invalidate():
+    global _stale
+    _stale = True
+
+
+# changes made from this process are picked up without waiting for the check
+@listens_for(db.Product, 'after_insert')
+@listens_for(db.Product, 'after_update')
+@listens_for(db.Product, 'after_delete')
+def _on_product_change(mapper, connection, target):
+    invalidate()
@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+'''Local stand-in for the Telegram Bot API and a customer load generator.
+
+The server answers the methods the bot uses (getMe, getUpdates,
+deleteWebhook, sendMessage, sendPhoto, sendDocument,
+editMessageReplyMarkup, deleteMessage, answerCallbackQuery) on
+http://<host>:<port>/bot<token>/<method>, like Telegram does. Sending
+methods pass Telegram-like rate limits: 30 calls a second in total, about
+one a second per private chat with a short burst and 20 a minute per group.
+Over a limit the call gets an HTTP 429 with parameters.retry_after.
+
+The load generator plays customers arriving at --rate per second. Each one
+goes through the ordering funnel of the bot (/start, name, phone, skip
+birthday, category [, size], product, quantity, cart, order, delivery,
+address, payment, confirm) and waits for the first reply of the bot to
+each step, then thinks for a random time before the next one. With
+--admin the admin chat answers every order with a delivery time and the
+customer confirms it with OK. At the end the reply latency per step and
+the throughput are reported.
+
+The bot runs as usual, in polling mode, against this server:
+
+    # config.py of the bot, new customer ids must not be in its database
+    BOT_API_URL = 'http://127.0.0.1:8081/bot'
+
+    python fakeapi.py --customers 2000 --rate 50 --admin
+    TUTAKA_UPDATES=polling python tutakabot.py
+
+--customers 0 only serves the API, until Ctrl+C.
+'''
+
+import sys
+import json
+import time
+import heapq
+import math
+import random
+import argparse
+import itertools
+import threading
+
+from collections import Counter, defaultdict
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+import config
+import catalog
+import webhook
+from admin import data as db
+
+# calls per second and burst, Telegram documents 30/s in total,
+# about 1/s per chat and 20/min per group
+GLOBAL_RATE = 30
+CHAT_RATE = 1
+CHAT_BURST = 3
+GROUP_RATE = 20 / 60
+GROUP_BURST = 20
+# getUpdates waits at most this long, whatever the bot asks for
+MAX_POLL_TIMEOUT = 50
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Fake',
+            'username': 'fake_bot'}
+SENDING = ('sendMessage', 'sendPhoto', 'sendDocument',
+           'editMessageReplyMarkup', 'deleteMessage')
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def wait(self, now):
+        '''Seconds until the next call is allowed'''
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class FakeApi:
+    '''Bot API state: pending updates, sent messages and rate limits'''
+
+    def __init__(self, token, global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE,
+                 chat_burst=CHAT_BURST, group_rate=GROUP_RATE,
+                 group_burst=GROUP_BURST, limits=True):
+        self.token = token
+        self.limits = limits
+        self.global_limit = TokenBucket(global_rate, global_rate)
+        self.chat_limit = (chat_rate, chat_burst)
+        self.group_limit = (group_rate, group_burst)
+        self.chat_limits = {}
+        self.calls = Counter()
+        self.limited = Counter()
+        # called with every message the bot sent
+        self.on_message = None
+
+        self._lock = threading.Lock()
+        self._updates = []
+        self._update_id = itertools.count(1)
+        self._message_id = itertools.count(1)
+        self._pending = threading.Condition()
+
+    # ============================  Updates  ============================
+
+    def push(self, make, *args):
+        '''Queue make(update_id, *args) for getUpdates'''
+        with self._pending:
+            self._updates.append(make(next(self._update_id), *args))
+            self._pending.notify_all()
+
+    def get_updates(self, offset=0, limit=100, timeout=0):
+        deadline = time.monotonic() + min(timeout, MAX_POLL_TIMEOUT)
+        with self._pending:
+            # updates before offset are confirmed
+            self._updates = [u for u in self._updates
+                             if u['update_id'] >= offset]
+            while not self._updates:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self._pending.wait(left)
+            return self._updates[:limit]
+
+    # ============================  Methods  ============================
+
+    def _retry_after(self, chat_id):
+        '''0 and the call is counted, or seconds to wait'''
+        now = time.monotonic()
+        with self._lock:
+            buckets = [self.global_limit]
+            if chat_id is not None:
+                chat = self.chat_limits.get(chat_id)
+                if chat is None:
+                    rate, burst = self.chat_limit if chat_id > 0 \
+                        else self.group_limit
+                    chat = self.chat_limits[chat_id] = \
+                        TokenBucket(rate, burst)
+                buckets.append(chat)
+            wait = max(bucket.wait(now) for bucket in buckets)
+            if not wait:
+                for bucket in buckets:
+                    bucket.take()
+        return wait
+
+    def _message(self, chat_id, params, **fields):
+        message = {
+            'message_id': int(params.get('message_id') or
+                              next(self._message_id)),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': '-'}
+            if chat_id > 0 else {'id': chat_id, 'type': 'group',
+                                 'title': '-'},
+            'from': BOT_USER,
+        }
+        for name in ('text', 'caption'):
+            if name in params:
+                message[name] = params[name]
+        markup = params.get('reply_markup')
+        if isinstance(markup, str):
+            markup = json.loads(markup)
+        # messages only carry inline keyboards
+        if markup and 'inline_keyboard' in markup:
+            message['reply_markup'] = markup
+        message.update(fields)
+        return message
+
+    def call(self, method, params):
+        '''(HTTP status, answer) of a Bot API call'''
+        with self._lock:
+            self.calls[method] += 1
+        if method == 'getUpdates':
+            return 200, self.get_updates(
+                int(params.get('offset') or 0),
+                int(params.get('limit') or 100),
+                float(params.get('timeout') or 0))
+        if method == 'getMe':
+            return 200, BOT_USER
+        if method in ('deleteWebhook', 'setWebhook', 'answerCallbackQuery'):
+            return 200, True
+        if method not in SENDING:
+            return 404, 'Not Found: method not found'
+
+        chat_id = params.get('chat_id')
+        chat_id = int(chat_id) if chat_id is not None else None
+        wait = self._retry_after(chat_id) if self.limits else 0
+        if wait:
+            with self._lock:
+                self.limited[method] += 1
+            retry_after = math.ceil(wait)
+            return 429, (f'Too Many Requests: retry after {retry_after}',
+                         retry_after)
+
+        if method == 'deleteMessage':
+            return 200, True
+        if method == 'sendPhoto':
+            file_id = params['photo'] \
+                if isinstance(params['photo'], str) else 'photo-file'
+            message = self._message(chat_id, params, photo=[{
+                'file_id': file_id, 'file_unique_id': file_id,
+                'width': 1, 'height': 1}])
+        elif method == 'sendDocument':
+            message = self._message(chat_id, params, document={
+                'file_id': 'document-file',
+                'file_unique_id': 'document-file'})
+        else:
+            message = self._message(chat_id, params)
+        if method != 'editMessageReplyMarkup' and self.on_message:
+            self.on_message(message)
+        return 200, message
+
+
+def parse_params(content_type, body):
+    '''Call parameters from a JSON, form or multipart body, files are
+    replaced by their file names'''
+    if not body:
+        return {}
+    if content_type.startswith('application/json'):
+        return json.loads(body)
+    if content_type.startswith('multipart/form-data'):
+        form = BytesParser(policy=policy.HTTP).parsebytes(
+            b'Content-Type: ' + content_type.encode('latin-1') +
+            b'\r\n\r\n' + body)
+        params = {}
+        for part in form.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            filename = part.get_filename()
+            # an upload is not a str, unlike a file_id
+            params[name] = {'filename': filename} if filename \
+                else part.get_payload(decode=True).decode('utf-8')
+        return params
+    return dict(parse_qsl(body.decode('utf-8')))
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # the bot keeps its connections open, answers go out without the
+    # delayed ACK wait of Nagle's algorithm
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    api = None
+
+    def _handle(self, params):
+        parts = urlsplit(self.path).path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != f'bot{self.api.token}':
+            self._answer(401, 'Unauthorized')
+            return
+        try:
+            status, result = self.api.call(parts[1], params)
+        except (KeyError, ValueError) as ex:
+            status, result = 400, f'Bad Request: {ex}'
+        self._answer(status, result)
+
+    def _answer(self, status, result):
+        if status == 200:
+            answer = {'ok': True, 'result': result}
+        elif status == 429:
+            description, retry_after = result
+            answer = {'ok': False, 'error_code': 429,
+                      'description': description,
+                      'parameters': {'retry_after': retry_after}}
+        else:
+            answer = {'ok': False, 'error_code': status,
+                      'description': result}
+        body = json.dumps(answer, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._handle(dict(parse_qsl(urlsplit(self.path).query)))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            params = parse_params(self.headers.get('Content-Type', ''), body)
+        except ValueError as ex:
+            self._answer(400, f'Bad Request: {ex}')
+            return
+        self._handle(params)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(api, port, host='127.0.0.1'):
+    '''Serve the API from a daemon thread'''
+    handler = type('Handler', (ApiHandler,), {'api': api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fakeapi',
+                     daemon=True).start()
+    return server
+
+
+# ==========================  Load generator  ==========================
+
+
+def funnel(product, user_id, admin):
+    '''(step, text, callback data) the customer goes through, text and
+    data None for a step that waits for the admin'''
+    text = config.text
+    steps = [('start', '/start', None),
+             ('name', f'User {user_id}', None),
+             ('phone', f'8{user_id % 10 ** 10:010d}', None),
+             ('birthday', text['skip'], None),
+             ('category', product.category, None)]
+    if product.subcategory:
+        steps.append(('size', product.subcategory, None))
+    steps += [('product', product.title, None),
+              ('quantity', '2', None),
+              ('cart', text['cart'], None),
+              ('order', text['order'], None),
+              ('delivery', text['delivery'], None),
+              ('address', 'ул. Ленина 5, кв 12', None),
+              ('payment', text['cash'], None),
+              ('confirm', text['confirm'], None)]
+    if admin:
+        steps += [('delivery_time', None, None),
+                  ('order_confirm', None, 'order_confirm')]
+    return steps
+
+
+def _buttons(message):
+    markup = message.get('reply_markup') or {}
+    return [button.get('callback_data') or ''
+            for row in markup.get('inline_keyboard', []) for button in row]
+
+
+class Customer:
+    def __init__(self, user_id, steps):
+        self.user_id = user_id
+        self.steps = steps
+        self.step = -1
+        self.sent = None
+        self.waiting = False
+        # when the admin answered and the OK button came
+        self.answered = None
+        self.offered = None
+        self.message_id = None
+
+
+class LoadGenerator:
+    def __init__(self, api, customers, rate, think=2.0, admin=False,
+                 first_user=None, step_timeout=30.0, seed=1):
+        self.api = api
+        self.rate = rate
+        self.think = think
+        self.admin = admin
+        self.step_timeout = step_timeout
+        self.rnd = random.Random(seed)
+        first_user = first_user or \
+            10 ** 9 + int(time.time()) % 10 ** 5 * 10 ** 4
+        # the products of the bot's database
+        db.configure(getattr(config, 'DATABASE_URI', None))
+        products = catalog.get().products
+        db.session.remove()
+        self.customers = {}
+        for n in range(customers):
+            user_id = first_user + n
+            self.customers[user_id] = Customer(user_id, funnel(
+                self.rnd.choice(products), user_id, admin))
+
+        self.latency = defaultdict(list)
+        self.timeouts = Counter()
+        self.completed = 0
+        self.replies = 0
+        self.updates = 0
+        self.started = None
+
+        self._lock = threading.Lock()
+        self._events = []
+        self._seq = itertools.count()
+        self._wakeup = threading.Condition(self._lock)
+        self._left = customers
+
+    def _schedule(self, delay, func, *args):
+        # with self._lock held
+        heapq.heappush(self._events, (time.monotonic() + delay,
+                                      next(self._seq), func, args))
+        self._wakeup.notify()
+
+    def _push(self, make, *args):
+        self.updates += 1
+        self.api.push(make, *args)
+
+    # ==========================  Customers  ==========================
+
+    def _next_step(self, customer):
+        customer.step += 1
+        if customer.step == len(customer.steps):
+            self.completed += 1
+            self._left -= 1
+            return
+        name, text, data = customer.steps[customer.step]
+        customer.sent = time.monotonic()
+        customer.waiting = True
+        if text is not None:
+            self._push(webhook.make_update, customer.user_id, text)
+        elif data is not None:
+            self._push(webhook.make_callback_update, customer.user_id,
+                       customer.user_id, data, customer.message_id)
+        elif customer.offered is not None:
+            # the delivery time came before the customer looked
+            self._step_done(customer, customer.offered)
+            return
+        self._schedule(self.step_timeout, self._timeout, customer,
+                       customer.step)
+
+    def _timeout(self, customer, step):
+        if customer.step == step and customer.waiting:
+            customer.waiting = False
+            self.timeouts[customer.steps[step][0]] += 1
+            self._left -= 1
+
+    def _admin_answer(self, message):
+        user_id = next((int(data.rsplit('_', 1)[1])
+                        for data in _buttons(message)
+                        if data.startswith('delivery_time_')), None)
+        customer = self.customers.get(user_id)
+        if customer is None:
+            return
+        customer.answered = time.monotonic()
+        self._push(webhook.make_callback_update, config.admins[0],
+                   config.admin_chat_id, f'delivery_time_45_{user_id}',
+                   message['message_id'])
+
+    def on_message(self, message):
+        '''A message the bot sent, from the API server threads'''
+        received = time.monotonic()
+        chat_id = message['chat']['id']
+        with self._lock:
+            self.replies += 1
+            if chat_id == config.admin_chat_id:
+                if self.admin:
+                    self._schedule(0, self._admin_answer, message)
+                return
+            customer = self.customers.get(chat_id)
+            if customer is None:
+                return
+            if 'order_confirm' in _buttons(message):
+                customer.offered = received
+                customer.message_id = message['message_id']
+            if not customer.waiting:
+                return
+            if customer.steps[customer.step][0] == 'delivery_time' and \
+                    customer.offered is None:
+                return
+            self._step_done(customer, received)
+
+    def _step_done(self, customer, received):
+        name = customer.steps[customer.step][0]
+        started = customer.answered if name == 'delivery_time' \
+            else customer.sent
+        customer.waiting = False
+        self.latency[name].append(received - started)
+        self._schedule(self.rnd.expovariate(1 / self.think)
+                       if self.think else 0, self._next_step, customer)
+
+    # ============================  Run  ============================
+
+    def run(self):
+        '''Play all customers, returns when every one finished or timed
+        out'''
+        self.started = time.monotonic()
+        with self._lock:
+            if self.admin:
+                # the conversation handles the buttons of the admin chat
+                # once the admin has a state there
+                self._push(_admin_start)
+            arrival = 0
+            for customer in self.customers.values():
+                self._schedule(arrival, self._next_step, customer)
+                arrival += self.rnd.expovariate(self.rate)
+            while self._left > 0:
+                if not self._events:
+                    self._wakeup.wait(1)
+                    continue
+                due, _, func, args = self._events[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._wakeup.wait(wait)
+                    continue
+                heapq.heappop(self._events)
+                func(*args)
+        return time.monotonic() - self.started
+
+    def report(self, elapsed):
+        lines = [
+            f'{len(self.customers)} customers in {elapsed:.1f} s: '
+            f'{self.completed} completed, {sum(self.timeouts.values())} '
+            f'timed out',
+            f'{self.updates / elapsed:.1f} updates/s, '
+            f'{self.replies / elapsed:.1f} replies/s',
+            'reply latency, ms:  count    p50    p95    p99  timeouts',
+        ]
+        order = [name for name, _, _ in max(
+            (c.steps for c in self.customers.values()), key=len, default=[])]
+        for name in order:
+            values = sorted(self.latency[name])
+            if not values and not self.timeouts[name]:
+                continue
+            lines.append(
+                f'  {name:15} {len(values):6} ' + ' '.join(
+                    f'{_percentile(values, q) * 1000:6.0f}'
+                    for q in (0.5, 0.95, 0.99)) +
+                f' {self.timeouts[name]:9}')
+        lines.append('api calls: ' + ', '.join(
+            f'{method} {count}'
+            for method, count in sorted(self.api.calls.items())))
+        lines.append('429s: ' + (', '.join(
+            f'{method} {count}'
+            for method, count in sorted(self.api.limited.items())) or '0'))
+        return '\n'.join(lines)
+
+
+def _admin_start(update_id):
+    update = webhook.make_update(update_id, config.admins[0], '/start')
+    update['message']['chat'] = {'id': config.admin_chat_id,
+                                 'type': 'group', 'title': 'admins'}
+    return update
+
+
+def _percentile(values, q):
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--customers', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=10,
+                        help='customers arriving per second')
+    parser.add_argument('--think', type=float, default=2.0,
+                        help='mean seconds between the steps of a customer')
+    parser.add_argument('--admin', action='store_true',
+                        help='answer orders with a delivery time')
+    parser.add_argument('--first-user', type=int,
+                        help='user id of the first customer')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='seconds a customer waits for a reply')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-limits', action='store_true',
+                        help='no rate limits and 429s')
+    args = parser.parse_args()
+
+    api = FakeApi(config.BOT_TOKEN, limits=not args.no_limits)
+    serve(api, args.port, args.host)
+    print(f'Bot API on http://{args.host}:{args.port}/bot')
+    if not args.customers:
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            return 0
+
+    generator = LoadGenerator(
+        api, args.customers, args.rate, think=args.think, admin=args.admin,
+        first_user=args.first_user, step_timeout=args.timeout,
+        seed=args.seed)
+    api.on_message = generator.on_message
+    elapsed = generator.run()
+    print(generator.report(elapsed))
+    return 0 if generator.completed == args.customers else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
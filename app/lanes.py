@@ -0,0 +1,113 @@
+'''Dispatcher running updates on parallel lanes.
+
+The plain Dispatcher handles one update at a time, so a customer waiting
+for a slow photo upload or a locked database holds up everyone behind it.
+LaneDispatcher hashes each update onto one of N lanes by the user (or chat)
+it comes from, and every lane has its own thread. Updates of one user stay
+in order, and so do their conversation and user_data, while different
+users are handled in parallel.
+
+Each lane queue is bounded. When one is full the dispatcher thread waits,
+the update queue fills up, and the webhook starts answering 503.
+
+Handlers do blocking SQLite and Bot API work: writes are serialized by
+admin.data, and API calls share the connection pool of the bot's Request,
+which should have a connection per lane, see pool_size().
+'''
+
+import queue
+import logging
+import threading
+
+from telegram.ext import Dispatcher
+
+logger = logging.getLogger(__name__)
+
+# updates waiting in one lane before the dispatcher thread blocks
+LANE_QUEUE_SIZE = 100
+
+
+def pool_size(lanes):
+    '''Connections the bot needs: one per lane plus the message queue,
+    the job queue and getUpdates'''
+    return max(lanes, 1) + 4
+
+
+def lane_key(update):
+    '''Id the update is ordered on, the user's id when there is a user:
+    user_data and conversations are per user'''
+    user = getattr(update, 'effective_user', None)
+    if user is not None:
+        return user.id
+    chat = getattr(update, 'effective_chat', None)
+    if chat is not None:
+        return chat.id
+    # errors put in the queue by the updater
+    return 0
+
+
+class LaneDispatcher(Dispatcher):
+    '''Dispatcher with per-user ordered lanes, lanes=1 works like the
+    plain Dispatcher. Subclasses override handle_update, not
+    process_update, to wrap the handling of one update'''
+
+    def __init__(self, *args, lanes=1, lane_queue_size=LANE_QUEUE_SIZE,
+                 **kwargs):
+        super(LaneDispatcher, self).__init__(*args, **kwargs)
+        self.lanes = [queue.Queue(maxsize=lane_queue_size)
+                      for n in range(lanes if lanes > 1 else 0)]
+        self._lane_threads = []
+
+    def handle_update(self, update):
+        super(LaneDispatcher, self).process_update(update)
+
+    def process_update(self, update):
+        if not self._lane_threads:
+            self.handle_update(update)
+            return
+        self.lanes[lane_key(update) % len(self.lanes)].put(update)
+
+    def _run_lane(self, lane):
+        while True:
+            update = lane.get()
+            try:
+                if update is None:
+                    break
+                self.handle_update(update)
+            except Exception:
+                logger.exception(f'lane: {update}')
+            finally:
+                lane.task_done()
+
+    def _start_lanes(self):
+        for n, lane in enumerate(self.lanes):
+            thread = threading.Thread(
+                target=self._run_lane, args=(lane,),
+                name=f'lane:{n}')
+            thread.start()
+            self._lane_threads.append(thread)
+
+    def _stop_lanes(self):
+        '''Finish the queued updates and stop the lane threads'''
+        threads, self._lane_threads = self._lane_threads, []
+        for lane in self.lanes:
+            lane.put(None)
+        for thread in threads:
+            thread.join()
+
+    def start(self, ready=None):
+        if self.running:
+            super(LaneDispatcher, self).start(ready)
+            return
+        self._start_lanes()
+        try:
+            super(LaneDispatcher, self).start(ready)
+        finally:
+            self._stop_lanes()
+
+    def queue_depths(self):
+        '''Updates waiting in the update queue and in each lane'''
+        return {
+            'updates': self.update_queue.qsize(),
+            'lanes': [lane.qsize() for lane in self.lanes],
+        }
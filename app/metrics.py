@@ -0,0 +1,267 @@
+'''Latency and throughput metrics of the bot process.
+
+Every handler callback, DB helper and Bot API request is timed into a
+histogram with fixed buckets: a perf_counter pair, a bisect and a few
+additions under a lock per call, cheap enough to stay on in production.
+Failed calls are counted as errors next to the histogram. Queue depths are
+gauges read when the metrics are rendered.
+
+Admins get a summary with /stats. With METRICS_PORT set in config the
+metrics are also served in the Prometheus text format on
+http://<host>:<METRICS_PORT>/metrics.
+'''
+
+import time
+import bisect
+import logging
+import functools
+import threading
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telegram.ext import ConversationHandler
+from telegram.utils.request import Request
+
+from router import Router
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'tutaka_'
+# seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count', 'errors', '_lock')
+
+    def __init__(self):
+        # the last count is for observations above the last bucket
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        i = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+            if error:
+                self.errors += 1
+
+    def quantile(self, q):
+        '''Upper bound of the bucket holding the q-quantile'''
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+_lock = threading.Lock()
+# family -> label -> Histogram
+_histograms = {}
+# gauge name -> function returning a number or {label: number}
+_gauges = {}
+
+
+def histogram(family, label=''):
+    histograms = _histograms.get(family)
+    if histograms is None or label not in histograms:
+        with _lock:
+            histograms = _histograms.setdefault(family, {})
+            histograms.setdefault(label, Histogram())
+    return histograms[label]
+
+
+def observe(family, label, seconds, error=False):
+    histogram(family, label).observe(seconds, error)
+
+
+@contextmanager
+def timer(family, label=''):
+    started = time.perf_counter()
+    error = True
+    try:
+        yield
+        error = False
+    finally:
+        observe(family, label, time.perf_counter() - started, error)
+
+
+def timed(family, label, func):
+    '''func wrapped to be timed in the family histogram under label'''
+    if getattr(func, '__metrics__', None):
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        error = True
+        try:
+            result = func(*args, **kwargs)
+            error = False
+            return result
+        finally:
+            observe(family, label, time.perf_counter() - started, error)
+    wrapper.__metrics__ = (family, label)
+    return wrapper
+
+
+def gauge(name, func):
+    _gauges[name] = func
+
+
+# ===========================  Instrumentation ===========================
+
+
+def _timed_handler(func):
+    return timed('handler', func.__name__, func) if func else func
+
+
+def instrument(handler):
+    '''Time the callbacks of a handler, including the handlers nested in
+    a ConversationHandler and the routes of a Router'''
+    if isinstance(handler, ConversationHandler):
+        nested = list(handler.entry_points) + list(handler.fallbacks)
+        for handlers in handler.states.values():
+            nested.extend(handlers)
+        for h in nested:
+            instrument(h)
+    elif isinstance(handler, Router):
+        handler.routes = {text: _timed_handler(callback)
+                          for text, callback in handler.routes.items()}
+        handler.products = _timed_handler(handler.products)
+        handler.default = _timed_handler(handler.default)
+    else:
+        handler.callback = _timed_handler(handler.callback)
+
+
+def instrument_dispatcher(dispatcher):
+    for handlers in dispatcher.handlers.values():
+        for handler in handlers:
+            instrument(handler)
+
+
+def instrument_module(module, prefixes):
+    '''Time the module functions whose names start with one of prefixes,
+    callers must look them up on the module (module.func)'''
+    for name, value in list(vars(module).items()):
+        if name.startswith(prefixes) and callable(value) and \
+                getattr(value, '__module__', None) == module.__name__:
+            setattr(module, name, timed('db', name, value))
+
+
+class InstrumentedRequest(Request):
+    '''Request timing every Bot API call by its method name'''
+
+    def post(self, url, data, timeout=None):
+        with timer('api', url.rsplit('/', 1)[-1]):
+            return super(InstrumentedRequest, self).post(
+                url, data, timeout=timeout)
+
+    def get(self, url, timeout=None):
+        with timer('api', url.rsplit('/', 1)[-1]):
+            return super(InstrumentedRequest, self).get(url, timeout=timeout)
+
+
+# ==============================  Output  ===============================
+
+
+def _labels(family, label, le=None):
+    pairs = [f'{family}="{label}"'] if label != '' else []
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _gauge_values():
+    values = []
+    for name, func in sorted(_gauges.items()):
+        try:
+            value = func()
+        except Exception as ex:
+            logger.warning(f'metrics: gauge {name}: {ex}')
+            continue
+        if isinstance(value, dict):
+            values.extend((name, label, v) for label, v in value.items())
+        else:
+            values.append((name, '', value))
+    return values
+
+
+def render():
+    '''All metrics in the Prometheus text exposition format'''
+    lines = []
+    for family, histograms in sorted(_histograms.items()):
+        name = f'{PREFIX}{family}_seconds'
+        lines.append(f'# TYPE {name} histogram')
+        for label, h in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(family, label, bound)} '
+                             f'{cumulative}')
+            lines.append(f'{name}_bucket{_labels(family, label, "+Inf")} '
+                         f'{h.count}')
+            lines.append(f'{name}_sum{_labels(family, label)} {h.sum:.6f}')
+            lines.append(f'{name}_count{_labels(family, label)} {h.count}')
+        name = f'{PREFIX}{family}_errors_total'
+        lines.append(f'# TYPE {name} counter')
+        for label, h in sorted(histograms.items()):
+            lines.append(f'{name}{_labels(family, label)} {h.errors}')
+    typed = set()
+    for name, label, value in _gauge_values():
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {PREFIX}{name} gauge')
+        lines.append(f'{PREFIX}{name}{_labels("queue", label)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def summary(top=10):
+    '''Short text for /stats: the slowest labels of each family by total
+    time, then the gauges'''
+    lines = []
+    for family, histograms in sorted(_histograms.items()):
+        lines.append(f'{family}: calls err p50 p95 total')
+        ranked = sorted(histograms.items(), key=lambda item: -item[1].sum)
+        for label, h in ranked[:top]:
+            lines.append(
+                f'  {label or "-"} {h.count} {h.errors} '
+                f'{h.quantile(0.5) * 1000:.0f}ms '
+                f'{h.quantile(0.95) * 1000:.0f}ms {h.sum:.1f}s')
+    for name, label, value in _gauge_values():
+        lines.append(f'{name}{" " + str(label) if label != "" else ""}: '
+                     f'{value}')
+    return '\n'.join(lines)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host='0.0.0.0'):
+    '''Serve /metrics from a daemon thread'''
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics',
+                     daemon=True).start()
+    logger.info(f'metrics: serving on {host}:{port}/metrics')
+    return server
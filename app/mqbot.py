@@ -0,0 +1,179 @@
+'''Bot whose outgoing API calls all go through one throttled MessageQueue.
+
+Every sending method is queued, not just send_message, so photos,
+documents, edits and deletes count against the same limits. Messages to
+group chats (negative chat id, the admin chat) also pass the group budget
+of the queue, Telegram allows about 20 messages a minute per group.
+
+The queue is ordered by priority, then by arrival: order confirmations to
+customers (HIGH) go before the regular replies (NORMAL), which go before
+bulk traffic such as documents and broadcasts (LOW). Pass priority=... to
+any queued method, or queued=False to call the API directly.
+
+A queued call returns a Promise, call .result() when the sent Message is
+needed. A RetryAfter from Telegram is retried in the queue thread after
+the pause it asks for, which holds the queue for everyone.
+'''
+
+import time
+import heapq
+import logging
+import functools
+import itertools
+import queue
+
+import telegram.bot
+from telegram.error import RetryAfter
+from telegram.ext import messagequeue as mq
+from telegram.utils.promise import Promise
+
+logger = logging.getLogger(__name__)
+
+HIGH, NORMAL, LOW = range(3)
+
+# RetryAfter answers of one call before giving up
+RETRY_AFTER_ATTEMPTS = 3
+
+
+def _priority(item):
+    if item is None:
+        # stop request of the DelayQueue
+        return -1
+    func, args, kwargs = item
+    # the group queue forwards (all_delayq, (promise,), {})
+    promise = args[0] if args else func
+    return getattr(promise, 'priority', NORMAL)
+
+
+class PromiseQueue(queue.PriorityQueue):
+    '''DelayQueue input ordered by priority, FIFO within one priority'''
+
+    def _init(self, maxsize):
+        super(PromiseQueue, self)._init(maxsize)
+        self._seq = itertools.count()
+
+    def _put(self, item):
+        heapq.heappush(self.queue, (_priority(item), next(self._seq), item))
+
+    def _get(self):
+        return heapq.heappop(self.queue)[2]
+
+
+class PriorityMessageQueue(mq.MessageQueue):
+    '''MessageQueue with PromiseQueue inputs'''
+
+    def __init__(self,
+                 all_burst_limit=30,
+                 all_time_limit_ms=1000,
+                 group_burst_limit=20,
+                 group_time_limit_ms=60000,
+                 exc_route=None,
+                 autostart=True):
+        self._all_delayq = mq.DelayQueue(
+            queue=PromiseQueue(),
+            burst_limit=all_burst_limit,
+            time_limit_ms=all_time_limit_ms,
+            exc_route=exc_route,
+            autostart=autostart)
+        self._group_delayq = mq.DelayQueue(
+            queue=PromiseQueue(),
+            burst_limit=group_burst_limit,
+            time_limit_ms=group_time_limit_ms,
+            exc_route=exc_route,
+            autostart=autostart)
+
+    def depths(self):
+        '''Calls waiting in the bot-wide and in the group queue'''
+        return {'all': self._all_delayq._queue.qsize(),
+                'group': self._group_delayq._queue.qsize()}
+
+
+def is_group_chat(chat_id):
+    try:
+        return int(chat_id) < 0
+    except (TypeError, ValueError):
+        # @channelusername
+        return isinstance(chat_id, str)
+
+
+def queued(method):
+    '''Like mq.queuedmessage, plus priority and group detection'''
+    @functools.wraps(method)
+    def wrapped(self, *args, **kwargs):
+        is_queued = kwargs.pop('queued', self._is_messages_queued_default)
+        priority = kwargs.pop('priority', NORMAL)
+        chat_id = kwargs.get('chat_id', args[0] if args else None)
+        isgroup = kwargs.pop('isgroup', is_group_chat(chat_id))
+        if not is_queued:
+            return method(self, *args, **kwargs)
+        promise = Promise(self._call, (method,) + args, kwargs)
+        promise.priority = priority
+        return self._msg_queue(promise, isgroup)
+    return wrapped
+
+
+class MQBot(telegram.bot.Bot):
+    '''A subclass of Bot which delegates send method handling to MQ'''
+    def __init__(self, *args, is_queued_def=True, mqueue=None, **kwargs):
+        super(MQBot, self).__init__(*args, **kwargs)
+        # below 2 attributes should be provided for decorator usage
+        self._is_messages_queued_default = is_queued_def
+        self._msg_queue = mqueue or PriorityMessageQueue()
+
+    def __del__(self):
+        try:
+            self._msg_queue.stop()
+        except Exception:
+            pass
+
+    def _call(self, method, *args, **kwargs):
+        for attempt in range(1, RETRY_AFTER_ATTEMPTS + 1):
+            try:
+                return method(self, *args, **kwargs)
+            except RetryAfter as ex:
+                if attempt == RETRY_AFTER_ATTEMPTS:
+                    raise
+                logger.warning(f'{method.__name__}: retry after '
+                               f'{ex.retry_after} s')
+                time.sleep(ex.retry_after)
+                # files were read by the failed attempt
+                for value in kwargs.values():
+                    if hasattr(value, 'seek'):
+                        value.seek(0)
+
+    @queued
+    def send_message(self, *args, **kwargs):
+        return super(MQBot, self).send_message(*args, **kwargs)
+
+    @queued
+    def send_photo(self, *args, **kwargs):
+        return super(MQBot, self).send_photo(*args, **kwargs)
+
+    @queued
+    def send_document(self, *args, **kwargs):
+        return super(MQBot, self).send_document(*args, **kwargs)
+
+    @queued
+    def edit_message_text(self, *args, **kwargs):
+        return super(MQBot, self).edit_message_text(*args, **kwargs)
+
+    @queued
+    def edit_message_reply_markup(self, *args, **kwargs):
+        return super(MQBot, self).edit_message_reply_markup(*args, **kwargs)
+
+    @queued
+    def delete_message(self, *args, **kwargs):
+        return super(MQBot, self).delete_message(*args, **kwargs)
+
+    # the camelCase aliases of Bot point to the unqueued methods
+    sendMessage = send_message
+    sendPhoto = send_photo
+    sendDocument = send_document
+    editMessageText = edit_message_text
+    editMessageReplyMarkup = edit_message_reply_markup
+    deleteMessage = delete_message
+
+
+def result(sent):
+    '''The return value of a bot call, waiting for it if it was queued'''
+    return sent.result() if isinstance(sent, Promise) else sent
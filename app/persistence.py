@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+'''Conversation persistence in the bot_state table.
+
+Replaces PicklePersistence, which rewrote every user's data to one pickle
+file and loaded all of it at startup. Here each user_data, chat_data and
+conversation entry is one row, loaded the first time the user shows up and
+written only when it changed. Changed entries are collected in memory and
+written in one transaction by flush(), run from the job queue every
+FLUSH_INTERVAL seconds and on shutdown.
+
+Entries are stored as JSON with ids only: a catalog product is saved as
+its id and looked up in the catalog again when loaded, derived values like
+the rendered cart are not saved at all.
+
+Import the data of the old pickle file (from app/):
+
+    python persistence.py conversation
+'''
+
+import sys
+import json
+import pickle
+import logging
+import threading
+
+from collections import defaultdict
+from telegram import Location
+from telegram.ext import BasePersistence
+
+import catalog
+import metrics
+from cart import Cart
+from admin import data as db
+
+logger = logging.getLogger(__name__)
+
+# seconds between writes of the changed entries
+FLUSH_INTERVAL = 5
+
+# user_data keys that are recomputed when needed and never stored
+TRANSIENT_KEYS = ('quote',)
+
+
+def _pack(value):
+    if isinstance(value, catalog.CatalogProduct):
+        return {'$product': value.id}
+    if isinstance(value, Location):
+        return {'$location': [value.longitude, value.latitude]}
+    if isinstance(value, Cart):
+        return {'$cart': value.to_state()}
+    if isinstance(value, dict):
+        return {k: _pack(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_pack(v) for v in value]
+    return value
+
+
+def _unpack(value):
+    if '$product' in value:
+        return catalog.get().get_product_by_id(value['$product'])
+    if '$location' in value:
+        return Location(*value['$location'])
+    if '$cart' in value:
+        return Cart.from_state(value['$cart'])
+    return value
+
+
+def _upgrade(data):
+    # carts stored before Cart were lists of product_id / quontity dicts
+    if isinstance(data.get('cart'), list):
+        data['cart'] = Cart.from_items(data['cart'])
+    return data
+
+
+def _unknown(value):
+    logger.warning(f'persistence: {type(value).__name__} is not stored')
+    return None
+
+
+def encode(data):
+    '''Compact JSON of a user_data / chat_data dict, None if empty'''
+    data = {k: v for k, v in data.items() if k not in TRANSIENT_KEYS}
+    if not data:
+        return None
+    return json.dumps(_pack(data), default=_unknown,
+                      ensure_ascii=False, separators=(',', ':'))
+
+
+def decode(text):
+    return json.loads(text, object_hook=_unpack)
+
+
+class LazyData(defaultdict):
+    '''user_data / chat_data, an entry is read from the DB on first access'''
+
+    def __init__(self, load):
+        super(LazyData, self).__init__(dict)
+        self._load = load
+
+    def __missing__(self, key):
+        value = self[key] = self._load(key)
+        return value
+
+
+class LazyConversations(dict):
+    '''Conversation states, read from the DB on first lookup of a key'''
+
+    def __init__(self, load):
+        super(LazyConversations, self).__init__()
+        self._load = load
+        # keys known to have no state, not looked up again
+        self._empty = set()
+
+    def get(self, key, default=None):
+        if key not in self and key not in self._empty:
+            state = self._load(key)
+            if state is None:
+                self._empty.add(key)
+            else:
+                dict.__setitem__(self, key, state)
+        return super(LazyConversations, self).get(key, default)
+
+    def __setitem__(self, key, value):
+        self._empty.discard(key)
+        super(LazyConversations, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._empty.add(key)
+        super(LazyConversations, self).__delitem__(key)
+
+
+class SQLPersistence(BasePersistence):
+    '''BasePersistence on the bot_state table, see the module docstring'''
+
+    def __init__(self, store_user_data=True, store_chat_data=True,
+                 store_bot_data=True):
+        super(SQLPersistence, self).__init__(
+            store_user_data=store_user_data,
+            store_chat_data=store_chat_data,
+            store_bot_data=store_bot_data)
+        self._lock = threading.Lock()
+        # (kind, key) -> data last loaded or queued, to skip unchanged entries
+        self._saved = {}
+        # (kind, key) -> data waiting for flush(), None deletes the row
+        self._dirty = {}
+
+    def _read(self, kind, key):
+        text = db.get_bot_state(kind, key)
+        self._saved[(kind, key)] = text
+        return text
+
+    def _update(self, kind, key, text):
+        if self._saved.get((kind, key)) == text:
+            return
+        self._saved[(kind, key)] = text
+        with self._lock:
+            self._dirty[(kind, key)] = text
+
+    def _load_data(self, kind, id):
+        text = self._read(kind, str(id))
+        return _upgrade(decode(text)) if text else {}
+
+    def _load_state(self, name, key):
+        text = self._read('conversation:' + name, json.dumps(key))
+        return json.loads(text) if text else None
+
+    def get_user_data(self):
+        return LazyData(lambda id: self._load_data('user_data', id))
+
+    def get_chat_data(self):
+        return LazyData(lambda id: self._load_data('chat_data', id))
+
+    def get_bot_data(self):
+        return self._load_data('bot_data', '')
+
+    def get_conversations(self, name):
+        return LazyConversations(lambda key: self._load_state(name, key))
+
+    def update_user_data(self, user_id, data):
+        self._update('user_data', str(user_id), encode(data))
+
+    def update_chat_data(self, chat_id, data):
+        self._update('chat_data', str(chat_id), encode(data))
+
+    def update_bot_data(self, data):
+        self._update('bot_data', '', encode(data))
+
+    def update_conversation(self, name, key, new_state):
+        self._update('conversation:' + name, json.dumps(key),
+                     None if new_state is None else json.dumps(new_state))
+
+    def flush(self):
+        '''Write the changed entries in one transaction'''
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+        try:
+            with metrics.timer('persistence_flush'):
+                db.save_bot_state(
+                    [(kind, key, text) for (kind, key), text in dirty.items()])
+        except Exception:
+            logger.exception(f'persistence: flush of {len(dirty)} entries')
+            # retried on the next flush unless changed again meanwhile
+            with self._lock:
+                for entry, text in dirty.items():
+                    self._dirty.setdefault(entry, text)
+
+    def flush_job(self, context):
+        self.flush()
+
+
+# ===========================  Pickle import ===========================
+
+class _PickledRow:
+    '''Stands in for the SQLAlchemy objects PicklePersistence stored'''
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            self.__dict__.update(state)
+
+
+class _Unpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if module.startswith(('admin', 'sqlalchemy')):
+            return _PickledRow
+        return super(_Unpickler, self).find_class(module, name)
+
+
+def _compact_user_data(data):
+    data = dict(data)
+    product = data.get('product')
+    if isinstance(product, _PickledRow):
+        data['product'] = catalog.get().get_product_by_id(
+            getattr(product, 'id', None))
+    return _upgrade(data)
+
+
+def import_pickle(filename):
+    '''Copy a PicklePersistence file (single_file=True) into bot_state'''
+    with open(filename, 'rb') as f:
+        stored = _Unpickler(f).load()
+
+    rows = []
+    for user_id, data in stored.get('user_data', {}).items():
+        rows.append(('user_data', str(user_id),
+                     encode(_compact_user_data(data))))
+    for chat_id, data in stored.get('chat_data', {}).items():
+        rows.append(('chat_data', str(chat_id), encode(data)))
+    rows.append(('bot_data', '', encode(stored.get('bot_data') or {})))
+    for name, states in stored.get('conversations', {}).items():
+        for key, state in states.items():
+            rows.append(('conversation:' + name, json.dumps(key),
+                         None if state is None else json.dumps(state)))
+
+    db.save_bot_state(rows)
+    return len([row for row in rows if row[2] is not None])
+
+
+if __name__ == '__main__':
+    import config
+    db.configure(getattr(config, 'DATABASE_URI', None),
+                 getattr(config, 'SQLITE_PRAGMAS', None))
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'conversation'
+    print(f'{import_pickle(filename)} entries imported from {filename}')
@@ -0,0 +1,70 @@
+'''Product photos sent by Telegram file_id instead of re-uploading.
+
+After the first upload of an image the file_id returned by Telegram is
+stored in the product_photos table, keyed by image path and content hash.
+An image replaced through the admin panel gets a new hash and is uploaded
+again, an id rejected by Telegram is dropped and the image re-uploaded.
+'''
+
+import os
+import hashlib
+import logging
+import threading
+
+from telegram.error import BadRequest
+
+import utils
+from mqbot import result
+from admin import data as db
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_file_ids = None
+# image path -> (mtime, size, sha1), avoids hashing the file on every view
+_hashes = {}
+
+
+def get_image_hash(path):
+    stat = os.stat(path)
+    cached = _hashes.get(path)
+    if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+        return cached[2]
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha1.update(chunk)
+    _hashes[path] = (stat.st_mtime, stat.st_size, sha1.hexdigest())
+    return sha1.hexdigest()
+
+
+def _get_file_ids():
+    global _file_ids
+    if _file_ids is None:
+        with _lock:
+            if _file_ids is None:
+                _file_ids = db.get_photo_file_ids()
+    return _file_ids
+
+
+def reply_product_photo(message, img_path, **kwargs):
+    '''Reply with the product image, by file_id when Telegram has it'''
+    path = utils.get_image_path(img_path)
+    key = (img_path, get_image_hash(path))
+    file_ids = _get_file_ids()
+
+    file_id = file_ids.get(key)
+    if file_id is not None:
+        try:
+            return result(message.reply_photo(photo=file_id, **kwargs))
+        except BadRequest as ex:
+            logger.warning(f'reply_product_photo: {img_path} {ex}')
+            file_ids.pop(key, None)
+            db.delete_photo_file_id(*key)
+
+    with open(path, 'rb') as f:
+        # wait for the queued upload before the file is closed
+        sent = result(message.reply_photo(photo=f, **kwargs))
+    file_ids[key] = sent.photo[-1].file_id
+    db.save_photo_file_id(*key, file_ids[key])
+    return sent
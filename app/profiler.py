@@ -0,0 +1,170 @@
+'''On-demand profiling of the running bot (/profile).
+
+An admin starts a session for the next N updates or for T seconds. Each
+update handled during the session runs under its own cProfile profiler
+and the stats are merged; with memory tracing tracemalloc runs for the
+whole session as well. At the end the sorted stats and the top allocation
+sites are sent to the admin as a text document.
+
+The bot keeps serving meanwhile. Updates run in parallel on the
+dispatcher lanes but only one is profiled at a time, the others run
+without the profiler and are counted as skipped.
+
+    /profile            next 100 updates
+    /profile 50         next 50 updates
+    /profile 30s mem    30 seconds, with tracemalloc
+'''
+
+import io
+import time
+import pstats
+import logging
+import cProfile
+import threading
+import tracemalloc
+
+from datetime import datetime
+
+import mqbot
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UPDATES = 100
+# an update-count session ends after this many seconds anyway
+MAX_SECONDS = 600
+STATS_LINES = 60
+ALLOCATION_SITES = 30
+
+
+class Session:
+    def __init__(self, bot, chat_id, updates=None, seconds=None,
+                 memory=False):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.updates = updates
+        self.seconds = seconds or MAX_SECONDS
+        self.memory = memory
+        self.started = time.monotonic()
+        self.profiled = 0
+        self.skipped = 0
+        self.stats = None
+        # held while an update is profiled
+        self.lock = threading.Lock()
+        self.timer = threading.Timer(self.seconds, finish, args=(self,))
+        self.timer.daemon = True
+
+    def add(self, profiler):
+        profiler.create_stats()
+        if self.stats is None:
+            self.stats = pstats.Stats(profiler)
+        else:
+            self.stats.add(profiler)
+        self.profiled += 1
+
+    def is_complete(self):
+        return self.updates is not None and self.profiled >= self.updates
+
+
+_lock = threading.Lock()
+_session = None
+
+
+def parse_args(args):
+    '''(updates, seconds, memory) from the /profile arguments'''
+    updates, seconds, memory = None, None, False
+    for arg in args:
+        if arg == 'mem':
+            memory = True
+        elif arg.endswith('s') and arg[:-1].isdigit():
+            seconds = int(arg[:-1])
+        elif arg.isdigit():
+            updates = int(arg)
+        else:
+            raise ValueError(arg)
+    if seconds is None and updates is None:
+        updates = DEFAULT_UPDATES
+    return updates, min(seconds or MAX_SECONDS, MAX_SECONDS), memory
+
+
+def start(bot, chat_id, updates=None, seconds=None, memory=False):
+    '''Start a session, False if one is running already'''
+    global _session
+    with _lock:
+        if _session is not None:
+            return False
+        session = Session(bot, chat_id, updates, seconds, memory)
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        else:
+            session.memory = False
+        _session = session
+    session.timer.start()
+    logger.info(f'profiler: started, {updates} updates, '
+                f'{session.seconds} s, memory {session.memory}')
+    return True
+
+
+def run(func, *args):
+    '''func(*args), profiled if a session wants this call'''
+    session = _session
+    if session is None:
+        return func(*args)
+    if not session.lock.acquire(blocking=False):
+        session.skipped += 1
+        return func(*args)
+    try:
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args)
+        finally:
+            session.add(profiler)
+    finally:
+        session.lock.release()
+        if session.is_complete():
+            finish(session)
+
+
+def finish(session):
+    '''End the session and send the report, once'''
+    global _session
+    with _lock:
+        if _session is not session:
+            return
+        _session = None
+    session.timer.cancel()
+    with session.lock:
+        snapshot = None
+        if session.memory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        report = _report(session, snapshot)
+    logger.info(f'profiler: done, {session.profiled} updates')
+    session.bot.send_document(
+        chat_id=session.chat_id,
+        document=io.BytesIO(report.encode('utf-8')),
+        filename=f'profile-{datetime.now():%Y%m%d-%H%M%S}.txt',
+        priority=mqbot.LOW)
+
+
+def _report(session, snapshot):
+    out = io.StringIO()
+    elapsed = time.monotonic() - session.started
+    out.write(f'{session.profiled} updates profiled, {session.skipped} '
+              f'skipped while another was profiled, {elapsed:.1f} s\n\n')
+    if session.stats is None:
+        out.write('no updates\n')
+    else:
+        session.stats.stream = out
+        out.write('=== by cumulative time ===\n')
+        session.stats.sort_stats('cumulative').print_stats(STATS_LINES)
+        out.write('=== by own time ===\n')
+        session.stats.sort_stats('tottime').print_stats(STATS_LINES // 2)
+    if snapshot is not None:
+        out.write('=== top allocation sites ===\n')
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+        for stat in snapshot.statistics('lineno')[:ALLOCATION_SITES]:
+            out.write(f'{stat}\n')
+    return out.getvalue()
@@ -0,0 +1,166 @@
+'''Order export and sales summary for /getreport.
+
+    /getreport                          every order
+    /getreport 2024-01-01               orders from that day on
+    /getreport 2024-01-01 2024-01-31    orders of January
+    /getreport new                      orders since the last "new" export
+    /getreport sum [dates]              sales summary, of today by default
+
+An export runs in its own thread, not in the dispatcher, one at a time.
+Orders are read in id order, BATCH_SIZE rows at a time from a streaming
+cursor, and written as they come to a gzipped CSV file with a header row,
+so memory use does not depend on the size of the table. The file is
+written to a temporary directory, sent to the admin when it is complete
+and removed.
+
+"new" exports the orders after the last order of the previous "new"
+export. That order id, the watermark, is kept in the bot_state table and
+only moved once the file was sent.
+
+The summary is read from the daily and hourly sales rollups (see
+data.add_sales), a few small queries whatever the period.
+'''
+
+import os
+import csv
+import gzip
+import time
+import shutil
+import logging
+import tempfile
+import threading
+
+from datetime import datetime, timedelta
+
+import mqbot
+import config
+from admin import data as db
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+# lines of the best selling products in the summary
+TOP_PRODUCTS = 15
+# bot_state row of the "new" watermark
+WATERMARK = ('export', 'orders')
+
+_lock = threading.Lock()
+
+
+def parse_args(args):
+    '''(kind, since, until) from the /getreport arguments, kind is orders,
+    new or summary, until is exclusive'''
+    if args == ['new']:
+        return 'new', None, None
+    kind = 'orders'
+    if args[:1] == ['sum']:
+        kind, args = 'summary', args[1:]
+    if len(args) > 2:
+        raise ValueError(args)
+    dates = [datetime.strptime(arg, '%Y-%m-%d') for arg in args]
+    since = dates[0] if dates else None
+    until = dates[1] + timedelta(days=1) if len(dates) > 1 else None
+    if kind == 'summary':
+        today = datetime.combine(datetime.now().date(), datetime.min.time())
+        since = since or today
+        until = until or today + timedelta(days=1)
+    return kind, since, until
+
+
+def summary(since, until):
+    '''Sales of [since, until) as message text'''
+    sales = db.get_sales_summary(since, until)
+    currency = config.text['currency']
+    last_day = until - timedelta(days=1)
+    lines = [
+        f'Продажи {since:%Y-%m-%d}' +
+        (f' — {last_day:%Y-%m-%d}' if last_day > since else ''),
+        f'Заказов: {sales["orders"]}, товаров: {sales["items"]}',
+        f'Выручка: {sales["revenue"]:.2f} {currency}, '
+        f'средний чек: {sales["average"]:.2f} {currency}',
+    ]
+    for title, split in (('Статус', 'status'), ('Оплата', 'payment_type'),
+                         ('Получение', 'delivery_type')):
+        lines.append(f'\n{title}:')
+        lines.extend(f'  {key}: {orders} / {revenue:.2f}'
+                     for key, orders, revenue in sales[split])
+    if sales['products']:
+        lines.append('\nТовары, шт.:')
+        lines.extend(f'  {key}: {quantity}' for key, quantity
+                     in sales['products'][:TOP_PRODUCTS])
+    if until - since == timedelta(days=1):
+        hours = db.get_hourly_sales(since, until)
+        if hours:
+            lines.append('\nПо часам:')
+            lines.extend(f'  {start:%H:00} {orders} / {revenue / 100:.2f}'
+                         for start, orders, revenue in hours)
+    # the message limit is 4096 characters
+    return '\n'.join(lines)[:4000]
+
+
+def write_csv(path, rows):
+    '''Write the order rows with a header row to a gzipped CSV file,
+    returns (count, id of the last order)'''
+    count, last_id = 0, None
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        out = csv.writer(f)
+        out.writerow(column.name for column in db.Order.__table__.columns)
+        for row in rows:
+            out.writerow(row)
+            count += 1
+            last_id = row.id
+    return count, last_id
+
+
+def export(bot, chat_id, since=None, until=None, incremental=False):
+    '''Write the orders to a file and send it to chat_id'''
+    after_id = None
+    if incremental:
+        after_id = int(db.get_bot_state(*WATERMARK) or 0)
+    directory = tempfile.mkdtemp(prefix='report-')
+    filename = f'orders-{datetime.now():%Y%m%d-%H%M%S}.csv.gz'
+    path = os.path.join(directory, filename)
+    try:
+        started = time.monotonic()
+        count, last_id = write_csv(path, db.export_orders(
+            since, until, after_id, BATCH_SIZE))
+        # do not keep the read transaction open while sending
+        db.session.remove()
+        logger.info(f'report: {count} orders in '
+                    f'{time.monotonic() - started:.1f} s')
+        if not count:
+            bot.send_message(chat_id=chat_id, text='Заказов нет')
+            return
+        with open(path, 'rb') as f:
+            # wait for the queued upload before the file is removed
+            mqbot.result(bot.send_document(
+                chat_id=chat_id,
+                document=f,
+                filename=filename,
+                caption=f'Заказов: {count}',
+                priority=mqbot.LOW))
+        if incremental:
+            db.save_bot_state([WATERMARK + (str(last_id),)])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run(bot, chat_id, since, until, incremental):
+    try:
+        export(bot, chat_id, since, until, incremental)
+    except Exception:
+        logger.exception('report')
+        bot.send_message(chat_id=chat_id, text='Выгрузка не удалась')
+    finally:
+        db.session.remove()
+        _lock.release()
+
+
+def start(bot, chat_id, since=None, until=None, incremental=False):
+    '''Start an export thread, False if one is running already'''
+    if not _lock.acquire(blocking=False):
+        return False
+    threading.Thread(
+        target=run, args=(bot, chat_id, since, until, incremental),
+        name='report', daemon=True).start()
+    return True
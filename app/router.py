@@ -0,0 +1,51 @@
+'''Routing of reply keyboard buttons.
+
+A button press sends the button's text, so a state of the conversation
+does not need a MessageHandler with a regex per button: Router looks the
+text up in a dict of button texts, then in the product titles of the
+current catalog snapshot, and only then falls back to a default
+callback for free text. Regex handlers are left for texts that are not
+known in advance, like the ❌ lines of the cart.
+
+Texts are matched exactly, a message that merely contains a button text
+is free text.
+'''
+
+from telegram import Update
+from telegram.ext import Handler
+
+import catalog
+
+
+class Router(Handler):
+    '''One handler for all the buttons of a conversation state.
+
+    routes maps button texts to callbacks, products is the callback for
+    product titles of the catalog and default the one for any other text.
+    The callback returns the next state as usual'''
+
+    def __init__(self, routes, products=None, default=None):
+        super(Router, self).__init__(self.route)
+        self.routes = dict(routes)
+        self.products = products
+        self.default = default
+
+    def route(self, text):
+        '''Callback for a message text, None if it is not handled here'''
+        callback = self.routes.get(text)
+        if callback is not None:
+            return callback
+        if self.products is not None and catalog.get().is_product(text):
+            return self.products
+        return self.default
+
+    def check_update(self, update):
+        if not isinstance(update, Update):
+            return None
+        message = update.message or update.edited_message
+        if message is None or not message.text:
+            return None
+        return self.route(message.text)
+
+    def handle_update(self, update, dispatcher, check_result, context=None):
+        return check_result(update, context)
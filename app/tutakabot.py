@@ -3,28 +3,44 @@
 import logging
 import re
 import utils
+import catalog
+import photos
+import persistence
+import broadcast
+import webhook
+import lanes
+import metrics
+import profiler
+import report
+import backup
+from router import Router
+from mqbot import MQBot, PriorityMessageQueue, HIGH, LOW
+from cart import Cart
 import os
-import telegram.bot
 import sys
 
 from datetime import datetime
 from telegram import ParseMode, InlineKeyboardMarkup
-from telegram.ext import (Updater, CommandHandler, MessageHandler,
+from telegram.ext import (CommandHandler, MessageHandler,
                           CallbackQueryHandler, Filters,
-                          ConversationHandler, PicklePersistence)
-from telegram.ext import messagequeue as mq
-from telegram.utils.request import Request
+                          ConversationHandler, JobQueue)
 from threading import Thread
+from queue import Queue
 
 import config
-from admin import admin as db
+from admin import data as db
+from admin import logs
 
-# Enable logging
-logging.basicConfig(
-    filename='bot.log',
-    filemode='a+',
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO)
+db.configure(getattr(config, 'DATABASE_URI', None),
+             getattr(config, 'SQLITE_PRAGMAS', None))
+
+# Enable logging, JSON lines written from a background thread
+LOG_FILE = getattr(config, 'LOG_FILE', 'bot.log')
+logs.setup(
+    LOG_FILE,
+    max_bytes=getattr(config, 'LOG_MAX_BYTES', logs.MAX_BYTES),
+    backup_count=getattr(config, 'LOG_BACKUP_COUNT', logs.BACKUP_COUNT),
+    interval=getattr(config, 'LOG_ROTATE_INTERVAL', logs.INTERVAL))
 
 logger = logging.getLogger(__name__)
 
@@ -34,25 +50,17 @@ INITIAL, NAME, PHONE, BIRTHDAY, CHOOSING_CATEGORY, \
     SETTINGS_ENTERING_PHONE, SETTINGS_ENTERING_NAME = range(14)
 
 
-class MQBot(telegram.bot.Bot):
-    '''A subclass of Bot which delegates send method handling to MQ'''
-    def __init__(self, *args, is_queued_def=True, mqueue=None, **kwargs):
-        super(MQBot, self).__init__(*args, **kwargs)
-        # below 2 attributes should be provided for decorator usage
-        self._is_messages_queued_default = is_queued_def
-        self._msg_queue = mqueue or mq.MessageQueue()
-
-    def __del__(self):
-        try:
-            self._msg_queue.stop()
-        except Exception:
-            pass
+class UnitOfWorkDispatcher(lanes.LaneDispatcher):
+    '''Dispatcher handling every update inside one DB session scope, the
+    handler's writes are committed once at the end or rolled back on error'''
+    def handle_update(self, update):
+        with metrics.timer('update'), db.session_scope():
+            profiler.run(
+                super(UnitOfWorkDispatcher, self).handle_update, update)
 
-    @mq.queuedmessage
-    def send_message(self, *args, **kwargs):
-        '''Wrapped method would accept new `queued` and `isgroup`
-        OPTIONAL arguments'''
-        return super(MQBot, self).send_message(*args, **kwargs)
+    def dispatch_error(self, update, error):
+        db.fail_scope()
+        super(UnitOfWorkDispatcher, self).dispatch_error(update, error)
 
 
 def start(update, context):
@@ -73,6 +81,9 @@ def start(update, context):
             )
             return NAME
         else:
+            if db.get_user(user.id).blocked:
+                # came back after blocking the bot, include in broadcasts
+                db.update_user(user.id, 'blocked', None)
             update.message.reply_text(
                 config.text['select_menu'],
                 reply_markup=utils.get_start_kb()
@@ -94,8 +105,9 @@ def cart_handler(update, context):
         logger.info(f'cart_handler: empty_card {chat_id}')
         return start(update, context)
     else:
+        rendered = utils.render_cart(context.user_data)
         update.message.reply_text(
-            utils.generate_cart_reply_text(context.user_data),
+            rendered.text,
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=utils.get_cart_kb(context.user_data['cart'])
         )
@@ -262,7 +274,7 @@ def select_category(update, context):
 
 def show_product(update, context):
     try:
-        product = db.get_product(
+        product = catalog.get().get_product(
             update.message.text, context.user_data['category'])
         context.user_data.update(
             product=product
@@ -271,8 +283,9 @@ def show_product(update, context):
                f'{product.composition}\n\n'\
                f'Цена: {product.price} {config.text["currency"]}\n\n'\
                f'*Выберите* или *введите* количество:'
-        update.message.reply_photo(
-            photo=open(utils.get_image_path(product.img_path), 'rb'),
+        photos.reply_product_photo(
+            update.message,
+            product.img_path,
             caption=desc,
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=utils.get_quontity_kb()
@@ -286,12 +299,11 @@ def add_to_cart_handler(update, context):
     # TODO check if quontity is INT
 
     if 'cart' not in context.user_data:
-        context.user_data.update({'cart': []})
+        context.user_data.update({'cart': Cart()})
     try:
-        context.user_data['cart'].append({
-            'product_id': context.user_data['product'].id,
-            'quontity': int(update.message.text)
-            })
+        context.user_data['cart'].add(
+            context.user_data['product'],
+            int(update.message.text))
     except Exception as ex:
         logger.warning(ex)
 
@@ -362,9 +374,14 @@ def order_confirmation_handler(update, context):
     chat = utils.get_chat(context, update)
     chat_id = chat.effective_chat.id
     context.user_data.update(payment_type=update.message.text)
-    logger.info(f'order_confirmation_handler -> {context.user_data}')
+    logger.info(f'order_confirmation_handler -> '
+                f'{utils.summarize_user_data(context.user_data)}')
+    # kept in user_data, submit_order_handler reuses it for the order row
+    # and the admin message unless the cart changes in between
+    quote = utils.Quote(context.user_data)
+    context.user_data.update(quote=quote)
     update.message.reply_text(
-        utils.generate_full_order_info(context.user_data, chat_id),
+        utils.generate_full_order_info(context.user_data, chat_id, quote),
         parse_mode=ParseMode.MARKDOWN,
         reply_markup=utils.get_confirm_order_kb()
     )
@@ -393,14 +410,16 @@ def cancel_order_handler(update, context):
 def submit_order_handler(update, context):
     chat = utils.get_chat(context, update)
     chat_id = chat.effective_chat.id
-    logger.info(f'submit_order_handler -> {context.user_data}')
-    order_id = utils.add_order(context.user_data, chat_id)
+    logger.info(f'submit_order_handler -> '
+                f'{utils.summarize_user_data(context.user_data)}')
+    quote = utils.get_quote(context.user_data)
+    order_id = utils.add_order(context.user_data, chat_id, quote)
     context.user_data.update(
         order_id=order_id)
     # 1. Send Order Info to admins chat
     utils.send_message_to_admin(
         context.bot,
-        f'{utils.generate_full_order_info(context.user_data, chat_id)} \n\n'
+        f'{utils.generate_full_order_info(context.user_data, chat_id, quote)} \n\n'
         f'`User_id: {chat_id}` \n'
         f'`Order_id: {order_id}` \n',
         True,
@@ -410,8 +429,10 @@ def submit_order_handler(update, context):
         utils.generate_order_confirmation(
             context.user_data
         ),
-        reply_markup=utils.get_start_kb()
+        reply_markup=utils.get_start_kb(),
+        priority=HIGH
     )
+    context.user_data.pop('quote', None)
     done(update, context)
 
 
@@ -438,7 +459,8 @@ def delivery_time_handler(update, context):
             text=f'Ваш заказ будет доставлен в течении '
                  f'{utils.get_delivery_time_from_callback(chat.callback_query.data)} '
                  f'минут',
-            reply_markup=utils.get_ok_ko_markup()
+            reply_markup=utils.get_ok_ko_markup(),
+            priority=HIGH
         )
     except Exception as ex:
         logger.warning(f'delivery_time_handler: {ex}')
@@ -454,7 +476,8 @@ def order_confirm_handler(update, context):
                 )
     message.reply_text(
         config.text['thank_you'],
-        reply_markup=utils.get_start_kb()
+        reply_markup=utils.get_start_kb(),
+        priority=HIGH
         )
     utils.send_message_to_admin(
         context.bot,
@@ -476,7 +499,7 @@ def order_cancel_handler(update, context):
                 chat_id=message.chat_id,
                 message_id=message.message_id
                 )
-    message.reply_text('Ваш заказ отменен')
+    message.reply_text('Ваш заказ отменен', priority=HIGH)
     utils.send_message_to_admin(
         context.bot,
         f"Заказ {context.user_data['order_id']} *отменен*")
@@ -495,50 +518,75 @@ def get_logs_handler(update, context):
     logger.info(f'get_logs_handler -> {chat_id}')
     if utils.is_admin(chat_id):
         try:
-            f = open('deliver_bot.log', 'rb')
             bot.send_document(
                 chat_id=chat_id,
-                document=f
+                document=logs.compressed_tail(LOG_FILE),
+                priority=LOW
             )
         except Exception as ex:
             logger.warning(f'{ex}')
 
 
 def get_db_handler(update, context):
-    chat = utils.get_chat(context, update)
-    chat_id = chat.effective_chat.id
-    bot = utils.get_bot(context, update)
-    logger.info(f'get_db_handler -> {chat_id}')
+    chat_id = update.effective_chat.id
+    logger.info(f'get_db_handler -> {chat_id} {context.args}')
     if utils.is_admin(chat_id):
         try:
-            f_path = os.path.join(os.path.dirname(__file__), 'admin/db.sqlite')
-            f = open(f_path, 'rb')
-            bot.send_document(
-                chat_id=chat_id,
-                document=f
-            )
-        except Exception:
-            pass
+            incremental = backup.parse_args(context.args)
+        except ValueError:
+            update.message.reply_text('/getdb [new]')
+            return
+        # copied and sent from a background thread, see backup.py
+        if backup.start(context.bot, chat_id, incremental):
+            update.message.reply_text('Готовлю копию базы')
+        else:
+            update.message.reply_text('Копия базы уже готовится')
 
 
 def get_report_handler(update, context):
-    chat = utils.get_chat(context, update)
-    chat_id = chat.effective_chat.id
-    bot = utils.get_bot(context, update)
-    logger.info(f'get_report_handler -> {chat_id}')
+    chat_id = update.effective_chat.id
+    logger.info(f'get_report_handler -> {chat_id} {context.args}')
+    if utils.is_admin(chat_id):
+        try:
+            kind, since, until = report.parse_args(context.args)
+        except ValueError:
+            update.message.reply_text(
+                '/getreport [new | [sum] ГГГГ-ММ-ДД [ГГГГ-ММ-ДД]]')
+            return
+        if kind == 'summary':
+            update.message.reply_text(report.summary(since, until))
+            return
+        # written and sent from a background thread, see report.py
+        if report.start(context.bot, chat_id, since, until, kind == 'new'):
+            update.message.reply_text('Готовлю выгрузку заказов')
+        else:
+            update.message.reply_text('Выгрузка уже идёт')
+
+
+def stats_handler(update, context):
+    chat_id = update.effective_chat.id
+    logger.info(f'stats_handler -> {chat_id}')
+    if utils.is_admin(chat_id):
+        # the message limit is 4096 characters
+        update.message.reply_text(
+            f'```\n{metrics.summary()[:4000]}\n```',
+            parse_mode=ParseMode.MARKDOWN)
 
-    db.export_orders_to_file()
 
+def profile_handler(update, context):
+    chat_id = update.effective_chat.id
+    logger.info(f'profile_handler -> {chat_id} {context.args}')
     if utils.is_admin(chat_id):
         try:
-            f = open('orders.csv', 'rb')
-            bot.send_document(
-                chat_id=chat_id,
-                document=f
-            )
-        except Exception as ex:
-            logger.warning(f'{ex}')
-            pass
+            updates, seconds, memory = profiler.parse_args(context.args)
+        except ValueError:
+            update.message.reply_text('/profile [N | Ts] [mem]')
+            return
+        if profiler.start(context.bot, chat_id, updates, seconds, memory):
+            length = f'{updates} обновлений' if updates else f'{seconds} с'
+            update.message.reply_text(f'Профилирование: {length}')
+        else:
+            update.message.reply_text('Профилирование уже запущено')
 
 
 def reply_handler(update, context):
@@ -564,21 +612,14 @@ def reply_handler(update, context):
 def reply_all_handler(update, context):
     if utils.is_admin(update.message.chat_id):
         logger.info(f'reply_all_handler -> text: {update.message.text}')
-        users = db.get_all_users()
-        for user in users:
-            try:
-                logger.info(f'reply_all_handler -> {user}')
-                context.bot.send_message(
-                    chat_id=user.user_id,
-                    text=update.message.text_markdown.replace(
-                        f'/replyall', ''),
-                    parse_mode=ParseMode.MARKDOWN,
-                    disable_web_page_preview=True
-                )
-            except Exception as ex:
-                logger.warning(f'{ex}')
-                logger.warning(f'reply_all_handler -> {ex}')
-                pass
+        text = update.message.text_markdown.replace('/replyall', '')
+        if not text.strip():
+            return
+        # sent from a background thread, see broadcast.py
+        broadcast_id = broadcast.start(
+            context.bot, text, update.message.chat_id)
+        logger.info(f'reply_all_handler -> broadcast {broadcast_id}')
+        update.message.reply_text(f'Рассылка {broadcast_id} запущена')
 
 
 def done(update, context):
@@ -590,34 +631,21 @@ def error(update, context):
     logger.warning('Update "%s" caused error "%s"', update, error)
 
 
-def main():
-    q = mq.MessageQueue(all_burst_limit=29, all_time_limit_ms=1017)
-    # set connection pool size for bot
-    request = Request(con_pool_size=8)
-    delivery_bot = MQBot(config.BOT_TOKEN, request=request, mqueue=q)
-    persistence = PicklePersistence(filename='conversation')
-    updater = Updater(
-        bot=delivery_bot,
-        persistence=persistence,
-        use_context=True)
-
-    dp = updater.dispatcher
-
-    conv_handler = ConversationHandler(
+def build_conversation():
+    '''The customer conversation. Buttons are routed by their exact text,
+    see router.py, the MessageHandlers left take the free text'''
+    text = config.text
+    return ConversationHandler(
 
         entry_points=[CommandHandler('start', start)],
 
         states={
             INITIAL: [
-                MessageHandler(
-                    Filters.regex(config.text['cart']),
-                    cart_handler),
-                MessageHandler(
-                    Filters.regex(config.text['btn_settings']),
-                    settings_handler),
-                MessageHandler(
-                    Filters.text, start)
-                ],
+                Router({
+                    text['cart']: cart_handler,
+                    text['btn_settings']: settings_handler,
+                }, default=start),
+            ],
             NAME: [MessageHandler(
                 Filters.text,
                 user_name_handler)],
@@ -625,88 +653,57 @@ def main():
                 Filters.text | Filters.contact,
                 user_phone_handler)],
             BIRTHDAY: [
-                MessageHandler(
-                    Filters.regex(config.text['skip']), start),
-                MessageHandler(
-                    Filters.text, user_birthday_handler)
-                ],
+                Router({
+                    text['skip']: start,
+                }, default=user_birthday_handler),
+            ],
             CHOOSING_CATEGORY: [
-                MessageHandler(
-                    Filters.regex(config.text['back']), start),
-                MessageHandler(
-                    Filters.regex(config.text['cart']), cart_handler),
-                MessageHandler(
-                    Filters.regex(config.text['btn_settings']),
-                    settings_handler),
-                MessageHandler(
-                    Filters.text, select_category)
-                ],
+                Router({
+                    text['back']: start,
+                    text['cart']: cart_handler,
+                    text['btn_settings']: settings_handler,
+                }, default=select_category),
+            ],
             CHOOSING_PRODUCT: [
-                MessageHandler(
-                    Filters.regex(config.text['back']), start),
-                MessageHandler(
-                    Filters.text & (
-                        ~ Filters.regex(config.text['back']) |
-                        ~ Filters.regex(config.text['cart'])),
-                    show_product)
-                ],
+                # other texts go to the fallbacks
+                Router({
+                    text['back']: start,
+                }, products=show_product),
+            ],
             TYPING_QUONTITY: [
-                MessageHandler(
-                    Filters.regex(config.text['back']), start),
-                MessageHandler(
-                    Filters.text & (~ Filters.regex(config.text['cart'])),
-                    add_to_cart_handler)
-                ],
+                Router({
+                    text['back']: start,
+                    text['cart']: cart_handler,
+                }, default=add_to_cart_handler),
+            ],
             EDITING_CART: [
+                Router({
+                    text['clear']: clear_cart_handler,
+                    text['order']: order_handler,
+                }),
                 MessageHandler(
                     Filters.text & Filters.regex('^❌\s.*'),
                     delete_item_handler),
-                MessageHandler(
-                    Filters.text & Filters.regex(config.text['clear']),
-                    clear_cart_handler),
-                MessageHandler(
-                    Filters.text & Filters.regex(config.text['order']),
-                    order_handler)
             ],
             ORDERING: [
-                MessageHandler(
-                    Filters.regex(config.text['delivery']),
-                    delivery_handler),
-                MessageHandler(
-                    Filters.regex(config.text['self_pick']),
-                    self_pick_handler),
-                MessageHandler(
-                    Filters.regex(config.text['terminal']),
-                    order_confirmation_handler),
-                MessageHandler(
-                    Filters.regex(config.text['cash']),
-                    order_confirmation_handler),
-                MessageHandler(
-                    Filters.regex(config.text['confirm']),
-                    submit_order_handler),
-                MessageHandler(
-                    Filters.regex(config.text['cancel']),
-                    cancel_order_handler),
-                MessageHandler(
-                    Filters.regex(config.text['back']),
-                    cart_handler),
-                MessageHandler(
-                    Filters.text | Filters.location, location_handler)
+                Router({
+                    text['delivery']: delivery_handler,
+                    text['self_pick']: self_pick_handler,
+                    text['terminal']: order_confirmation_handler,
+                    text['cash']: order_confirmation_handler,
+                    text['confirm']: submit_order_handler,
+                    text['cancel']: cancel_order_handler,
+                    text['back']: cart_handler,
+                }, default=location_handler),
+                MessageHandler(Filters.location, location_handler)
             ],
             SETTINGS: [
-                MessageHandler(
-                    Filters.regex(config.text['btn_change_phone']),
-                    update_user_phone_handler),
-                MessageHandler(
-                    Filters.regex(config.text['btn_change_name']),
-                    update_user_name_handler),
-                MessageHandler(
-                    Filters.regex(config.text['btn_change_birth']),
-                    user_birthday_handler),
-                MessageHandler(
-                    Filters.regex(config.text['btn_back']),
-                    start
-                )
+                Router({
+                    text['btn_change_phone']: update_user_phone_handler,
+                    text['btn_change_name']: update_user_name_handler,
+                    text['btn_change_birth']: user_birthday_handler,
+                    text['btn_back']: start,
+                }),
             ],
             SETTINGS_ENTERING_PHONE: [
                 MessageHandler(
@@ -725,11 +722,11 @@ def main():
         },
 
         fallbacks=[
-            MessageHandler(
-                    Filters.text & Filters.regex(config.text['order']),
-                    order_handler),
-            MessageHandler(Filters.regex(config.text['back']), start),
-            MessageHandler(Filters.regex(config.text['cart']), cart_handler),
+            Router({
+                text['order']: order_handler,
+                text['back']: start,
+                text['cart']: cart_handler,
+            }),
             MessageHandler(Filters.regex('^❌\s.*'), delete_item_handler),
             CallbackQueryHandler(
                     delivery_time_handler,
@@ -747,6 +744,64 @@ def main():
         allow_reentry=True
     )
 
+
+def add_handlers(dp):
+    '''The conversation, the commands and the error handler, everything
+    but the restart command'''
+    dp.add_handler(build_conversation())
+    dp.add_handler(CommandHandler('start', start))
+    dp.add_handler(CommandHandler('getlogs', get_logs_handler))
+    dp.add_handler(CommandHandler('getdb', get_db_handler))
+    dp.add_handler(CommandHandler('getreport', get_report_handler))
+    dp.add_handler(CommandHandler('stats', stats_handler))
+    dp.add_handler(CommandHandler('profile', profile_handler))
+    dp.add_handler(CommandHandler('reply', reply_handler))
+    dp.add_handler(CommandHandler('replyall', reply_all_handler))
+
+    # log all errors
+    dp.add_error_handler(error)
+
+
+def main():
+    q = PriorityMessageQueue(
+        all_burst_limit=29,
+        all_time_limit_ms=1017,
+        # admin chat
+        group_burst_limit=getattr(config, 'GROUP_BURST_LIMIT', 20),
+        group_time_limit_ms=getattr(config, 'GROUP_TIME_LIMIT_MS', 60000))
+    # updates of different users are handled in parallel, see lanes.py
+    dispatch_lanes = getattr(config, 'DISPATCH_LANES', 4)
+    request = metrics.InstrumentedRequest(
+        con_pool_size=lanes.pool_size(dispatch_lanes))
+    # BOT_API_URL points the bot at another Bot API server, see fakeapi.py
+    delivery_bot = MQBot(config.BOT_TOKEN, request=request, mqueue=q,
+                         base_url=getattr(config, 'BOT_API_URL', None))
+    # chat_data and bot_data are not used by the handlers
+    bot_state = persistence.SQLPersistence(
+        store_chat_data=False, store_bot_data=False)
+    job_queue = JobQueue()
+    dispatcher = UnitOfWorkDispatcher(
+        delivery_bot,
+        # bounded, see webhook.py
+        Queue(maxsize=getattr(config, 'UPDATE_QUEUE_SIZE', 1000)),
+        job_queue=job_queue,
+        persistence=bot_state,
+        # no run_async handlers, the lanes are the workers
+        workers=0,
+        lanes=dispatch_lanes,
+        use_context=True)
+    job_queue.set_dispatcher(dispatcher)
+    job_queue.run_repeating(
+        bot_state.flush_job,
+        interval=getattr(config, 'PERSISTENCE_FLUSH_INTERVAL',
+                         persistence.FLUSH_INTERVAL))
+    updater = webhook.WebhookUpdater(
+        dispatcher=dispatcher,
+        workers=None,
+        use_context=True)
+
+    dp = updater.dispatcher
+
     def stop_and_restart():
         """
         Gracefully stop the Updater
@@ -754,27 +809,48 @@ def main():
         """
         logging.info('stop_and_restart function fired')
         updater.stop()
+        dispatcher.update_persistence()
+        bot_state.flush()
+        logs.stop()
         os.execl(sys.executable, sys.executable, *sys.argv)
 
     def restart(update, context):
         update.message.reply_text('Bot is restarting...')
         Thread(target=stop_and_restart).start()
 
-    dp.add_handler(conv_handler)
-    dp.add_handler(CommandHandler('start', start))
-    dp.add_handler(CommandHandler('getlogs', get_logs_handler))
-    dp.add_handler(CommandHandler('getdb', get_db_handler))
-    dp.add_handler(CommandHandler('getreport', get_report_handler))
+    add_handlers(dp)
     dp.add_handler(CommandHandler(
         'r', restart, filters=Filters.user(config.admins)))
-    dp.add_handler(CommandHandler('reply', reply_handler))
-    dp.add_handler(CommandHandler('replyall', reply_all_handler))
-
-    # log all errors
-    dp.add_error_handler(error)
 
-    # Start the Bot
-    updater.start_polling()
+    # latency of every handler and DB helper, see metrics.py
+    metrics.instrument_dispatcher(dp)
+    metrics.instrument_module(
+        db, ('get_', 'add_', 'update_', 'save_', 'delete_', 'export_'))
+    metrics.gauge('update_queue_depth', dispatcher.update_queue.qsize)
+    metrics.gauge('lane_depth',
+                  lambda: dict(enumerate(dispatcher.queue_depths()['lanes'])))
+    metrics.gauge('mq_depth', q.depths)
+    if getattr(config, 'METRICS_PORT', None):
+        metrics.serve(config.METRICS_PORT)
+
+    # broadcasts cut short by the last shutdown
+    broadcast.resume(delivery_bot)
+
+    # Start the Bot, TUTAKA_UPDATES=webhook|polling overrides the config
+    mode = os.environ.get(
+        'TUTAKA_UPDATES', getattr(config, 'UPDATES_MODE', 'polling'))
+    if mode == 'webhook':
+        webhook.start(
+            updater,
+            config.BOT_TOKEN,
+            listen=getattr(config, 'WEBHOOK_LISTEN', '0.0.0.0'),
+            port=getattr(config, 'WEBHOOK_PORT', 8443),
+            url=getattr(config, 'WEBHOOK_URL', None),
+            secret=getattr(config, 'WEBHOOK_SECRET', None),
+            cert=getattr(config, 'WEBHOOK_CERT', None),
+            key=getattr(config, 'WEBHOOK_KEY', None))
+    else:
+        updater.start_polling()
 
     updater.idle()
 
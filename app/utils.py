@@ -1,7 +1,10 @@
-from admin import admin as db
+from admin import data as db
 
+import catalog
 import config
+from cart import Cart
 import datetime as dt
+from decimal import Decimal, ROUND_HALF_UP
 
 from telegram import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, ParseMode
 
@@ -16,7 +19,7 @@ def get_product_list_by_category(category):
 
 
 def get_start_kb():
-    return ReplyKeyboardMarkup(get_main_keyboard())
+    return get_catalog_kb('main')
 
 
 def get_cart_kb(cart):
@@ -24,51 +27,51 @@ def get_cart_kb(cart):
 
 
 def get_categories_kb(category):
-    return ReplyKeyboardMarkup(get_categories_keyboard(category))
+    return get_catalog_kb('categories', category)
 
 
 def get_products_kb(category):
-    return ReplyKeyboardMarkup(get_products_keyboard(category))
+    return get_catalog_kb('products', category)
 
 
 def get_quontity_kb():
-    return ReplyKeyboardMarkup(get_quontity_keyboard())
+    return STATIC_KEYBOARDS['quontity']
 
 
 def get_order_type_kb():
-    return ReplyKeyboardMarkup(get_order_type_keyboard())
+    return STATIC_KEYBOARDS['order_type']
 
 
 def get_delivery_kb():
-    return ReplyKeyboardMarkup(get_delivery_keyboard())
+    return STATIC_KEYBOARDS['delivery']
 
 
 def get_phone_kb():
-    return ReplyKeyboardMarkup(get_phone_keyboard())
+    return STATIC_KEYBOARDS['phone']
 
 
 def get_payment_type_kb():
-    return ReplyKeyboardMarkup(get_payment_type_keyboard())
+    return STATIC_KEYBOARDS['payment_type']
 
 
 def get_confirm_order_kb():
-    return ReplyKeyboardMarkup(get_confirm_order_keyboard())
+    return STATIC_KEYBOARDS['confirm_order']
 
 
 def get_skip_kb():
-    return ReplyKeyboardMarkup(get_skip_keyboard())
+    return STATIC_KEYBOARDS['skip']
 
 
 def get_settings_kb():
-    return ReplyKeyboardMarkup(get_settings_keyboard())
+    return STATIC_KEYBOARDS['settings']
 
 
 # ==============================  Keyboards ==============================
 # ===============================  Helpers ===============================
 
 
-def get_main_keyboard():
-    categories = db.get_categories()
+def get_main_keyboard(snapshot=None):
+    categories = (snapshot or catalog.get()).categories
     cats_buttons = list(group(categories))
     cats_buttons.append([config.text['cart']])
     cats_buttons.append([config.text['btn_settings']])
@@ -84,15 +87,15 @@ def get_cart_keyboard(cart):
     return cart_buttons
 
 
-def get_products_keyboard(category=None):
-    products = db.get_products_by_category(category)
+def get_products_keyboard(category=None, snapshot=None):
+    products = (snapshot or catalog.get()).get_products_by_category(category)
     products_kb = list(group(products))
     products_kb.append([config.text['back']])
     return products_kb
 
 
-def get_categories_keyboard(category=None):
-    cats = db.get_subcategories(category)
+def get_categories_keyboard(category=None, snapshot=None):
+    cats = (snapshot or catalog.get()).get_subcategories(category)
     cats_kb = list(group(cats))
     cats_kb.append([config.text['back']])
     return cats_kb
@@ -211,98 +214,159 @@ def get_user_data(user):
 
 
 def is_category(str):
-    return db.is_existing_category(str)
+    return catalog.get().is_category(str)
 
 
 def has_subcategory(category):
-    # TODO get category and check for inner categories...
-    cats = db.get_subcategories(category)
-    cats = [x for x in cats if x is not None]  # removing [None] in list
-    if cats:
-        return True
-    else:
-        False
-
-
-def calculate_cart_price(cart):
-    total = [item['price'] * item['quontity'] for item in cart]
-    return round(sum(total), 2)
-
-
-def calculate_delivery_price(order_price):
-    if order_price >= config.free_delivery_price_level:
-        return 0
-    else:
-        return config.delivery_price
-
+    return catalog.get().has_subcategory(category)
 
-def generate_cart_reply_text(data):
 
-    if not data['cart']:
-        return config.text['empty_card']
+def to_cents(amount):
+    '''Exact cents of a price from the config or the catalog'''
+    return int((Decimal(str(amount)) * 100).to_integral_value(ROUND_HALF_UP))
 
-    for item in data['cart']:
-        item.update(db.get_product_by_id(item['product_id']))
 
-    cart_price = calculate_cart_price(data['cart'])
-    delivery_price = 0
-    cart_text = f'{config.text["cart"]}\n'
+def format_money(cents):
+    '''"7.50" for 750'''
+    return str(Decimal(cents).scaleb(-2))
 
-    for item in data['cart']:
-        # f'I am {num:{".2f" if ppl else ""}}'
-        cart_text += f'\n*{item["title"]}* {item["subcategory"] if item["subcategory"] else ""}\n' \
-                     f'{item["quontity"]} x {item["price"]} = {round(item["quontity"] * item["price"], 2)} ' \
-                     f'{config.text["currency"]}\n'
 
-    try:
-        if data.get('delivery_type', None) == config.text['delivery']:
-            delivery_price = calculate_delivery_price(cart_price)
-            cart_text += f'\n*Доставка* {delivery_price} {config.text["currency"]}\n'
-    except KeyError:
-        pass
+def delivery_fee(subtotal):
+    '''Delivery fee in cents for a cart of subtotal cents'''
+    if subtotal >= to_cents(config.free_delivery_price_level):
+        return 0
+    return to_cents(config.delivery_price)
+
+
+class Quote:
+    '''Checkout prices of the cart in user_data, in integer cents: the
+    lines with their totals, the delivery fee, the grand total and the
+    reply text. Computed once and kept in user_data, see get_quote()'''
+    def __init__(self, data):
+        snapshot = catalog.get()
+        cart = data.get('cart') or Cart()
+        if cart.version != snapshot.version:
+            cart.reprice(snapshot)
+        self.lines = []
+        for product_id, quontity in cart.items():
+            line = snapshot.get_product_by_id(product_id)._asdict()
+            cents = cart.cents(product_id)
+            line.update(product_id=product_id, quontity=quontity,
+                        cents=cents, total=cents * quontity)
+            self.lines.append(line)
+
+        self.subtotal = sum(line['total'] for line in self.lines)
+        self.is_delivery = \
+            data.get('delivery_type', None) == config.text['delivery']
+        self.delivery = delivery_fee(self.subtotal) if self.is_delivery else 0
+        self.total = self.subtotal + self.delivery
+        self.key = quote_key(data)
+        self.text = self._render()
+        # order text for the customer and the admins and the phone it
+        # shows, filled in by generate_full_order_info()
+        self.info = None
+        self.phone = None
+
+    def _render(self):
+        if not self.lines:
+            return config.text['empty_card']
+
+        currency = config.text['currency']
+        cart_text = f'{config.text["cart"]}\n'
+        for item in self.lines:
+            cart_text += f'\n*{item["title"]}* {item["subcategory"] if item["subcategory"] else ""}\n' \
+                         f'{item["quontity"]} x {format_money(item["cents"])} = {format_money(item["total"])} ' \
+                         f'{currency}\n'
+
+        if self.is_delivery:
+            cart_text += f'\n*Доставка* {format_money(self.delivery)} {currency}\n'
+
+        cart_text += f'\nИтого: {format_money(self.total)} {currency}'
+        return cart_text
+
+
+def quote_key(data):
+    '''What a quote depends on: the cart and its changes, the catalog
+    prices and the order options'''
+    cart = data.get('cart')
+    return (id(cart), cart.revision if cart else None, catalog.get().version,
+            data.get('delivery_type'), data.get('payment_type'),
+            data.get('address'))
+
+
+def get_quote(data):
+    '''Quote of user_data, computed again only once the cart, the prices
+    or the order options changed'''
+    quote = data.get('quote')
+    if quote is None or quote.key != quote_key(data):
+        quote = Quote(data)
+        data['quote'] = quote
+    return quote
+
+
+def render_cart(data):
+    return get_quote(data)
 
-    cart_text += f'\nИтого: {cart_price + delivery_price} {config.text["currency"]}'
 
-    return cart_text
+def generate_cart_reply_text(data):
+    return render_cart(data).text
 
 
 def delete_cart_item(cart, item):
-    return list(filter(lambda i: i['title'] not in item, cart))
+    cart.remove_line(item)
+    return cart
 
 
 def get_items_in_cart(cart):
-    items = []
-    for item in cart:
-        items.append(f'❌ {item["title"]} {item["subcategory"] if item["subcategory"] else ""}')
-    return items
+    return cart.keys()
 
 
-def add_order(data, chat_id):
-    price = calculate_cart_price(data['cart']) + calculate_delivery_price(
-        calculate_cart_price(data['cart'])
-    )
-    user = db.get_user(chat_id)
+def summarize_user_data(data, width=40):
+    '''Short one-line view of user_data for the logs, without the address
+    and with long values cut'''
+    summary = {'keys': sorted(data)}
+    cart = data.get('cart')
+    if cart:
+        summary.update(lines=len(cart), items=cart.count, total=cart.total)
+    for key in ('order_id', 'delivery_type', 'payment_type', 'category'):
+        if key in data:
+            summary[key] = str(data[key])[:width]
+    return summary
+
+
+def add_order(data, chat_id, quote=None):
+    quote = quote or get_quote(data)
     order_data = {}
     order_data['user_id'] = chat_id
-    order_data['user_phone'] = user.phone
+    order_data['user_phone'] = quote.phone if quote.phone is not None \
+        else db.get_user(chat_id).phone
     order_data['delivery_type'] = data['delivery_type']
     order_data['address'] = data['address'] if 'address' in data else None
     order_data['payment_type'] = data['payment_type']
     order_data['status'] = 'initial'
-    order_data['price'] = price
+    order_data['price'] = quote.total / 100
     order_data['cart'] = f''
-    for item in data['cart']:
+    for item in quote.lines:
         order_data['cart'] += f'{item["title"]} '
         order_data['cart'] += f'{item["category"]} '
         order_data['cart'] += f'{item["subcategory"]} '
         order_data['cart'] += f'x {str(item["quontity"])} '
         order_data['cart'] += f' || '
+    order_data['items'] = [
+        {'product_id': item['product_id'], 'title': item['title'],
+         'subcategory': item['subcategory'], 'price': item['cents'] / 100,
+         'quantity': item['quontity']}
+        for item in quote.lines]
     return db.add_order(order_data)
 
 
-def generate_full_order_info(user_data, user_id):
+def generate_full_order_info(user_data, user_id, quote=None):
+    quote = quote or get_quote(user_data)
+    if quote.info is not None:
+        return quote.info
     # TODO if delivery -> add address
     user = db.get_user(user_id)
+    quote.phone = user.phone
     text = f'Ваш заказ:\n' \
            f'Телефон: {user.phone}\n' \
            f'Способ оплаты: {user_data["payment_type"]}\n' \
@@ -316,8 +380,8 @@ def generate_full_order_info(user_data, user_id):
     except:
         pass
     text += f'\n'
-    cart_text = generate_cart_reply_text(user_data)
-    return text + cart_text
+    quote.info = text + quote.text
+    return quote.info
 
 
 def generate_order_confirmation(data):
@@ -398,3 +462,66 @@ def is_admin(user_id):
 
 
 # ===============================  Helpers ===============================
+# ===========================  Keyboard registry ===========================
+
+
+class PrebuiltKeyboardMarkup(ReplyKeyboardMarkup):
+    '''Reply keyboard serialized once, Bot sends the cached JSON payload.
+    Instances are shared between updates and must not be modified'''
+    def __init__(self, *args, **kwargs):
+        super(PrebuiltKeyboardMarkup, self).__init__(*args, **kwargs)
+        self._json = super(PrebuiltKeyboardMarkup, self).to_json()
+
+    def to_json(self):
+        return self._json
+
+
+# built once at startup, config.text does not change at runtime
+STATIC_KEYBOARDS = {
+    name: PrebuiltKeyboardMarkup(build()) for name, build in (
+        ('quontity', get_quontity_keyboard),
+        ('order_type', get_order_type_keyboard),
+        ('delivery', get_delivery_keyboard),
+        ('phone', get_phone_keyboard),
+        ('payment_type', get_payment_type_keyboard),
+        ('confirm_order', get_confirm_order_keyboard),
+        ('skip', get_skip_keyboard),
+        ('settings', get_settings_keyboard),
+    )
+}
+
+# catalog driven keyboards, rebuilt for every catalog version
+_catalog_kbs = (None, {})
+
+
+def build_catalog_kbs(snapshot):
+    kbs = {('main', None): PrebuiltKeyboardMarkup(
+        get_main_keyboard(snapshot))}
+    for category in snapshot.categories:
+        kbs[('categories', category)] = PrebuiltKeyboardMarkup(
+            get_categories_keyboard(category, snapshot))
+    for category in snapshot.titles:
+        kbs[('products', category)] = PrebuiltKeyboardMarkup(
+            get_products_keyboard(category, snapshot))
+    return kbs
+
+
+def get_catalog_kb(name, category=None):
+    global _catalog_kbs
+    snapshot = catalog.get()
+    version, kbs = _catalog_kbs
+    if version != snapshot.version:
+        kbs = build_catalog_kbs(snapshot)
+        _catalog_kbs = (snapshot.version, kbs)
+    try:
+        return kbs[(name, category)]
+    except KeyError:
+        # unknown category, e.g. stale user_data after a catalog edit
+        if name == 'products':
+            return ReplyKeyboardMarkup(
+                get_products_keyboard(category, snapshot))
+        return ReplyKeyboardMarkup(
+            get_categories_keyboard(category, snapshot))
+
+
+# ===========================  Keyboard registry ===========================
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+'''Webhook mode of the bot.
+
+Telegram posts every update to https://<WEBHOOK_URL>/<secret>, the tornado
+server of python-telegram-bot receives it and puts it in the update queue
+of the dispatcher. The secret path is WEBHOOK_SECRET from config or derived
+from the bot token, other paths answer 404.
+
+The update queue is bounded (UPDATE_QUEUE_SIZE). When the dispatcher falls
+behind and the queue is full the webhook answers 503 instead of growing
+the backlog in memory, Telegram keeps the update and delivers it again
+later. In polling mode the fetch loop simply waits for room in the queue.
+
+TLS is terminated by the bot when WEBHOOK_CERT and WEBHOOK_KEY are set,
+the certificate is uploaded to Telegram for self-signed setups. Without
+them a reverse proxy is expected in front of WEBHOOK_LISTEN:WEBHOOK_PORT
+and the webhook is still registered with WEBHOOK_URL.
+
+Post fake updates to a running bot (from app/):
+
+    python webhook.py http://127.0.0.1:8443/<secret> [updates] [users]
+'''
+
+import ssl
+import sys
+import json
+import time
+import queue
+import hashlib
+import logging
+import urllib.request
+import urllib.error
+
+import tornado.web
+
+from collections import Counter
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import Updater
+from telegram.utils import webhookhandler
+
+logger = logging.getLogger(__name__)
+
+
+def get_secret(token):
+    '''Default secret path, stable for one bot token'''
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+class WebhookHandler(webhookhandler.WebhookHandler):
+    '''Answers 503 instead of blocking when the update queue is full'''
+
+    def post(self):
+        self._validate_post()
+        data = json.loads(self.request.body.decode('utf-8'))
+        data['default_quote'] = self._default_quote
+        update = Update.de_json(data, self.bot)
+        try:
+            self.update_queue.put_nowait(update)
+        except queue.Full:
+            logger.warning(f'webhook: update queue full, '
+                           f'{update.update_id} rejected')
+            self.set_status(503)
+            self.set_header('Retry-After', '1')
+            return
+        self.set_status(200)
+
+
+class WebhookApp(webhookhandler.WebhookAppClass):
+    '''WebhookAppClass routing to our WebhookHandler'''
+
+    def __init__(self, webhook_path, bot, update_queue, default_quote=None):
+        self.shared_objects = {'bot': bot, 'update_queue': update_queue,
+                               'default_quote': default_quote}
+        handlers = [
+            (f'{webhook_path}/?', WebhookHandler, self.shared_objects)
+        ]
+        tornado.web.Application.__init__(self, handlers)
+
+
+class WebhookUpdater(Updater):
+    '''Updater serving WebhookApp, also registers the webhook when TLS is
+    terminated by a proxy'''
+
+    def _start_webhook(self, listen, port, url_path, cert, key,
+                       bootstrap_retries, clean, webhook_url,
+                       allowed_updates):
+        use_ssl = cert is not None and key is not None
+        if not url_path.startswith('/'):
+            url_path = '/' + url_path
+
+        app = WebhookApp(url_path, self.bot, self.update_queue,
+                         default_quote=self._default_quote)
+        if use_ssl:
+            try:
+                ssl_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+                ssl_ctx.load_cert_chain(cert, key)
+            except ssl.SSLError:
+                raise TelegramError('Invalid SSL Certificate')
+        else:
+            ssl_ctx = None
+        self.httpd = webhookhandler.WebhookServer(listen, port, app, ssl_ctx)
+
+        if use_ssl or webhook_url:
+            if not webhook_url:
+                webhook_url = self._gen_webhook_url(listen, port, url_path)
+            self._bootstrap(max_retries=bootstrap_retries,
+                            clean=clean,
+                            webhook_url=webhook_url,
+                            cert=open(cert, 'rb') if use_ssl else None,
+                            allowed_updates=allowed_updates)
+        self.httpd.serve_forever()
+
+
+def start(updater, token, listen='0.0.0.0', port=8443, url=None,
+          secret=None, cert=None, key=None):
+    '''Start the updater in webhook mode, url is the public base URL'''
+    secret = secret or get_secret(token)
+    webhook_url = f'{url.rstrip("/")}/{secret}' if url else None
+    logger.info(f'webhook: listening on {listen}:{port}, url {url}')
+    return updater.start_webhook(
+        listen=listen,
+        port=port,
+        url_path=secret,
+        cert=cert,
+        key=key,
+        webhook_url=webhook_url)
+
+
+# ===========================  Fake Telegram ===========================
+
+
+def make_update(update_id, user_id, text):
+    '''Text message update as Telegram posts it'''
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}',
+            'username': f'user{user_id}'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'from': user,
+            'chat': dict(user, type='private'),
+            'date': int(time.time()),
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0,
+                          'length': len(text.split()[0])}]
+            if text.startswith('/') else [],
+        },
+    }
+
+
+def make_callback_update(update_id, user_id, chat_id, data, message_id=None):
+    '''Inline button press on a bot message in chat_id'''
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'}
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': user,
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {
+                'message_id': message_id or update_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id,
+                         'type': 'private' if chat_id > 0 else 'group'},
+                'text': '-',
+            },
+        },
+    }
+
+
+def post_update(url, update, timeout=10):
+    '''Post one update like Telegram does, returns the HTTP status'''
+    request = urllib.request.Request(
+        url, data=json.dumps(update).encode('utf-8'),
+        headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as ex:
+        return ex.code
+
+
+def main(url, updates=100, users=10):
+    started = time.monotonic()
+    statuses = Counter()
+    for n in range(updates):
+        statuses[post_update(url, make_update(
+            n + 1, 100000 + n % users, '/start'))] += 1
+    elapsed = time.monotonic() - started
+    print(f'{updates} updates in {elapsed:.2f} s, '
+          f'{updates / elapsed:.1f} per second')
+    for status, count in sorted(statuses.items()):
+        print(f'  HTTP {status}: {count}')
+    return 0 if set(statuses) == {200} else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1], *[int(a) for a in sys.argv[2:4]]))